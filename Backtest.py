@@ -0,0 +1,214 @@
+"""
+IntelliTrade backtester
+Replays the live Donchian/MACD scan over historical M1 bars and resolves every
+signal's Fibonacci TP ladder and stop with bar highs/lows. Trades come out in the
+TradePerformance.log_trade schema.
+"""
+
+import argparse
+import csv
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from BarStore import BAR_STORE_DIR, BarStore, sync_symbols
+from IntelliTrade import (mt5, calc_tps_sl, validate_prices, TIMEFRAME_LABEL, DONCHIAN_PERIOD,
+                          MACD_FAST, MACD_SLOW, MACD_SIGNAL, RSI_PERIOD, SMA_PERIOD_SHORT,
+                          SMA_PERIOD_LONG, FIB_LEVELS, RR, SIGNAL_COOLDOWN, SAME_BAR_SL_FIRST,
+                          PERFORMANCE_FIELDS)
+
+# === CONFIG ===
+DEFAULT_PARAMS = {
+    'donchian_period': DONCHIAN_PERIOD,
+    'macd_fast': MACD_FAST,
+    'macd_slow': MACD_SLOW,
+    'macd_signal': MACD_SIGNAL,
+    'rsi_period': RSI_PERIOD,
+    'fib_levels': FIB_LEVELS,
+    'rr': RR
+}
+SCAN_DELAY = 60  # A bar is scanned when it closes, one M1 bar after its open time
+RESOLVE_CHUNK = 1440  # Bars searched at a time for a trade's TP/SL hits
+
+# === INDICATORS ===
+def indicator_arrays(rates, params=None):
+    """Full-series indicator arrays with the same pandas definitions as the live scan"""
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    high = pd.Series(rates['high'], dtype=float)
+    low = pd.Series(rates['low'], dtype=float)
+    close = pd.Series(rates['close'], dtype=float)
+
+    macd_line = (close.ewm(span=p['macd_fast'], adjust=False).mean()
+                 - close.ewm(span=p['macd_slow'], adjust=False).mean())
+    signal_line = macd_line.ewm(span=p['macd_signal'], adjust=False).mean()
+
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    rs = gain.ewm(alpha=1/p['rsi_period']).mean() / loss.ewm(alpha=1/p['rsi_period']).mean()
+
+    return {
+        'close': close.to_numpy(),
+        'donchian_upper': high.rolling(p['donchian_period']).max().to_numpy(),
+        'donchian_lower': low.rolling(p['donchian_period']).min().to_numpy(),
+        'macd_main': macd_line.to_numpy(),
+        'macd_signal': signal_line.to_numpy(),
+        'macd_hist': (macd_line - signal_line).to_numpy(),
+        'rsi': (100 - (100 / (1 + rs))).to_numpy(),
+        'sma_9': close.rolling(SMA_PERIOD_SHORT).mean().to_numpy(),
+        'sma_21': close.rolling(SMA_PERIOD_LONG).mean().to_numpy()
+    }
+
+def signal_directions(ind):
+    """+1 BUY / -1 SELL / 0 per bar, with the live scan's SELL-before-BUY precedence"""
+    with np.errstate(invalid='ignore'):
+        sell = (ind['close'] >= ind['donchian_upper']) & (ind['macd_hist'] < ind['macd_signal'])
+        buy = (ind['close'] <= ind['donchian_lower']) & (ind['macd_hist'] > ind['macd_signal'])
+    return np.where(sell, -1, np.where(buy, 1, 0)).astype(np.int8)
+
+# === TRADE RESOLUTION ===
+def first_touch(mask_fn, start, n):
+    """Index of the first bar from start where mask_fn(slice) is True, or n"""
+    while start < n:
+        stop = min(start + RESOLVE_CHUNK, n)
+        hits = mask_fn(slice(start, stop))
+        if hits.any():
+            return start + int(np.argmax(hits))
+        start = stop
+    return n
+
+def resolve_trade(sign, entry, tps, sl, high, low, ask_offset, start):
+    """Bars where each TP and the SL are first touched from start (len(high) if never).
+
+    Prices are compared the way the live monitor does: BUY trades against the ask,
+    SELL trades against the bid that the bars are built from.
+    """
+    n = len(high)
+    if sign > 0:
+        sl_bar = first_touch(lambda s: low[s] + ask_offset[s] <= sl, start, n)
+        tp_bars = []
+        for tp in tps:
+            start = first_touch(lambda s: high[s] + ask_offset[s] >= tp, start, min(n, sl_bar + 1))
+            tp_bars.append(start)
+    else:
+        sl_bar = first_touch(lambda s: high[s] >= sl, start, n)
+        tp_bars = []
+        for tp in tps:
+            start = first_touch(lambda s: low[s] <= tp, start, min(n, sl_bar + 1))
+            tp_bars.append(start)
+    return tp_bars, sl_bar
+
+def backtest(symbol, rates, params=None, point=0.):
+    """Trades the live scan would have signalled on rates (an MT5 rates array).
+
+    Honours SIGNAL_COOLDOWN and one open trade per symbol. A signal on a closed bar
+    enters at the next bar's open (plus spread for BUY when point is given); its ladder
+    comes from calc_tps_sl. Returns log rows in the PERFORMANCE_FIELDS schema; trades
+    still open at the end of the data produce no rows.
+    """
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    ind = indicator_arrays(rates, p)
+    directions = signal_directions(ind)
+    times = rates['time'].astype(np.int64)
+    opens = rates['open'].astype(float)
+    high = rates['high'].astype(float)
+    low = rates['low'].astype(float)
+    ask_offset = rates['spread'] * point if point and 'spread' in rates.dtype.names else np.zeros(len(rates))
+    n = len(rates)
+
+    rows = []
+    busy_until = -1  # Bar in which the open trade closes
+    last_signal_time = None
+    for i in np.flatnonzero(directions[:-1]):
+        if i < busy_until:
+            continue
+        scan_time = times[i] + SCAN_DELAY
+        if last_signal_time is not None and scan_time - last_signal_time < SIGNAL_COOLDOWN:
+            continue
+
+        sign = int(directions[i])
+        direction = "BUY" if sign > 0 else "SELL"
+        entry = float(opens[i + 1] + ask_offset[i + 1]) if sign > 0 else float(opens[i + 1])
+        upper, lower = float(ind['donchian_upper'][i]), float(ind['donchian_lower'][i])
+        tps, sl = calc_tps_sl(entry, direction, upper, lower, p['fib_levels'], p['rr'])
+        if not validate_prices(entry, tps, sl, direction, symbol, float(ind['close'][i])):
+            continue
+        last_signal_time = scan_time
+
+        tp_bars, sl_bar = resolve_trade(sign, entry, tps, sl, high, low, ask_offset, i + 1)
+        hit = [k for k, bar in enumerate(tp_bars) if bar < sl_bar or (bar == sl_bar < n and not SAME_BAR_SL_FIRST)]
+        busy_until = tp_bars[-1] if len(hit) == len(tps) else sl_bar
+        if busy_until >= n:
+            break  # Still open when the data runs out; no later signal can be taken
+
+        rsi = float(ind['rsi'][i])
+        sma_9, sma_21 = float(ind['sma_9'][i]), float(ind['sma_21'][i])
+        base = {
+            'TradeID': f"{symbol}_{datetime.fromtimestamp(scan_time, timezone.utc).strftime('%Y%m%d%H%M%S')}",
+            'Symbol': symbol,
+            'Direction': direction,
+            'Entry': entry,
+            'DonchianUpper': upper,
+            'DonchianLower': lower,
+            'MACD_Main': float(ind['macd_main'][i]),
+            'MACD_Signal': float(ind['macd_signal'][i]),
+            'MACD_Hist': float(ind['macd_hist'][i]),
+            'RSI': rsi,
+            'RSI_Status': "Overbought" if rsi >= 70 else "Oversold" if rsi <= 30 else "Neutral",
+            'SMA_9': sma_9,
+            'SMA_21': sma_21,
+            'SMA_Alignment': "Bullish" if sma_9 > sma_21 else "Bearish"
+        }
+        for k in hit:
+            rows.append(dict(base, Timestamp=bar_time(times[tp_bars[k]]), Exit=tps[k],
+                             Outcome=f"TP{k+1}", Pips=abs(tps[k] - entry)))
+        if len(hit) < len(tps):
+            outcome = "SL after TP (Win)" if hit else "SL without TP (Loss)"
+            rows.append(dict(base, Timestamp=bar_time(times[sl_bar]), Exit=sl,
+                             Outcome=outcome, Pips=-abs(sl - entry)))
+    return rows
+
+def bar_time(timestamp):
+    return datetime.fromtimestamp(int(timestamp), timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+# === MAIN EXECUTION ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the IntelliTrade signal on M1 history")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--bars", type=int, default=43200, help="M1 bars of history per symbol (default: 30 days)")
+    parser.add_argument("--out", default="backtest_trades.csv", help="CSV in the trade performance schema")
+    parser.add_argument("--store", default=BAR_STORE_DIR, help="bar store the history is read from")
+    parser.add_argument("--offline", action="store_true", help="use the bar store as is, without syncing from MT5")
+    args = parser.parse_args()
+
+    store = BarStore(args.store)
+    timeframe = TIMEFRAME_LABEL
+    if not args.offline:
+        if mt5 is None:
+            print("⚠️ MetaTrader5 not installed - backtesting on the bar store as is")
+        elif mt5.initialize():
+            try:
+                sync_symbols(store, mt5, args.symbols, [timeframe], history_bars=args.bars)
+            finally:
+                mt5.shutdown()
+        else:
+            print("⚠️ MT5 unavailable - backtesting on the bar store as is")
+
+    all_rows = []
+    for sym in args.symbols:
+        rates = store.read(sym, timeframe, count=args.bars)
+        if not len(rates):
+            print(f"⚠️ No history for {sym}")
+            continue
+        start = time.perf_counter()
+        rows = backtest(sym, rates, point=store.info(sym).get('point', 0.))
+        elapsed = time.perf_counter() - start
+        trades = len({row['TradeID'] for row in rows})
+        print(f"{sym}: {len(rates)} bars, {trades} trades, {len(rows)} log rows in {elapsed:.2f}s")
+        all_rows.extend(rows)
+
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=PERFORMANCE_FIELDS)
+        writer.writeheader()
+        writer.writerows(sorted(all_rows, key=lambda row: row['Timestamp']))
+    print(f"✅ Wrote {len(all_rows)} rows to {args.out}")
@@ -0,0 +1,157 @@
+"""
+Multi-timeframe resampler
+Builds M5/M15/M30/H1 bars from closed M1 bars the way the terminal aggregates them,
+so higher-timeframe indicators need no extra terminal calls. Each new M1 bar only
+touches the forming bar of every timeframe.
+"""
+
+import numpy as np
+from BarStore import RATES_DTYPE, TIMEFRAME_SECONDS
+
+# === CONFIG ===
+RESAMPLE_TIMEFRAMES = ('M5', 'M15', 'M30', 'H1')
+RESAMPLE_HISTORY_BARS = 500  # Completed bars kept per timeframe
+
+# How each rates field of a higher-timeframe bar comes from its M1 bars. MT5 keeps
+# the lowest spread seen in a bar.
+AGGREGATION = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'tick_volume': 'sum',
+    'spread': 'min',
+    'real_volume': 'sum'
+}
+
+def resample(m1, timeframe):
+    """Higher-timeframe bars of a whole M1 rates array at once (the last one may still be forming)"""
+    m1 = np.asarray(m1)
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    out = np.zeros(0, dtype=RATES_DTYPE)
+    if not len(m1):
+        return out
+    buckets = m1['time'].astype(np.int64) - m1['time'].astype(np.int64) % seconds
+    starts = np.flatnonzero(np.concatenate([[True], buckets[1:] != buckets[:-1]]))
+    ends = np.concatenate([starts[1:], [len(m1)]]) - 1
+    out = np.zeros(len(starts), dtype=RATES_DTYPE)
+    out['time'] = buckets[starts]
+    for field, how in AGGREGATION.items():
+        values = m1[field]
+        if how == 'first':
+            out[field] = values[starts]
+        elif how == 'last':
+            out[field] = values[ends]
+        elif how == 'max':
+            out[field] = np.maximum.reduceat(values, starts)
+        elif how == 'min':
+            out[field] = np.minimum.reduceat(values, starts)
+        else:
+            out[field] = np.add.reduceat(values, starts)
+    return out
+
+def _start_bar(m1_bar, bucket):
+    """A new higher-timeframe bar opened by one M1 bar"""
+    bar = np.zeros(1, dtype=RATES_DTYPE)[0]
+    for field in RATES_DTYPE.names:
+        bar[field] = m1_bar[field]
+    bar['time'] = bucket
+    return bar
+
+def _fold(bar, m1_bar):
+    """Extend a forming higher-timeframe bar (in place) with the next M1 bar"""
+    bar['high'] = max(bar['high'], m1_bar['high'])
+    bar['low'] = min(bar['low'], m1_bar['low'])
+    bar['close'] = m1_bar['close']
+    bar['tick_volume'] += m1_bar['tick_volume']
+    bar['spread'] = min(bar['spread'], m1_bar['spread'])
+    bar['real_volume'] += m1_bar['real_volume']
+
+class Resampler:
+    """Higher-timeframe bars of one symbol, kept up to date from its closed M1 bars.
+
+    Each timeframe holds its completed bars (the last `size` of them) and the forming
+    bar. Completed history can be seeded from terminal bars, from M1 history, or both;
+    M1 bars that fall in an already completed bar are ignored.
+    """
+    def __init__(self, timeframes=RESAMPLE_TIMEFRAMES, size=RESAMPLE_HISTORY_BARS):
+        self.size = size
+        self.last_time = None  # Open time of the last M1 bar fed
+        self.frames = {}
+        for tf in timeframes:
+            self.frames[tf] = {
+                'seconds': TIMEFRAME_SECONDS[tf],
+                'completed': np.zeros(2 * size, dtype=RATES_DTYPE),  # Compacted when full
+                'count': 0,
+                'forming': None
+            }
+
+    def seed(self, timeframe, rates):
+        """Start a timeframe's completed history from closed bars (e.g. copy_rates_from_pos(.., 1, n))"""
+        frame = self.frames[timeframe]
+        rates = np.asarray(rates).astype(RATES_DTYPE)[-self.size:]
+        frame['completed'][:len(rates)] = rates
+        frame['count'] = len(rates)
+        frame['forming'] = None
+
+    def feed(self, rates):
+        """Add the closed M1 bars of rates newer than the last one fed.
+
+        Returns False, adding nothing, when rates does not reach back to the last bar
+        fed: bars may have been missed, and the timeframes should be seeded again.
+        """
+        rates = np.asarray(rates)
+        if not len(rates):
+            return True
+        if self.last_time is not None:
+            if rates['time'][0] > self.last_time:
+                return False
+            rates = rates[rates['time'] > self.last_time]
+        for bar in rates:
+            self.update(bar)
+        return True
+
+    def update(self, bar):
+        """Fold one closed M1 bar into the forming bar of every timeframe"""
+        t = int(bar['time'])
+        for frame in self.frames.values():
+            bucket = t - t % frame['seconds']
+            if frame['count'] and bucket <= frame['completed'][frame['count'] - 1]['time']:
+                continue  # Already covered by seeded history
+            forming = frame['forming']
+            if forming is not None and forming['time'] == bucket:
+                _fold(forming, bar)
+                continue
+            if forming is not None:
+                self._complete(frame, forming)
+            frame['forming'] = _start_bar(bar, bucket)
+        self.last_time = t
+
+    def _complete(self, frame, bar):
+        if frame['count'] == len(frame['completed']):
+            frame['completed'][:self.size] = frame['completed'][-self.size:]
+            frame['count'] = self.size
+        frame['completed'][frame['count']] = bar
+        frame['count'] += 1
+
+    def bars(self, timeframe, count=None, forming=None):
+        """Last `count` bars of a timeframe, oldest first, the forming bar last.
+
+        forming is the terminal's current (unfinished) M1 bar; it is merged into a
+        copy of the forming bar, as the terminal's own higher-timeframe bar includes it.
+        """
+        frame = self.frames[timeframe]
+        last = frame['forming']
+        if forming is not None:
+            bucket = int(forming['time']) - int(forming['time']) % frame['seconds']
+            if last is not None and last['time'] == bucket:
+                last = _start_bar(last, bucket)  # A copy, so the committed state is untouched
+                _fold(last, forming)
+                tail = [last]
+            else:
+                tail = ([last] if last is not None else []) + [_start_bar(forming, bucket)]
+        else:
+            tail = [last] if last is not None else []
+        completed = frame['completed'][:frame['count']]
+        out = np.concatenate([completed, np.array(tail, dtype=RATES_DTYPE)])
+        return out if count is None else out[-count:]
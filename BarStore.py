@@ -0,0 +1,332 @@
+"""
+Local bar store
+Closed MT5 bars per symbol and timeframe in append-only, memory-mapped record files,
+kept up to date from the terminal and read back as zero-copy NumPy views. Needs no
+terminal to read, so backtests and analysis run anywhere the files are copied.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+# === CONFIG ===
+BAR_STORE_DIR = "bar_store"
+DEFAULT_HISTORY_BARS = 100000  # Bars requested when a symbol/timeframe is first stored
+SYNC_PROBE_BARS = 64  # First delta request size; doubled until it reaches stored history
+
+# Record layout of the arrays the MT5 copy_rates_* calls return
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('tick_volume', '<u8'),
+    ('spread', '<i4'),
+    ('real_volume', '<u8')
+])
+TIMEFRAME_SECONDS = {'M1': 60, 'M5': 300, 'M15': 900, 'M30': 1800, 'H1': 3600, 'H4': 14400, 'D1': 86400}
+
+def timeframe_label(terminal, timeframe):
+    """'M1', 'M5', ... for an mt5.TIMEFRAME_* constant, or None if the store has no such timeframe"""
+    for label in TIMEFRAME_SECONDS:
+        if getattr(terminal, f"TIMEFRAME_{label}", None) == timeframe:
+            return label
+    return None
+
+def epoch(value):
+    """Seconds since the epoch from an int, datetime, datetime64 or ISO string"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.replace(tzinfo=value.tzinfo or timezone.utc).timestamp())
+    return int(np.datetime64(value, 's').astype(np.int64))
+
+# === STORE ===
+class BarStore:
+    """One file of raw RATES_DTYPE records per symbol and timeframe.
+
+    Layout: <root>/<symbol>/<timeframe>.bars, records in strictly increasing time
+    order, plus <root>/<symbol>/meta.json with the symbol's point, digits and contract
+    size (so backtests need no terminal) and the gaps the terminal has confirmed empty.
+
+    New bars are only ever appended; a record torn by a crash is cut off before the
+    next append, and readers never map a partial record. Inserting older history or
+    backfilling a hole writes the merged bars to a new generation of the file
+    (<timeframe>.<n>.bars) instead of replacing the mapped one, which Windows refuses
+    while any process still maps it. Reads and appends use the newest generation;
+    older ones are deleted once nothing maps them any more.
+    """
+    def __init__(self, root=BAR_STORE_DIR):
+        self.root = root
+        self.maps = {}  # (symbol, timeframe) -> (path, memmap of that file as last seen)
+        os.makedirs(root, exist_ok=True)
+
+    def generations(self, symbol, timeframe):
+        """Generation numbers of a timeframe's files, oldest first (<timeframe>.bars is 0)"""
+        folder = os.path.join(self.root, symbol)
+        names = os.listdir(folder) if os.path.isdir(folder) else []
+        found = []
+        for name in names:
+            if name == f"{timeframe}.bars":
+                found.append(0)
+            elif name.startswith(f"{timeframe}.") and name.endswith(".bars"):
+                number = name[len(timeframe) + 1:-len(".bars")]
+                if number.isdigit():
+                    found.append(int(number))
+        return sorted(found)
+
+    def path(self, symbol, timeframe, generation=None):
+        """File of one generation, the newest by default"""
+        if generation is None:
+            found = self.generations(symbol, timeframe)
+            generation = found[-1] if found else 0
+        name = f"{timeframe}.bars" if generation == 0 else f"{timeframe}.{generation}.bars"
+        return os.path.join(self.root, symbol, name)
+
+    def symbols(self):
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def timeframes(self, symbol):
+        return [tf for tf in TIMEFRAME_SECONDS if self.generations(symbol, tf)]
+
+    # --- Reads ---
+    def bars(self, symbol, timeframe='M1'):
+        """Every stored bar as a read-only memmap (empty array if none)"""
+        path = self.path(symbol, timeframe)
+        try:
+            count = os.path.getsize(path) // RATES_DTYPE.itemsize
+        except FileNotFoundError:
+            count = 0
+        cached_path, cached = self.maps.get((symbol, timeframe), (None, None))
+        if cached_path == path and len(cached) == count:
+            return cached
+        if not count:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        bars = np.memmap(path, dtype=RATES_DTYPE, mode='r', shape=(count,))
+        self.maps[(symbol, timeframe)] = (path, bars)
+        return bars
+
+    def read(self, symbol, timeframe='M1', start=None, end=None, count=None):
+        """Zero-copy view of the bars with start <= time <= end, the last `count` of them if given.
+
+        start/end take epoch seconds, datetimes or ISO strings, in the terminal's bar time.
+        """
+        bars = self.bars(symbol, timeframe)
+        times = bars['time']
+        lo = 0 if start is None else int(np.searchsorted(times, epoch(start), side='left'))
+        hi = len(bars) if end is None else int(np.searchsorted(times, epoch(end), side='right'))
+        if count is not None:
+            lo = max(lo, hi - count)
+        return bars[lo:hi]
+
+    def last_time(self, symbol, timeframe='M1'):
+        bars = self.bars(symbol, timeframe)
+        return int(bars['time'][-1]) if len(bars) else None
+
+    def gaps(self, symbol, timeframe='M1', min_gap=None, include_known=False):
+        """(after, before) bar times around each hole wider than min_gap seconds (default: one bar).
+
+        Holes the terminal has already confirmed empty (weekends, outages) are left
+        out unless include_known is set.
+        """
+        times = self.bars(symbol, timeframe)['time']
+        step = np.diff(times)
+        holes = np.flatnonzero(step > (min_gap or TIMEFRAME_SECONDS[timeframe]))
+        found = [(int(times[k]), int(times[k + 1])) for k in holes]
+        if include_known:
+            return found
+        known = {tuple(gap) for gap in self.info(symbol).get('empty_gaps', {}).get(timeframe, [])}
+        return [gap for gap in found if gap not in known]
+
+    def info(self, symbol):
+        try:
+            with open(os.path.join(self.root, symbol, "meta.json"), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    # --- Writes ---
+    def append(self, symbol, timeframe, rates):
+        """Store the bars of rates newer than the last stored one; returns how many were added"""
+        path = self.path(symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._cut_torn_record(path)
+        last = self.last_time(symbol, timeframe)
+        rates = np.asarray(rates).astype(RATES_DTYPE, copy=False)
+        if last is not None:
+            rates = rates[rates['time'] > last]
+        if not len(rates):
+            return 0
+        if len(rates) > 1 and (np.diff(rates['time']) <= 0).any():
+            rates = np.unique(rates)  # Sorts by time (the first field) and drops repeats
+            rates = rates[np.concatenate([[True], np.diff(rates['time']) > 0])]
+        with open(path, 'ab') as f:
+            f.write(np.ascontiguousarray(rates).tobytes())
+            f.flush()
+        return len(rates)
+
+    def merge(self, symbol, timeframe, rates):
+        """Insert bars anywhere in the history (backfill); stored bars win on equal times"""
+        rates = np.asarray(rates).astype(RATES_DTYPE, copy=False)
+        stored = self.bars(symbol, timeframe)
+        if not len(rates):
+            return 0
+        if not len(stored) or rates['time'].min() > stored['time'][-1]:
+            return self.append(symbol, timeframe, rates)
+
+        new = rates[~np.isin(rates['time'], stored['time'])]
+        if not len(new):
+            return 0
+        merged = np.concatenate([np.asarray(stored), new])
+        merged = merged[np.argsort(merged['time'], kind='stable')]
+        merged = merged[np.concatenate([[True], np.diff(merged['time']) > 0])]
+        added = len(merged) - len(stored)
+        self.maps.pop((symbol, timeframe), None)
+        del stored
+        found = self.generations(symbol, timeframe)
+        path = self.path(symbol, timeframe, found[-1] + 1)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(merged.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)  # A new name: no reader has it mapped
+        self.prune(symbol, timeframe)
+        return added
+
+    def prune(self, symbol, timeframe):
+        """Delete superseded generations; returns how many are still mapped somewhere and kept"""
+        kept = 0
+        for generation in self.generations(symbol, timeframe)[:-1]:
+            try:
+                os.remove(self.path(symbol, timeframe, generation))
+            except OSError:
+                kept += 1  # Still mapped (Windows); removed by a later prune
+        return kept
+
+    def _cut_torn_record(self, path):
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        if size % RATES_DTYPE.itemsize:
+            with open(path, 'r+b') as f:
+                f.truncate(size - size % RATES_DTYPE.itemsize)
+
+    def _write_info(self, symbol, info):
+        path = os.path.join(self.root, symbol, "meta.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(info, f, indent=1)
+        os.replace(path + ".tmp", path)
+
+    # --- Terminal ---
+    def sync(self, terminal, symbol, timeframe='M1', history_bars=DEFAULT_HISTORY_BARS):
+        """Add the closed bars the terminal has after the last stored one; returns how many.
+
+        A first sync stores up to history_bars of history. Later syncs probe with a
+        small request and double it until it overlaps the stored history, so no clock
+        (local or server) is involved; if even history_bars does not reach back, the
+        hole is left for backfill(). When fewer than history_bars are stored, older
+        history is fetched to make up the difference.
+        """
+        tf = getattr(terminal, f"TIMEFRAME_{timeframe}")
+        info = terminal.symbol_info(symbol)
+        if info is not None:
+            meta = self.info(symbol)
+            meta.update({'point': info.point, 'digits': info.digits, 'contract_size': info.trade_contract_size})
+            self._write_info(symbol, meta)
+
+        last = self.last_time(symbol, timeframe)
+        count = history_bars if last is None else min(SYNC_PROBE_BARS, history_bars)
+        while True:
+            rates = terminal.copy_rates_from_pos(symbol, tf, 1, count)  # Position 0 is the forming bar
+            if rates is None or not len(rates):
+                return 0
+            if last is None or rates['time'][0] <= last or count >= history_bars:
+                break
+            count = min(count * 2, history_bars)
+        added = self.append(symbol, timeframe, rates)
+
+        stored = self.bars(symbol, timeframe)
+        if 0 < len(stored) < history_bars:
+            first = datetime.fromtimestamp(int(stored['time'][0]) - 1, timezone.utc)
+            older = terminal.copy_rates_from(symbol, tf, first, history_bars - len(stored))
+            del stored  # merge() must be the only holder of the old mapping
+            if older is not None and len(older):
+                added += self.merge(symbol, timeframe, older)
+        return added
+
+    def backfill(self, terminal, symbol, timeframe='M1', min_gap=None):
+        """Fetch the bars missing from each unconfirmed gap; returns how many were added.
+
+        Gaps the terminal has no bars for are recorded in meta.json so they are not
+        asked for again.
+        """
+        tf = getattr(terminal, f"TIMEFRAME_{timeframe}")
+        step = TIMEFRAME_SECONDS[timeframe]
+        added = 0
+        empty = []
+        for after, before in self.gaps(symbol, timeframe, min_gap):
+            rates = terminal.copy_rates_range(symbol, tf, datetime.fromtimestamp(after + step, timezone.utc),
+                                              datetime.fromtimestamp(before - 1, timezone.utc))
+            filled = self.merge(symbol, timeframe, rates) if rates is not None else 0
+            if not filled:
+                empty.append([after, before])
+            added += filled
+        if empty:
+            meta = self.info(symbol)
+            meta.setdefault('empty_gaps', {}).setdefault(timeframe, []).extend(empty)
+            self._write_info(symbol, meta)
+        return added
+
+def sync_symbols(store, terminal, symbols, timeframes=('M1',), history_bars=DEFAULT_HISTORY_BARS, backfill=False):
+    """Bring the store up to date for several symbols; returns {(symbol, timeframe): bars added}"""
+    added = {}
+    for sym in symbols:
+        for tf in timeframes:
+            added[(sym, tf)] = store.sync(terminal, sym, tf, history_bars)
+            if backfill:
+                added[(sym, tf)] += store.backfill(terminal, sym, tf)
+    return added
+
+def bar_time(timestamp):
+    return datetime.fromtimestamp(int(timestamp), timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+# === MAIN EXECUTION ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync and inspect the local MT5 bar store")
+    parser.add_argument("symbols", nargs="*", help="default: every stored symbol")
+    parser.add_argument("--root", default=BAR_STORE_DIR)
+    parser.add_argument("--timeframes", nargs="+", default=['M1'], choices=list(TIMEFRAME_SECONDS))
+    parser.add_argument("--sync", action="store_true", help="append new closed bars from the terminal")
+    parser.add_argument("--backfill", action="store_true", help="fill holes in the stored history from the terminal")
+    parser.add_argument("--bars", type=int, default=DEFAULT_HISTORY_BARS, help="history to store on a first sync")
+    args = parser.parse_args()
+
+    store = BarStore(args.root)
+    symbols = args.symbols or store.symbols()
+    if args.sync or args.backfill:
+        import MetaTrader5 as mt5
+        if not mt5.initialize():
+            raise RuntimeError("Failed to initialize MT5")
+        try:
+            start = time.perf_counter()
+            for sym in symbols:
+                for tf in args.timeframes:
+                    added = store.sync(mt5, sym, tf, args.bars) if args.sync else 0
+                    filled = store.backfill(mt5, sym, tf) if args.backfill else 0
+                    print(f"{sym} {tf}: +{added} new, +{filled} backfilled")
+            print(f"✅ Synced {len(symbols)} symbols in {time.perf_counter() - start:.1f}s")
+        finally:
+            mt5.shutdown()
+
+    for sym in symbols:
+        for tf in store.timeframes(sym):
+            bars = store.bars(sym, tf)
+            if len(bars):
+                print(f"{sym:<28} {tf:<4} {len(bars):>9} bars  {bar_time(bars['time'][0])} .. "
+                      f"{bar_time(bars['time'][-1])}  {len(store.gaps(sym, tf))} open gaps")
@@ -0,0 +1,115 @@
+"""
+Broker gateway
+Wraps the MetaTrader5 module so every terminal call is counted and timed, and takes
+one tick-and-positions snapshot per loop pass for the decision code to read from
+instead of asking the terminal again.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# === CONFIG ===
+REPORT_TOP_CALLS = 10  # Terminal functions listed in a report
+
+class Snapshot:
+    """One symbol's tick and open positions, taken once per loop pass"""
+    __slots__ = ('symbol', 'tick', 'positions', 'taken')
+
+    def __init__(self, symbol, tick, positions):
+        self.symbol = symbol
+        self.tick = tick
+        self.positions = list(positions or [])
+        self.taken = time.time()
+
+    def price(self, is_buy):
+        """Price a market order in that direction fills at: ask to buy, bid to sell"""
+        return self.tick.ask if is_buy else self.tick.bid
+
+    def count(self, magic=None):
+        """Open positions, only those opened with `magic` when given"""
+        return sum(1 for p in self.positions if magic is None or p.magic == magic)
+
+    def position(self, ticket):
+        return next((p for p in self.positions if p.ticket == ticket), None)
+
+class BrokerGateway:
+    """Drop-in stand-in for the MetaTrader5 module that accounts for every call.
+
+    Constants pass straight through; each function call is recorded as
+    [calls, total seconds, slowest seconds] under its name. Loop passes wrapped in
+    iteration() are timed too, so a report can set the terminal time spent on the
+    loop's own thread against the rest of the pass.
+    """
+    def __init__(self, terminal):
+        self.terminal = terminal
+        self.calls = {}  # name -> [calls, total seconds, max seconds]
+        self.iterations = 0
+        self.iteration_seconds = 0.
+        self.loop_thread = None  # Thread running iteration(); calls on others (order workers) happen off the loop
+        self.loop_terminal_seconds = 0.
+        self.started = time.time()
+        self._wrapped = {}
+        self.lock = threading.Lock()  # Calls may come from order worker threads too
+
+    def __getattr__(self, name):
+        attr = getattr(self.terminal, name)
+        if not callable(attr):
+            return attr
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            def wrapped(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    self._record(name, time.perf_counter() - start)
+            self._wrapped[name] = wrapped
+        return wrapped
+
+    def _record(self, name, seconds):
+        with self.lock:
+            stats = self.calls.setdefault(name, [0, 0., 0.])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            if threading.get_ident() == self.loop_thread:
+                self.loop_terminal_seconds += seconds
+
+    def snapshot(self, symbol):
+        """Tick and positions of symbol in two terminal calls; None without a tick"""
+        tick = self.symbol_info_tick(symbol)
+        if tick is None:
+            return None
+        return Snapshot(symbol, tick, self.positions_get(symbol=symbol))
+
+    @contextmanager
+    def iteration(self):
+        """Time one pass of the caller's loop (sleeping between passes excluded)"""
+        self.loop_thread = threading.get_ident()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.iterations += 1
+            self.iteration_seconds += time.perf_counter() - start
+
+    def report(self, top=REPORT_TOP_CALLS):
+        """Where the loop's time goes: terminal calls by total time, then everything else"""
+        with self.lock:
+            calls = {name: list(stats) for name, stats in self.calls.items()}
+            loop_terminal = self.loop_terminal_seconds
+        passes = max(self.iterations, 1)
+        terminal = sum(stats[1] for stats in calls.values()) or 1.
+        total_calls = sum(stats[0] for stats in calls.values())
+        own = max(self.iteration_seconds - loop_terminal, 0.)
+        lines = [f"📊 {self.iterations} passes in {time.time() - self.started:.0f}s: "
+                 f"{total_calls / passes:.1f} terminal calls and {self.iteration_seconds / passes * 1000:.1f} ms per pass "
+                 f"({loop_terminal / passes * 1000:.1f} ms waiting on the terminal, "
+                 f"{own / passes * 1000:.1f} ms indicators and logic)"]
+        lines.append(f"{'call':<22}{'calls':>8}{'/pass':>8}{'mean ms':>10}{'max ms':>10}{'total s':>10}{'share':>8}")
+        ranked = sorted(calls.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (count, seconds, slowest) in ranked[:top]:
+            lines.append(f"{name:<22}{count:>8}{count / passes:>8.2f}{seconds / count * 1000:>10.2f}"
+                         f"{slowest * 1000:>10.2f}{seconds:>10.2f}{seconds / terminal * 100:>7.1f}%")
+        return "\n".join(lines)
@@ -1,23 +1,30 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-import MetaTrader5 as mt5
+import time
+BOOT_TIME = time.time()  # Process start, for the time-to-first-scan report
+
+# Selenium is imported where it is used, so scan-only runs never load the browser stack
+try:
+    import MetaTrader5 as mt5
+except ImportError:
+    mt5 = None  # Offline analysis (Backtest, ParameterSweep) on machines without the terminal
 import pandas as pd
+import argparse
 import json
 import random
-import time
 import os
 import logging
-import pyperclip
-import win32clipboard
 import csv
 import requests
 import numpy as np
+import math
+import heapq
+import itertools
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from BarResampler import Resampler
+from BarStore import BarStore, timeframe_label
 
 # ===== TESTING CONFIG =====
 TEST_MODE = False # Set to False in production
@@ -62,11 +69,20 @@ logging.getLogger('tensorflow').setLevel(logging.ERROR)
 # === WhatsApp SETUP ===
 WHATSAPP_TARGET = '"IntelliTrade"'
 PROFILE_DIR = os.path.join(os.getcwd(), 'whatsapp_profile')
-os.makedirs(PROFILE_DIR, exist_ok=True)
+
+# Groups each message tier is published to (CSS-quoted chat titles)
+WHATSAPP_TARGETS = {
+    "updates": [WHATSAPP_TARGET],    # TP/SL updates and closure advisories
+    "signals": [WHATSAPP_TARGET],
+    "news": [WHATSAPP_TARGET],
+    "marketing": [WHATSAPP_TARGET]   # Spontaneous and premium messages
+}
+# Logged-in Chrome sessions used for fan-out; each needs its own profile (and QR link)
+WHATSAPP_POOL_SIZE = 1
+WHATSAPP_PROFILES = [PROFILE_DIR] + [f"{PROFILE_DIR}_{i}" for i in range(2, WHATSAPP_POOL_SIZE + 1)]
 
 # Chrome options
 CHROME_OPTIONS = [
-    f"user-data-dir={PROFILE_DIR}",
     "--profile-directory=Default",
     "--no-sandbox",
     "--disable-dev-shm-usage",
@@ -77,13 +93,125 @@ CHROME_OPTIONS = [
 ]
 CHROMEDRIVER_PATH = "chromedriver.exe"
 
-def setup_whatsapp():
+WHATSAPP_LOGIN_TIMEOUT = 240  # Seconds to wait for login (including a QR scan)
+LOGIN_PROBE_WAIT = 10  # Max seconds one probe waits in-page for the state to change
+
+# Page states in priority order, each with the selectors that identify it
+LOGIN_STATE_SELECTORS = {
+    "logged_in": [
+        "div[data-testid='chat-list']",
+        "div[title='Type a message']",
+        "div[data-testid='conversation-panel']",
+        "div[aria-label='Message list']",
+        "header[data-testid='conversation-header']",
+        "div[role='grid']"
+    ],
+    "qr": [
+        "canvas[aria-label='Scan me!']",
+        "div[data-ref]",
+        "canvas[data-ref]",
+        "div[data-testid='qrcode']"
+    ],
+    "loading": [
+        "div[data-testid='loading-screen']",
+        "div[aria-label='Loading...']",
+        "div[class*='loading']",
+        "div[class*='spinner']"
+    ],
+    "error": [
+        "div[class*='error']",
+        "div[class*='exception']",
+        "div[class*='problem']",
+        "div[class*='refresh']"
+    ]
+}
+
+# Classify the page in one round-trip; if it is still in `previous` state, watch DOM
+# mutations and answer as soon as it changes (or after waitMs)
+LOGIN_PROBE_JS = """
+const [states, waitMs, previous] = arguments;
+const done = arguments[arguments.length - 1];
+const classify = () => {
+    for (const [state, selectors] of Object.entries(states)) {
+        for (const selector of selectors) {
+            const el = document.querySelector(selector);
+            if (el) return {state: state, selector: selector, text: (el.innerText || '').slice(0, 100)};
+        }
+    }
+    return {state: 'unknown', selector: null, text: ''};
+};
+const first = classify();
+if (first.state !== previous) { done(first); return; }
+let timer = null;
+const observer = new MutationObserver(() => {
+    const result = classify();
+    if (result.state !== previous) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(result);
+    }
+});
+observer.observe(document, {childList: true, subtree: true, attributes: true});
+timer = setTimeout(() => { observer.disconnect(); done(classify()); }, waitMs);
+"""
+
+def wait_for_login(driver, timeout=WHATSAPP_LOGIN_TIMEOUT):
+    """Block until WhatsApp Web shows a logged-in page; False on timeout"""
+    driver.set_script_timeout(LOGIN_PROBE_WAIT + 5)
+    deadline = time.time() + timeout
+    previous = None
+    screenshot_saved = False
+    
+    while time.time() < deadline:
+        try:
+            result = driver.execute_async_script(LOGIN_PROBE_JS, LOGIN_STATE_SELECTORS, LOGIN_PROBE_WAIT * 1000, previous)
+        except Exception as e:
+            # Navigation or reload while the probe was waiting
+            print(f"⚠️ Detection error: {str(e)[:100]}")
+            previous = None
+            time.sleep(1)
+            continue
+        
+        state = result['state']
+        if state != previous:
+            if state == "logged_in":
+                print(f"✅ Detected {result['selector']} - logged in")
+                return True
+            elif state == "qr":
+                print(f"⚠️ Detected QR code ({result['selector']}) - please scan to login")
+            elif state == "loading":
+                print("⏳ WhatsApp is loading...")
+            elif state == "error":
+                print(f"⚠️ Error detected: {result['text']}")
+                print("Attempting to refresh page...")
+                driver.refresh()
+                previous = None
+                continue
+            elif not screenshot_saved:
+                print("⚠️ Unrecognized screen state - saving screenshot")
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                screenshot_name = f'whatsapp_unknown_{timestamp}.png'
+                driver.save_screenshot(screenshot_name)
+                print(f"Saved screenshot as '{screenshot_name}'")
+                screenshot_saved = True
+        previous = state
+    
+    return False
+
+def setup_whatsapp(profile_dir=PROFILE_DIR):
     """Initialize Chrome with persistent session handling"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.support.ui import WebDriverWait
+    
     try:
-        print("Initializing Chrome with persistent profile...")
+        print(f"Initializing Chrome with persistent profile {profile_dir}...")
+        os.makedirs(profile_dir, exist_ok=True)
         service = Service(executable_path=CHROMEDRIVER_PATH)
         options = Options()
         
+        options.add_argument(f"user-data-dir={profile_dir}")
         for option in CHROME_OPTIONS:
             options.add_argument(option)
             
@@ -107,107 +235,9 @@ def setup_whatsapp():
         print("="*50 + "\n")
         
         # Wait for login state
-        start_time = time.time()
-        timeout = 240
-        logged_in = False
-        
-        while time.time() - start_time < timeout:
-            try:
-                print(f"Current URL: {driver.current_url}")
-                print(f"Page title: {driver.title}")
-                
-                # Login detection logic
-                logged_in_selectors = [
-                    ("div[data-testid='chat-list']", "chat list"),
-                    ("div[title='Type a message']", "message input"),
-                    ("div[data-testid='conversation-panel']", "conversation panel"),
-                    ("div[aria-label='Message list']", "message list"),
-                    ("header[data-testid='conversation-header']", "conversation header"),
-                    ("div[role='grid']", "message grid")
-                ]
-                
-                for selector, description in logged_in_selectors:
-                    if len(driver.find_elements(By.CSS_SELECTOR, selector)) > 0:
-                        print(f"✅ Detected {description} - logged in")
-                        logged_in = True
-                        break
-                
-                if logged_in:
-                    break
-                    
-                # QR code detection
-                qr_selectors = [
-                    ("canvas[aria-label='Scan me!']", "QR code canvas"),
-                    ("div[data-ref]", "QR code container"),
-                    ("canvas[data-ref]", "QR code data-ref"),
-                    ("div[data-testid='qrcode']", "QR code testid")
-                ]
-                
-                for selector, description in qr_selectors:
-                    if len(driver.find_elements(By.CSS_SELECTOR, selector)) > 0:
-                        print(f"⚠️ Detected {description} - please scan to login")
-                        scan_start = time.time()
-                        while time.time() - scan_start < 180:
-                            for login_selector, desc in logged_in_selectors:
-                                if len(driver.find_elements(By.CSS_SELECTOR, login_selector)) > 0:
-                                    print(f"✅ Login detected after QR scan ({desc})")
-                                    logged_in = True
-                                    break
-                            if logged_in:
-                                break
-                            print("Waiting for QR scan to complete...")
-                            time.sleep(5)
-                        break
-                
-                if logged_in:
-                    break
-                    
-                # Loading states
-                loading_selectors = [
-                    "div[data-testid='loading-screen']",
-                    "div[aria-label='Loading...']",
-                    "div[class*='loading']",
-                    "div[class*='spinner']"
-                ]
-                
-                for selector in loading_selectors:
-                    if len(driver.find_elements(By.CSS_SELECTOR, selector)) > 0:
-                        print("⏳ WhatsApp is loading...")
-                        time.sleep(5)
-                        continue
-                
-                # Error handling
-                error_selectors = [
-                    "div[class*='error']",
-                    "div[class*='exception']",
-                    "div[class*='problem']",
-                    "div[class*='refresh']"
-                ]
-                
-                for selector in error_selectors:
-                    elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                    if elements:
-                        print(f"⚠️ Error detected: {elements[0].text[:100]}")
-                        print("Attempting to refresh page...")
-                        driver.refresh()
-                        time.sleep(5)
-                        break
-                
-                # Unrecognized state
-                print("⚠️ Unrecognized screen state - saving screenshot")
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                screenshot_name = f'whatsapp_unknown_{timestamp}.png'
-                driver.save_screenshot(screenshot_name)
-                print(f"Saved screenshot as '{screenshot_name}'")
-                time.sleep(5)
-                
-            except Exception as e:
-                print(f"⚠️ Detection error: {str(e)}")
-                time.sleep(5)
-            
-        if not logged_in:
+        if not wait_for_login(driver):
             driver.save_screenshot('whatsapp_timeout.png')
-            print("❌ WhatsApp login detection timed out after 4 minutes")
+            print(f"❌ WhatsApp login detection timed out after {WHATSAPP_LOGIN_TIMEOUT} seconds")
             raise RuntimeError("WhatsApp login detection timed out")
         
         wait = WebDriverWait(driver, 30)
@@ -221,15 +251,23 @@ def setup_whatsapp():
 
 # === CONFIG ===
 MT5_PATH = r"C:\Program Files\MetaTrader 5 Terminal\terminal64.exe"
-TIMEFRAME = mt5.TIMEFRAME_M1
+TIMEFRAME_LABEL = "M1"  # TIMEFRAME's name in the bar store
+TIMEFRAME = mt5.TIMEFRAME_M1 if mt5 else None
+SIGNAL_TIMEFRAME = "M30"  # Timeframe advertised in signals; built from the TIMEFRAME bars
 DONCHIAN_PERIOD = 20
 MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
 SMA_PERIOD_SHORT = 9
 SMA_PERIOD_LONG = 21
 RSI_PERIOD = 14
+USE_BATCH_INDICATORS = False  # One vectorized indicator pass over all symbols (large symbol lists)
 FIB_LEVELS = [100, 161.8, 261.8, 423.6]
 RR = 3
-TRACK_FILE = "intellitrade_trades.json"
+TRACK_FILE = "intellitrade_trades.json"  # Snapshot of the trades in the book
+TRACK_ARCHIVE = "intellitrade_trades_archive.jsonl"  # Closed trades evicted from the book, one per line
+MAX_TRADES_PER_SYMBOL = 1  # Open (non-simulated) trade ladders allowed per symbol at once
+TRACK_JOURNAL = "intellitrade_trades.journal"  # Trade changes since the snapshot, one JSON record per line
+JOURNAL_FSYNC_INTERVAL = 1.0  # Max seconds journal records sit unsynced (fsyncs are batched)
+JOURNAL_COMPACT_RECORDS = 500  # Fold the journal into a fresh snapshot after this many records
 DAILY_SUMMARY_FILE = "daily_trading_summary.txt"
 TRADE_PERFORMANCE_DIR = "trade_performance_data"
 
@@ -248,16 +286,253 @@ REASONS = [
 ]
 
 # === TRACKING ===
-def load_trades():
-    try:
-        with open(TRACK_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+class Trade:
+    """One signalled trade: its TP ladder, stop and progress so far.
+
+    checked is the server time (ms) up to which prices have been checked for TP/SL
+    touches; None means only from the next check on.
+    """
+    __slots__ = ('id', 'symbol', 'dir', 'entry', 'tps', 'sl', 'status', 'hit',
+                 'indicators', 'closure_advised', 'simulated', 'checked')
+
+    def __init__(self, id, symbol, dir, entry, tps, sl, indicators, status="open",
+                 hit=None, closure_advised=False, simulated=False, checked=None):
+        self.id = id
+        self.symbol = symbol
+        self.dir = dir
+        self.entry = entry
+        self.tps = tps
+        self.sl = sl
+        self.indicators = indicators
+        self.status = status
+        self.hit = hit if hit is not None else []
+        self.closure_advised = closure_advised
+        self.simulated = simulated
+        self.checked = checked
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+class TradeBook:
+    """Trades keyed by Trade ID, with indexes by symbol and by status.
+
+    A symbol may hold several trades. Closed trades stay in the book (out of the
+    'open' index) until evict_closed() hands them over to the archive.
+    """
+    def __init__(self):
+        self.trades = {}  # Trade ID -> Trade
+        self.by_symbol = {}  # Symbol -> {Trade ID}
+        self.by_status = {}  # Status -> {Trade ID}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.trades)
+
+    def get(self, tid):
+        return self.trades.get(tid)
+
+    def add(self, trade):
+        with self.lock:
+            if trade.id in self.trades:
+                self._unindex(self.trades[trade.id])
+            self.trades[trade.id] = trade
+            self.by_symbol.setdefault(trade.symbol, set()).add(trade.id)
+            self.by_status.setdefault(trade.status, set()).add(trade.id)
+
+    def set_status(self, trade, status):
+        with self.lock:
+            self.by_status.get(trade.status, set()).discard(trade.id)
+            trade.status = status
+            self.by_status.setdefault(status, set()).add(trade.id)
+
+    def with_status(self, status):
+        with self.lock:
+            return [self.trades[tid] for tid in self.by_status.get(status, ())]
+
+    def open_trades(self, symbol=None):
+        """Open trades, optionally only those on one symbol"""
+        with self.lock:
+            if symbol is None:
+                return self.with_status("open")
+            return [self.trades[tid] for tid in self.by_symbol.get(symbol, ())
+                    if self.trades[tid].status == "open"]
+
+    def evict_closed(self):
+        """Remove and return every closed trade"""
+        with self.lock:
+            closed = self.with_status("closed")
+            for trade in closed:
+                self._unindex(trade)
+                del self.trades[trade.id]
+            return closed
+
+    def _unindex(self, trade):
+        ids = self.by_symbol.get(trade.symbol)
+        if ids is not None:
+            ids.discard(trade.id)
+            if not ids:
+                del self.by_symbol[trade.symbol]
+        self.by_status.get(trade.status, set()).discard(trade.id)
+
+class TradeStore:
+    """Crash-safe persistence for the trade book: a snapshot plus an append-only journal.
+
+    Every change is appended as one compact record (open, tp_hit, advised, closed,
+    checked), so saving costs the same however many trades are tracked. Records are
+    flushed to the OS immediately and fsynced in batches. checkpoint() folds the journal into a new
+    snapshot, written to a temp file and swapped in atomically, once it has grown past
+    compact_records; closed trades are moved to the archive at the same time.
+    load() reads the snapshot and replays the journal on top of it.
+    """
+    def __init__(self, snapshot_path=TRACK_FILE, journal_path=TRACK_JOURNAL, archive_path=TRACK_ARCHIVE,
+                 fsync_interval=JOURNAL_FSYNC_INTERVAL, compact_records=JOURNAL_COMPACT_RECORDS):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.archive_path = archive_path
+        self.fsync_interval = fsync_interval
+        self.compact_records = compact_records
+        self.journal = None
+        self.records = 0  # Records in the journal since the last snapshot
+        self.dirty = False  # Records written but not yet fsynced
+        self.last_fsync = time.time()
+        self.lock = threading.Lock()
+
+    def load(self):
+        """The trade book from the snapshot with the journal replayed on top"""
+        book = TradeBook()
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                snapshot = json.load(f)
+            # Older snapshots are a dict keyed by symbol
+            for data in snapshot['trades'] if 'trades' in snapshot else snapshot.values():
+                book.add(Trade.from_dict(data))
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError as e:
+            # Snapshots are swapped in atomically, so this is damage from outside the store
+            print(f"❌ Trade snapshot {self.snapshot_path} is unreadable ({e}) - rebuilding from the journal only")
+        
+        good_bytes = 0
+        try:
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        self.apply(book, json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        print(f"⚠️ Discarding torn journal record at byte {good_bytes} of {self.journal_path}")
+                        break
+                    good_bytes += len(line)
+                    self.records += 1
+            # Cut a torn tail so new records do not get glued onto it
+            if good_bytes < os.path.getsize(self.journal_path):
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(good_bytes)
+        except FileNotFoundError:
+            pass
+        
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        return book
+
+    @staticmethod
+    def apply(book, record):
+        """Replay one journal record; replaying a record twice changes nothing"""
+        op = record['op']
+        if op == 'open':
+            book.add(Trade.from_dict(record['trade']))
+            return
+        if op == 'checked':
+            for tid, checked in record['at'].items():
+                trade = book.get(tid)
+                if trade is not None:  # Archived otherwise
+                    trade.checked = max(checked, trade.checked or checked)
+            return
+        trade = book.get(record['id'])
+        if trade is None:
+            return  # Already archived
+        if op == 'tp_hit':
+            if record['tp'] not in trade.hit:
+                trade.hit.append(record['tp'])
+        elif op == 'advised':
+            trade.closure_advised = True
+        elif op == 'closed':
+            book.set_status(trade, record['status'])
+        else:
+            raise KeyError(op)
+
+    def opened(self, trade):
+        self._append({'op': 'open', 'trade': trade.to_dict()})
+
+    def tp_hit(self, trade, tp):
+        self._append({'op': 'tp_hit', 'id': trade.id, 'tp': tp})
+
+    def advised(self, trade):
+        self._append({'op': 'advised', 'id': trade.id})
+
+    def closed(self, trade):
+        self._append({'op': 'closed', 'id': trade.id, 'status': trade.status})
+
+    def checked(self, trades):
+        """How far prices have been checked, for many trades in one record"""
+        if trades:
+            self._append({'op': 'checked', 'at': {trade.id: trade.checked for trade in trades}})
+
+    def _append(self, record):
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with self.lock:
+            self.journal.write(line)
+            self.journal.flush()
+            self.records += 1
+            self.dirty = True
+            if time.time() - self.last_fsync >= self.fsync_interval:
+                self._fsync()
+
+    def _fsync(self):
+        os.fsync(self.journal.fileno())
+        self.dirty = False
+        self.last_fsync = time.time()
+
+    def checkpoint(self, book, force=False):
+        """Sync pending records and compact the journal once it is long enough (or if forced)"""
+        with self.lock:
+            if self.dirty:
+                self._fsync()
+            if not force and self.records < self.compact_records:
+                return
+            if not self.records and os.path.exists(self.snapshot_path):
+                return
+            
+            # Closed trades go to the archive first, so a crash before the snapshot
+            # swap can at worst archive them twice, never lose them
+            closed = book.evict_closed()
+            if closed:
+                with open(self.archive_path, 'a', encoding='utf-8') as f:
+                    for trade in closed:
+                        f.write(json.dumps(trade.to_dict(), separators=(',', ':')) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            
+            with book.lock:
+                snapshot = {'trades': [trade.to_dict() for trade in book.trades.values()]}
+            temp_path = self.snapshot_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(snapshot, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            
+            # The snapshot now holds everything, so the journal can start over
+            self.journal.close()
+            self.journal = open(self.journal_path, 'w', encoding='utf-8')
+            self.records = 0
 
-def save_trades(trades):
-    with open(TRACK_FILE, 'w') as f:
-        json.dump(trades, f, indent=4)
+    def close(self, book):
+        self.checkpoint(book, force=True)
+        with self.lock:
+            self.journal.close()
 
 def gen_id(sym): 
     return f"{sym}_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
@@ -301,8 +576,8 @@ def get_upcoming_news():
         print(f"❌ Failed to fetch news: {e}")
         return []
 
-def send_news_alert(driver, wait, event):
-    """Send news alert notification via WhatsApp"""
+def send_news_alert(dispatcher, event):
+    """Queue news alert notification for WhatsApp"""
     try:
         # Format the news event
         event_time = event['time'].strftime('%Y-%m-%d %H:%M UTC')
@@ -319,7 +594,7 @@ def send_news_alert(driver, wait, event):
 ━━━━━━━━━━━━━━━━━━━━━━
 💡 _Monitor market volatility_
 """
-        return send_whatsapp_message(driver, wait, message)
+        return dispatcher.enqueue(message, PRIORITY_NEWS)
     except Exception as e:
         print(f"❌ Failed to send news alert: {e}")
         return False
@@ -363,13 +638,40 @@ def validate_prices(entry, tps, sl, direction, symbol, last_close):
     return True
 
 # === TRADE LOGGING ===
+PERFORMANCE_FIELDS = [
+    'Timestamp', 'TradeID', 'Symbol', 'Direction', 'Entry', 'Exit', 
+    'Outcome', 'Pips', 'DonchianUpper', 'DonchianLower',
+    'MACD_Main', 'MACD_Signal', 'MACD_Hist', 
+    'RSI', 'RSI_Status', 'SMA_9', 'SMA_21', 'SMA_Alignment'
+]
+PERFORMANCE_FLUSH_ROWS = 50  # Buffered rows that force a flush to disk
+PERFORMANCE_FLUSH_INTERVAL = 5  # Max seconds a logged row stays in the buffer
+SUMMARY_WRITE_INTERVAL = 5  # Min seconds between rewrites of the daily summary
+
 class TradePerformance:
+    """Daily trade performance CSV (one file per UTC day) plus a running summary.
+
+    The day's CSV stays open with one buffered writer; rows are flushed once
+    PERFORMANCE_FLUSH_ROWS pile up or PERFORMANCE_FLUSH_INTERVAL passes, and at close().
+    Summary stats are updated per row but the summary file is rewritten at most every
+    SUMMARY_WRITE_INTERVAL seconds. Call flush() regularly so time-based flushes and
+    the midnight rollover happen even when no trades are logged.
+    """
     def __init__(self):
         # Create directory for trade performance data
         os.makedirs(TRADE_PERFORMANCE_DIR, exist_ok=True)
         
-        # Initialize daily summary
-        self.today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        self.today = None  # UTC day of the open partition
+        self.file = None
+        self.writer = None
+        self.unflushed = 0
+        self.last_flush = time.time()
+        self.summary_dirty = False
+        self.last_summary_write = 0.
+        self.lock = threading.Lock()
+        self._reset_stats()
+    
+    def _reset_stats(self):
         self.trade_count = 0
         self.wins = 0
         self.losses = 0
@@ -390,25 +692,63 @@ class TradePerformance:
             if not is_valid_price(price, trade_data['Symbol']):
                 print(f"⚠️ Invalid price {price} for {trade_data['Symbol']} - skipping log")
                 return
-                
-        filename = os.path.join(TRADE_PERFORMANCE_DIR, f"trade_performance_{self.today}.csv")
-        file_exists = os.path.isfile(filename)
         
-        with open(filename, 'a', newline='', encoding='utf-8') as f:
-            fieldnames = [
-                'Timestamp', 'TradeID', 'Symbol', 'Direction', 'Entry', 'Exit', 
-                'Outcome', 'Pips', 'DonchianUpper', 'DonchianLower',
-                'MACD_Main', 'MACD_Signal', 'MACD_Hist', 
-                'RSI', 'RSI_Status', 'SMA_9', 'SMA_21', 'SMA_Alignment'
-            ]
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            
-            if not file_exists:
-                writer.writeheader()
+        with self.lock:
+            self._roll_over(datetime.now(timezone.utc).strftime('%Y-%m-%d'))
+            if self.file is None:
+                filename = os.path.join(TRADE_PERFORMANCE_DIR, f"trade_performance_{self.today}.csv")
+                file_exists = os.path.isfile(filename) and os.path.getsize(filename) > 0
+                self.file = open(filename, 'a', newline='', encoding='utf-8', buffering=64 * 1024)
+                self.writer = csv.DictWriter(self.file, fieldnames=PERFORMANCE_FIELDS)
+                if not file_exists:
+                    self.writer.writeheader()
             
-            writer.writerow(trade_data)
-        
-        # Update daily summary stats
+            self.writer.writerow(trade_data)
+            self.unflushed += 1
+            self._update_stats(trade_data)
+            self._flush_due(force=False)
+    
+    def flush(self, force=False):
+        """Flush buffered rows and the summary if their thresholds have passed (or if forced)"""
+        with self.lock:
+            self._roll_over(datetime.now(timezone.utc).strftime('%Y-%m-%d'))
+            self._flush_due(force)
+    
+    def close(self):
+        with self.lock:
+            self._flush_due(force=True)
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+    
+    def _roll_over(self, day):
+        """Finish the previous day's partition and summary when the UTC date changes"""
+        if day == self.today:
+            return
+        if self.today is not None:
+            self._flush_due(force=True)
+            if self.file is not None:
+                self.file.close()
+            print(f"📅 Trade log rolled over to {day}")
+        self.file = None
+        self.writer = None
+        self.today = day
+        self._reset_stats()
+    
+    def _flush_due(self, force):
+        now = time.time()
+        if self.unflushed and (force or self.unflushed >= PERFORMANCE_FLUSH_ROWS
+                               or now - self.last_flush >= PERFORMANCE_FLUSH_INTERVAL):
+            self.file.flush()
+            self.unflushed = 0
+            self.last_flush = now
+        if self.summary_dirty and (force or now - self.last_summary_write >= SUMMARY_WRITE_INTERVAL):
+            self.update_daily_summary()
+            self.summary_dirty = False
+            self.last_summary_write = now
+    
+    def _update_stats(self, trade_data):
+        """Update daily summary stats with one logged row"""
         self.trade_count += 1
         pips = trade_data['Pips']
         
@@ -434,9 +774,7 @@ class TradePerformance:
             self.win_streak = self.current_win_streak
         if self.current_loss_streak > self.loss_streak:
             self.loss_streak = self.current_loss_streak
-            
-        # Update daily summary file
-        self.update_daily_summary()
+        self.summary_dirty = True
     
     def update_daily_summary(self):
         """Update daily summary file with current statistics"""
@@ -444,6 +782,7 @@ class TradePerformance:
         profit_factor = (self.wins / self.losses) if self.losses > 0 else float('inf')
         avg_win = (self.total_pips / self.wins) if self.wins > 0 else 0
         avg_loss = (abs(self.total_pips) / self.losses) if self.losses > 0 else 0
+        avg_pips = (self.total_pips / self.trade_count) if self.trade_count > 0 else 0
         
         summary = f"""
 === DAILY TRADING SUMMARY ===
@@ -454,7 +793,7 @@ Wins: {self.wins} ({win_rate:.2f}%)
 Losses: {self.losses}
 Profit Factor: {profit_factor:.2f}
 Total Pips: {self.total_pips:.2f}
-Avg Pips/Trade: {self.total_pips/self.trade_count:.2f if self.trade_count > 0 else 0}
+Avg Pips/Trade: {avg_pips:.2f}
 Max Win: {self.max_win:.2f} pips
 Max Loss: {self.max_loss:.2f} pips
 TPs Hit: {self.tp_hits}
@@ -467,8 +806,11 @@ Avg Win: {avg_win:.2f} pips
 Avg Loss: {avg_loss:.2f} pips
 """
         
-        with open(DAILY_SUMMARY_FILE, 'w') as f:
+        # Swap the file in whole so readers never see a half-written summary
+        temp_path = DAILY_SUMMARY_FILE + ".tmp"
+        with open(temp_path, 'w') as f:
             f.write(summary)
+        os.replace(temp_path, DAILY_SUMMARY_FILE)
         print(f"✅ Updated daily summary at {DAILY_SUMMARY_FILE}")
 
 # === INDICATORS ===
@@ -483,6 +825,13 @@ def get_macd(df):
     histogram = macd_line - signal_line
     return macd_line, signal_line, histogram
 
+def get_trend(rates):
+    """'Bullish'/'Bearish' from the MACD histogram at the last bar, None without enough bars"""
+    if rates is None or len(rates) <= MACD_SLOW:
+        return None
+    _, _, histogram = get_macd(pd.DataFrame({'close': rates['close'].astype(float)}))
+    return "Bullish" if histogram.iloc[-1] > 0 else "Bearish"
+
 def get_rsi(df, period=RSI_PERIOD):
     delta = df['close'].diff()
     gain = delta.where(delta > 0, 0)
@@ -498,15 +847,471 @@ def get_rsi(df, period=RSI_PERIOD):
 def get_sma(df, period):
     return df['close'].rolling(period).mean()
 
-def calc_tps_sl(entry, direction, donchian_upper, donchian_lower):
-    """Calculate profit targets based on Donchian channel height"""
+# === INCREMENTAL INDICATORS ===
+INDICATOR_WARMUP_BARS = 1000  # Closed bars used once to seed EMA/RSI state per symbol
+
+class EWMean:
+    """Exponentially weighted mean stepping exactly like pandas ewm(...).mean()"""
+    def __init__(self, span=None, alpha=None, adjust=True):
+        com = (span - 1) / 2 if span is not None else (1 - alpha) / alpha
+        alpha = 1. / (1. + com)
+        self.old_wt_factor = 1. - alpha
+        self.new_wt = 1. if adjust else alpha
+        self.adjust = adjust
+        self.value = None
+        self.old_wt = 1.
+
+    def step(self, cur):
+        """Return (value, old_wt) after adding cur, without changing state"""
+        if self.value is None:
+            return cur, 1.
+        weighted = self.value
+        old_wt = self.old_wt * self.old_wt_factor
+        if weighted != cur:
+            weighted = old_wt * weighted + self.new_wt * cur
+            weighted /= (old_wt + self.new_wt)
+        old_wt = old_wt + self.new_wt if self.adjust else 1.
+        return weighted, old_wt
+
+    def update(self, cur):
+        self.value, self.old_wt = self.step(cur)
+        return self.value
+
+class RollingMean:
+    """Running window sum with the same compensated add/remove steps as pandas rolling().mean()"""
+    def __init__(self, period):
+        self.period = period
+        self.window = deque()
+        self.state = None  # [nobs, sum_x, neg_ct, comp_add, comp_remove, same_ct, prev_value]
+
+    @staticmethod
+    def _add(state, val):
+        nobs, sum_x, neg_ct, comp_add, comp_remove, same_ct, prev_value = state
+        y = val - comp_add
+        t = sum_x + y
+        comp_add = t - sum_x - y
+        same_ct = same_ct + 1 if val == prev_value else 1
+        return [nobs + 1, t, neg_ct + (math.copysign(1, val) < 0), comp_add, comp_remove, same_ct, val]
+
+    @staticmethod
+    def _remove(state, val):
+        nobs, sum_x, neg_ct, comp_add, comp_remove, same_ct, prev_value = state
+        y = -val - comp_remove
+        t = sum_x + y
+        comp_remove = t - sum_x - y
+        return [nobs - 1, t, neg_ct - (math.copysign(1, val) < 0), comp_add, comp_remove, same_ct, prev_value]
+
+    def _next_state(self, val):
+        state = self.state or [0, 0., 0, 0., 0., 0, val]
+        if len(self.window) == self.period:
+            state = self._remove(state, self.window[0])
+        return self._add(state, val)
+
+    @staticmethod
+    def _mean(state, period):
+        nobs, sum_x, neg_ct, _, _, same_ct, prev_value = state
+        if nobs < period:
+            return float('nan')
+        if same_ct >= nobs:
+            return prev_value
+        result = sum_x / nobs
+        if neg_ct == 0 and result < 0:
+            return 0.
+        if neg_ct == nobs and result > 0:
+            return 0.
+        return result
+
+    def peek(self, val):
+        return self._mean(self._next_state(val), self.period)
+
+    def update(self, val):
+        self.state = self._next_state(val)
+        self.window.append(val)
+        if len(self.window) > self.period:
+            self.window.popleft()
+        return self._mean(self.state, self.period)
+
+class RollingExtreme:
+    """Monotonic-deque rolling max (or min) over the last `period` values"""
+    def __init__(self, period, use_max=True):
+        self.period = period
+        self.better = (lambda a, b: a >= b) if use_max else (lambda a, b: a <= b)
+        self.items = deque()  # (index, value), values monotonic from the front
+        self.count = 0
+
+    def peek(self, val):
+        """Extreme of the last period-1 committed values plus val"""
+        if self.count + 1 < self.period:
+            return float('nan')
+        oldest = self.count + 1 - self.period
+        for idx, best in self.items:
+            if idx >= oldest:
+                return best if self.better(best, val) else val
+        return val
+
+    def update(self, val):
+        while self.items and self.better(val, self.items[-1][1]):
+            self.items.pop()
+        self.items.append((self.count, val))
+        self.count += 1
+        while self.items[0][0] <= self.count - 1 - self.period:
+            self.items.popleft()
+        return self.items[0][1] if self.count >= self.period else float('nan')
+
+class IncrementalIndicators:
+    """Per-symbol Donchian/MACD/RSI/SMA state, advanced in O(1) per closed bar.
+
+    Fed the same bars, values are identical to get_donchian, get_macd, get_rsi
+    and get_sma. State is seeded once from INDICATOR_WARMUP_BARS of history so
+    the EMAs are converged instead of restarting on every 70-bar window.
+    """
+    def __init__(self):
+        self.upper = RollingExtreme(DONCHIAN_PERIOD, use_max=True)
+        self.lower = RollingExtreme(DONCHIAN_PERIOD, use_max=False)
+        self.ema_fast = EWMean(span=MACD_FAST, adjust=False)
+        self.ema_slow = EWMean(span=MACD_SLOW, adjust=False)
+        self.signal = EWMean(span=MACD_SIGNAL, adjust=False)
+        self.avg_gain = EWMean(alpha=1/RSI_PERIOD)
+        self.avg_loss = EWMean(alpha=1/RSI_PERIOD)
+        self.sma_short = RollingMean(SMA_PERIOD_SHORT)
+        self.sma_long = RollingMean(SMA_PERIOD_LONG)
+        self.prev_close = None
+        self.last_time = None
+        self.last = None
+
+    def _gain_loss(self, close):
+        # diff() of the first bar is NaN, which get_rsi turns into a 0 gain and loss
+        delta = close - self.prev_close if self.prev_close is not None else float('nan')
+        return (delta if delta > 0 else 0.), -(delta if delta < 0 else 0.)
+
+    @staticmethod
+    def _rsi(avg_gain, avg_loss):
+        if avg_loss == 0:
+            return 100. if avg_gain > 0 else float('nan')
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+    def _values(self, close, upper, lower, fast, slow, signal, avg_gain, avg_loss, sma_short, sma_long):
+        macd_line = fast - slow
+        return {
+            'close': close,
+            'donchian_upper': upper,
+            'donchian_lower': lower,
+            'macd_main': macd_line,
+            'macd_signal': signal,
+            'macd_hist': macd_line - signal,
+            'rsi': self._rsi(avg_gain, avg_loss),
+            'sma_9': sma_short,
+            'sma_21': sma_long
+        }
+
+    def update(self, bar_time, high, low, close):
+        """Commit a closed bar and return the indicator values at that bar"""
+        gain, loss = self._gain_loss(close)
+        fast = self.ema_fast.update(close)
+        slow = self.ema_slow.update(close)
+        self.last = self._values(
+            close,
+            self.upper.update(high),
+            self.lower.update(low),
+            fast, slow,
+            self.signal.update(fast - slow),
+            self.avg_gain.update(gain),
+            self.avg_loss.update(loss),
+            self.sma_short.update(close),
+            self.sma_long.update(close)
+        )
+        self.prev_close = close
+        self.last_time = bar_time
+        return self.last
+
+    def peek(self, high, low, close):
+        """Indicator values with a still-forming bar appended, leaving state untouched"""
+        gain, loss = self._gain_loss(close)
+        fast = self.ema_fast.step(close)[0]
+        slow = self.ema_slow.step(close)[0]
+        return self._values(
+            close,
+            self.upper.peek(high),
+            self.lower.peek(low),
+            fast, slow,
+            self.signal.step(fast - slow)[0],
+            self.avg_gain.step(gain)[0],
+            self.avg_loss.step(loss)[0],
+            self.sma_short.peek(close),
+            self.sma_long.peek(close)
+        )
+
+    def feed(self, rates):
+        """Commit every bar in an MT5 rates array newer than the last committed one"""
+        start = 0 if self.last_time is None else np.searchsorted(rates['time'], self.last_time, side='right')
+        for bar in rates[start:]:
+            self.update(int(bar['time']), float(bar['high']), float(bar['low']), float(bar['close']))
+        return self.last
+
+def sync_indicators(engines, sym, rates):
+    """Advance a symbol's engine over newly closed bars in rates, seeding it on first use or after a gap.
+
+    The last row of rates is the forming bar and is never committed. Pass enough
+    history (up to INDICATOR_WARMUP_BARS) for the first call to converge the EMAs.
+    """
+    closed = rates[:-1]
+    engine = engines.get(sym)
+    if engine is None or engine.last_time is None or closed['time'][0] > engine.last_time:
+        engine = IncrementalIndicators()
+        engines[sym] = engine
+    engine.feed(closed)
+    return engine
+
+# === BAR CACHE ===
+BAR_CACHE_SIZE = INDICATOR_WARMUP_BARS + 1  # Warm-up history plus the forming bar
+BAR_CACHE_MAX_AGE = 5  # Seconds before a cached symbol is topped up again
+HIGHER_TIMEFRAME_BARS = 200  # Bars kept per symbol for higher-timeframe context
+
+class BarCache:
+    """Fixed-size ring buffer of MT5 rates per symbol/timeframe, topped up with delta fetches.
+
+    After the first full load only bars at or after the last cached one are requested,
+    which is normally a single 2-bar call. Scanning and trade monitoring share one cache.
+    With a BarStore the first load takes the closed history from disk (fetching only
+    what the store is missing), and every bar that closes is appended to the store.
+    """
+    def __init__(self, size=BAR_CACHE_SIZE, max_age=BAR_CACHE_MAX_AGE, store=None):
+        self.size = size
+        self.max_age = max_age
+        self.store = store
+        self.buffers = {}  # (symbol, timeframe) -> {'data', 'head', 'count', 'refreshed'}
+        self.resamplers = {}  # (symbol, label) -> Resampler fed from the cached M1 bars
+        self.lock = threading.RLock()  # Shared by the scan pipeline and the monitor
+
+    def _load(self, key, rates):
+        data = np.zeros(self.size, dtype=rates.dtype)
+        rates = rates[-self.size:]
+        data[:len(rates)] = rates
+        self.buffers[key] = {'data': data, 'head': len(rates) % self.size, 'count': len(rates), 'refreshed': 0}
+
+    def _append(self, buf, bar):
+        buf['data'][buf['head']] = bar
+        buf['head'] = (buf['head'] + 1) % self.size
+        buf['count'] = min(buf['count'] + 1, self.size)
+
+    def refresh(self, sym, timeframe=TIMEFRAME):
+        """Pull bars newer than the cached ones; returns False if the terminal has no data"""
+        with self.lock:
+            return self._refresh(sym, timeframe)
+
+    def _refresh(self, sym, timeframe):
+        key = (sym, timeframe)
+        buf = self.buffers.get(key)
+        if buf is None:
+            rates = self._warm_start(sym, timeframe)
+            if rates is None:
+                rates = mt5.copy_rates_from_pos(sym, timeframe, 0, self.size)
+            if rates is None or len(rates) == 0:
+                return False
+            self._load(key, rates)
+        else:
+            last_time = buf['data'][(buf['head'] - 1) % self.size]['time']
+            count = 2
+            while True:
+                rates = mt5.copy_rates_from_pos(sym, timeframe, 0, count)
+                if rates is None or len(rates) == 0:
+                    return False
+                if rates['time'][0] <= last_time or count >= self.size:
+                    break
+                count = min(count * 2, self.size)
+
+            if rates['time'][0] > last_time:
+                # Gap wider than the buffer: start over from what we just fetched
+                self._load(key, rates)
+            else:
+                for bar in rates[rates['time'] >= last_time]:
+                    if bar['time'] == last_time:
+                        buf['data'][(buf['head'] - 1) % self.size] = bar  # Forming bar update
+                    else:
+                        self._append(buf, bar)
+            label = timeframe_label(mt5, timeframe) if self.store else None
+            if label and len(rates) > 1:
+                try:
+                    self.store.append(sym, label, rates[:-1])  # Everything but the forming bar is closed
+                except OSError as e:
+                    print(f"⚠️ Bar store append failed for {sym}: {e}")
+        self.buffers[key]['refreshed'] = time.time()
+        return True
+
+    def _warm_start(self, sym, timeframe):
+        """Closed history from the store topped up from the terminal, plus the forming bar"""
+        label = timeframe_label(mt5, timeframe) if self.store else None
+        if not label:
+            return None
+        try:
+            self.store.sync(mt5, sym, label, history_bars=self.size)
+            recent = mt5.copy_rates_from_pos(sym, timeframe, 0, 2)
+            if recent is None or len(recent) < 2:
+                return None
+            self.store.append(sym, label, recent[:1])  # In case a bar closed since the sync
+        except OSError as e:
+            print(f"⚠️ Bar store sync failed for {sym}: {e}")
+            return None
+        closed = self.store.read(sym, label, count=self.size - 1)
+        if not len(closed) or closed['time'][-1] != recent['time'][0]:
+            return None
+        return np.concatenate([np.asarray(closed), recent[1:].astype(closed.dtype)])
+
+    def get(self, sym, count, timeframe=TIMEFRAME):
+        """Last `count` bars (oldest first, forming bar last), refreshing if the cache is stale"""
+        with self.lock:
+            buf = self.buffers.get((sym, timeframe))
+            if buf is None or time.time() - buf['refreshed'] > self.max_age:
+                if not self._refresh(sym, timeframe):
+                    return None
+                buf = self.buffers[(sym, timeframe)]
+            n = min(count, buf['count'])
+            return buf['data'][(buf['head'] - n + np.arange(n)) % self.size]
+
+    def higher(self, sym, label=SIGNAL_TIMEFRAME, count=HIGHER_TIMEFRAME_BARS):
+        """Last `count` bars of a higher timeframe (e.g. 'M30'), forming bar last.
+
+        Built from the cached M1 bars, so after the first call per symbol (which seeds
+        the closed history from the terminal) no extra terminal call is made. The
+        symbol is seeded again if more M1 bars closed than the cache holds.
+        """
+        with self.lock:
+            rates = self.get(sym, self.size, mt5.TIMEFRAME_M1)
+            if rates is None or len(rates) < 2:
+                return None
+            resampler = self.resamplers.get((sym, label))
+            if resampler is None or not resampler.feed(rates[:-1]):
+                seed = mt5.copy_rates_from_pos(sym, getattr(mt5, f"TIMEFRAME_{label}"), 1, count)
+                if seed is None or len(seed) == 0:
+                    return None
+                resampler = Resampler([label], size=count)
+                resampler.seed(label, seed)
+                resampler.feed(rates[:-1])
+                self.resamplers[(sym, label)] = resampler
+            return resampler.bars(label, count, forming=rates[-1])
+
+# === BATCH INDICATORS ===
+def batch_ewm(x, span=None, alpha=None, adjust=True):
+    """pandas-identical ewm(...).mean() along each row of a (symbols x bars) array"""
+    com = (span - 1) / 2 if span is not None else (1 - alpha) / alpha
+    alpha = 1. / (1. + com)
+    old_wt_factor = 1. - alpha
+    new_wt = 1. if adjust else alpha
+
+    out = np.empty_like(x)
+    weighted = x[:, 0].copy()
+    old_wt = np.ones(len(x))
+    out[:, 0] = weighted
+    for i in range(1, x.shape[1]):
+        cur = x[:, i]
+        old_wt = old_wt * old_wt_factor
+        blended = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+        weighted = np.where(weighted != cur, blended, weighted)
+        old_wt = old_wt + new_wt if adjust else np.ones(len(x))
+        out[:, i] = weighted
+    return out
+
+def batch_sma_last(x, period):
+    """Last rolling(period).mean() of each row, with the same compensated sums pandas uses"""
+    rows, n = x.shape
+    if n < period:
+        return np.full(rows, np.nan)
+    sum_x = np.zeros(rows)
+    comp_add = np.zeros(rows)
+    comp_remove = np.zeros(rows)
+    neg_ct = np.zeros(rows, dtype=int)
+    same_ct = np.zeros(rows, dtype=int)
+    prev_value = x[:, 0].copy()
+    for i in range(n):
+        if i >= period:
+            val = x[:, i - period]
+            y = -val - comp_remove
+            t = sum_x + y
+            comp_remove = t - sum_x - y
+            sum_x = t
+            neg_ct -= np.signbit(val)
+        val = x[:, i]
+        y = val - comp_add
+        t = sum_x + y
+        comp_add = t - sum_x - y
+        sum_x = t
+        neg_ct += np.signbit(val)
+        same_ct = np.where(val == prev_value, same_ct + 1, 1)
+        prev_value = val
+
+    nobs = period
+    result = sum_x / nobs
+    result = np.where((neg_ct == 0) & (result < 0), 0., result)
+    result = np.where((neg_ct == nobs) & (result > 0), 0., result)
+    return np.where(same_ct >= nobs, prev_value, result)
+
+def batch_indicators(high, low, close):
+    """Current Donchian/MACD/RSI/SMA values for every row of (symbols x bars) arrays.
+
+    One vectorized pass over the whole universe: the Python-level work grows with
+    the window length, not with the number of symbols. Row values equal what
+    get_donchian/get_macd/get_rsi/get_sma return for the same window.
+    """
+    n = close.shape[1]
+    if n >= DONCHIAN_PERIOD:
+        upper = high[:, -DONCHIAN_PERIOD:].max(axis=1)
+        lower = low[:, -DONCHIAN_PERIOD:].min(axis=1)
+    else:
+        upper = lower = np.full(len(close), np.nan)
+
+    macd_line = batch_ewm(close, span=MACD_FAST, adjust=False) - batch_ewm(close, span=MACD_SLOW, adjust=False)
+    signal_line = batch_ewm(macd_line, span=MACD_SIGNAL, adjust=False)
+
+    delta = np.diff(close, axis=1, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.)
+    loss = -np.where(delta < 0, delta, 0.)
+    avg_gain = batch_ewm(gain, alpha=1/RSI_PERIOD)[:, -1]
+    avg_loss = batch_ewm(loss, alpha=1/RSI_PERIOD)[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+
+    return {
+        'close': close[:, -1],
+        'donchian_upper': upper,
+        'donchian_lower': lower,
+        'macd_main': macd_line[:, -1],
+        'macd_signal': signal_line[:, -1],
+        'macd_hist': macd_line[:, -1] - signal_line[:, -1],
+        'rsi': rsi,
+        'sma_9': batch_sma_last(close, SMA_PERIOD_SHORT),
+        'sma_21': batch_sma_last(close, SMA_PERIOD_LONG)
+    }
+
+def batch_scan_values(scan_rates):
+    """Stack each symbol's rates window into one matrix and return {symbol: current values}.
+
+    Windows are grouped by length so every stacked row covers the same number of bars.
+    """
+    by_length = {}
+    for sym, rates in scan_rates.items():
+        by_length.setdefault(len(rates), []).append(sym)
+
+    results = {}
+    for syms in by_length.values():
+        high = np.vstack([scan_rates[s]['high'] for s in syms]).astype(float)
+        low = np.vstack([scan_rates[s]['low'] for s in syms]).astype(float)
+        close = np.vstack([scan_rates[s]['close'] for s in syms]).astype(float)
+        batch = batch_indicators(high, low, close)
+        for row, sym in enumerate(syms):
+            results[sym] = {key: float(arr[row]) for key, arr in batch.items()}
+    return results
+
+def calc_tps_sl(entry, direction, donchian_upper, donchian_lower, fib_levels=None, rr=None):
+    """Calculate profit targets based on Donchian channel height (FIB_LEVELS/RR unless overridden)"""
+    fib_levels = FIB_LEVELS if fib_levels is None else fib_levels
+    rr = RR if rr is None else rr
     channel_height = abs(donchian_upper - donchian_lower)
     avg_price = (donchian_upper + donchian_lower) / 2
     max_allowed = avg_price * 0.05
     channel_height = min(channel_height, max_allowed)
     
     tps = []
-    for lvl in FIB_LEVELS:
+    for lvl in fib_levels:
         extension = channel_height * (lvl/100)
         if direction == "BUY":
             tp = entry + extension
@@ -515,7 +1320,7 @@ def calc_tps_sl(entry, direction, donchian_upper, donchian_lower):
         tps.append(round(tp, 5))
     
     tp1_distance = abs(tps[0] - entry)
-    risk_distance = tp1_distance / RR
+    risk_distance = tp1_distance / rr
     
     if direction == "BUY":
         sl = round(entry - risk_distance, 5)
@@ -540,13 +1345,18 @@ def generate_signal_message(sym, direction, price, tps, sl, tid, indicators):
     # Select two random execution insights
     insight_lines = "\n".join(random.sample(REASONS, 2))
     
+    # Higher-timeframe MACD trend, when it could be computed
+    timeframe = SIGNAL_TIMEFRAME
+    if indicators.get('htf_trend'):
+        timeframe += f" ({indicators['htf_trend']} MACD)"
+    
     return f"""
 📈 IntelliTrade Signal Alert (High Confidence)
 ━━━━━━━━━━━━━━━━━━━━━━  
 🔹 Asset: {sym}  
 📥 Direction: {direction}  
 🕒 Time: {time_str}  
-⏳ Timeframe: M30  
+⏳ Timeframe: {timeframe}  
 
 💵 Entry: {price}  
 {tp_lines}  
@@ -561,38 +1371,31 @@ def generate_signal_message(sym, direction, price, tps, sl, tid, indicators):
 """
 
 # === TRADE UPDATE MESSAGES ===
-def send_trade_update(driver, wait, symbol, event_type, details, tid):
-    """Send trade update notifications"""
-    time_str = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M')
-    
-    if event_type == "TP_HIT":
-        message = f"""
+def format_trade_update(symbol, time_str, lines, tid):
+    """Trade update message with one line per event"""
+    events = "\n".join(lines)
+    return f"""
 📊 Trade Update: {symbol}
 ⏰ Time: {time_str}
-✅ {details}
+{events}
 🆔 Trade ID: {tid}
 """
+
+def send_trade_update(dispatcher, symbol, event_type, details, tid):
+    """Queue trade update notifications"""
+    if event_type == "TP_HIT":
+        line = f"✅ {details}"
     elif event_type == "SL_HIT":
-        message = f"""
-📊 Trade Update: {symbol}
-⏰ Time: {time_str}
-🛑 {details}
-🆔 Trade ID: {tid}
-"""
+        line = f"🛑 {details}"
     elif event_type == "ALL_TP":
-        message = f"""
-📊 Trade Update: {symbol}
-⏰ Time: {time_str}
-🏁 All Profit Targets Reached!
-🆔 Trade ID: {tid}
-"""
+        line = "🏁 All Profit Targets Reached!"
     else:
         return False
     
-    return send_whatsapp_message(driver, wait, message)
+    return dispatcher.enqueue_trade_update(symbol, tid, line)
 
-def send_closure_advisory(driver, wait, symbol, entry, current_price, tid, direction, reason):
-    """Send early closure advisory"""
+def send_closure_advisory(dispatcher, symbol, entry, current_price, tid, direction, reason):
+    """Queue early closure advisory"""
     pips = abs(round(current_price - entry, 5))
     profit_status = "in profit" if ((direction == "BUY" and current_price > entry) or 
                                    (direction == "SELL" and current_price < entry)) else "at risk"
@@ -611,11 +1414,11 @@ Position status: {profit_status}
 
 💡 _Protecting gains is as important as making them_
 """
-    return send_whatsapp_message(driver, wait, message)
+    return dispatcher.enqueue(message, PRIORITY_TRADE_UPDATE)
 
 # === SPONTANEOUS MESSAGES ===
-def send_spontaneous_message(driver, wait):
-    """Send various spontaneous messages"""
+def send_spontaneous_message(dispatcher):
+    """Queue various spontaneous messages"""
     now = datetime.now(timezone.utc)
     
     # Morning messages (6AM-10AM UTC)
@@ -629,7 +1432,7 @@ def send_spontaneous_message(driver, wait):
     "New session, new possibilities - trade with focus"
 ])}
 """
-        return send_whatsapp_message(driver, wait, msg)
+        return dispatcher.enqueue(msg, PRIORITY_SPONTANEOUS)
     
     # Market session reminders
     sessions = [
@@ -650,7 +1453,7 @@ def send_spontaneous_message(driver, wait):
     "Prepare for potential breakouts"
 ])}
 """
-            return send_whatsapp_message(driver, wait, msg)
+            return dispatcher.enqueue(msg, PRIORITY_SPONTANEOUS)
     
     # Motivational messages
     if random.random() > 0.85:
@@ -663,7 +1466,7 @@ def send_spontaneous_message(driver, wait):
     "Risk management isn't expensive - it's priceless"
 ])}"
 """
-        return send_whatsapp_message(driver, wait, msg)
+        return dispatcher.enqueue(msg, PRIORITY_SPONTANEOUS)
     
     # Market status commentary
     if random.random() > 0.9:
@@ -682,12 +1485,13 @@ def send_spontaneous_message(driver, wait):
                 continue
         
         if comments:
+            pulse = "\n".join(comments)
             msg = f"""
 📊 Market Pulse
 ━━━━━━━━━━━━━━━━━━━━━━
-{"\n".join(comments)}
+{pulse}
 """
-            return send_whatsapp_message(driver, wait, msg)
+            return dispatcher.enqueue(msg, PRIORITY_SPONTANEOUS)
     
     # Premium campaign (occasional)
     if random.random() > 0.95:
@@ -702,7 +1506,7 @@ Elevate your trading with:
 🔐 Limited slots available
 👉 Learn more: intellitrade.com/premium
 """
-        return send_whatsapp_message(driver, wait, msg)
+        return dispatcher.enqueue(msg, PRIORITY_SPONTANEOUS)
     
     return False
 
@@ -716,7 +1520,7 @@ def send_test_message(driver, wait):
         print(f"❌ Failed to send test message: {e}")
         return False
     
-def simulate_signal(driver, wait, tracked, analytics):
+def simulate_signal(driver, wait, book, store):
     try:
         sym = "Volatility 25 Index"
         direction = random.choice(["BUY", "SELL"])
@@ -749,20 +1553,9 @@ def simulate_signal(driver, wait, tracked, analytics):
         print(f"SL: {sl}\n")
         
         if send_whatsapp_message(driver, wait, msg):
-            tracked[sym] = {
-                "id": tid, 
-                "symbol": sym, 
-                "dir": direction,
-                "entry": price, 
-                "tps": tps, 
-                "sl": sl,
-                "status": "open", 
-                "hit": [],
-                "simulated": True,
-                "indicators": indicators,
-                "closure_advised": False
-            }
-            save_trades(tracked)
+            trade = Trade(tid, sym, direction, price, tps, sl, indicators, simulated=True)
+            book.add(trade)
+            store.opened(trade)
             print(f"✅ Simulated signal sent for {sym} {direction}")
             return True
         return False
@@ -771,66 +1564,371 @@ def simulate_signal(driver, wait, tracked, analytics):
         return False
     
 # === MESSAGE SENDING ===
-def send_whatsapp_message(driver, wait, message):
-    max_attempts = 3
-    for attempt in range(max_attempts):
-        try:
-            print(f"\nAttempt {attempt+1}/{max_attempts} to send message")
-            
-            chat_css = f"span[title={WHATSAPP_TARGET}]"
-            group_title = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, chat_css)))
-            group_title.click()
-            print("✅ Found and clicked target chat")
-            time.sleep(1)
-            
-            input_selectors = [
-                "div[contenteditable='true'][title='Type a message']",
-                "div[contenteditable='true'][data-tab='10']",
-                "footer div[contenteditable='true']"
-            ]
-            
-            input_box = None
-            for selector in input_selectors:
-                try:
-                    input_box = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, selector)))
-                    print(f"✅ Found input with selector: {selector}")
-                    break
-                except:
-                    continue
-            
-            if not input_box:
-                raise RuntimeError("Could not find message input box")
-            
-            input_box.clear()
-            print("Cleared input box")
-            
+INPUT_SELECTORS = [
+    "div[contenteditable='true'][title='Type a message']",
+    "div[contenteditable='true'][data-tab='10']",
+    "footer div[contenteditable='true']"
+]
+
+# Paste the text straight into the compose box (no system clipboard), after checking
+# the cached element is still attached and the target chat is still the open one
+INSERT_TEXT_JS = """
+const [box, text, headerCss] = arguments;
+if (!box.isConnected) return 'stale';
+if (!document.querySelector(headerCss)) return 'wrong-chat';
+box.focus();
+if (box.textContent) {
+    document.execCommand('selectAll', false, null);
+    document.execCommand('delete', false, null);
+}
+const data = new DataTransfer();
+data.setData('text/plain', text);
+box.dispatchEvent(new ClipboardEvent('paste', {clipboardData: data, bubbles: true, cancelable: true}));
+if (!box.textContent) document.execCommand('insertText', false, text);
+return box.textContent ? 'ok' : 'empty';
+"""
+
+class WhatsAppSender:
+    """Session-aware sender for one chat in one Chrome session.
+
+    The chat stays open and its compose box is cached between messages; the chat is
+    only re-opened and the box looked up again when the element goes stale or
+    another chat is showing. Text is inserted in-page, so concurrent senders never
+    race over the OS clipboard.
+    """
+    def __init__(self, driver, wait, target=WHATSAPP_TARGET):
+        self.driver = driver
+        self.wait = wait
+        self.target = target
+        self.input_box = None
+        self.latencies = deque(maxlen=500)  # Seconds per successful send
+
+    def _open_chat(self):
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.common.by import By
+        
+        chat_css = f"span[title={self.target}]"
+        self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, chat_css))).click()
+        print("✅ Found and clicked target chat")
+        # One wait on the combined selector instead of a full timeout per candidate
+        self.input_box = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, ", ".join(INPUT_SELECTORS))))
+
+    def send(self, message, max_attempts=3):
+        from selenium.webdriver.common.keys import Keys
+        from selenium.common.exceptions import StaleElementReferenceException
+        
+        start = time.perf_counter()
+        for attempt in range(max_attempts):
             try:
-                pyperclip.copy(message)
-            except:
-                win32clipboard.OpenClipboard()
-                win32clipboard.EmptyClipboard()
-                win32clipboard.SetClipboardText(message)
-                win32clipboard.CloseClipboard()
-            
-            print("📋 Copied message to clipboard")
-            input_box.send_keys(Keys.CONTROL, 'v')
-            print("📋 Pasted message from clipboard")
-            time.sleep(1)
-            input_box.send_keys(Keys.ENTER)
-            print("✅ Message sent successfully")
-            return True
+                if self.input_box is None:
+                    self._open_chat()
+                
+                header_css = f"#main header span[title={self.target}]"
+                state = self.driver.execute_script(INSERT_TEXT_JS, self.input_box, message, header_css)
+                if state in ('stale', 'wrong-chat'):
+                    print(f"Cached chat input unusable ({state}) - reopening chat")
+                    self.input_box = None
+                    continue
+                if state != 'ok':
+                    raise RuntimeError("Message text did not reach the input box")
+                
+                self.input_box.send_keys(Keys.ENTER)
+                latency = time.perf_counter() - start
+                self.latencies.append(latency)
+                print(f"✅ Message sent in {latency*1000:.0f} ms")
+                return True
             
+            except StaleElementReferenceException:
+                print("Cached chat input went stale - reopening chat")
+                self.input_box = None
+            except Exception as e:
+                print(f"❌ Message send attempt {attempt+1} failed: {str(e)}")
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                screenshot_name = f'message_error_{timestamp}.png'
+                self.driver.save_screenshot(screenshot_name)
+                print(f"Saved screenshot as '{screenshot_name}'")
+                self.driver.refresh()
+                self.input_box = None
+                time.sleep(5)
+        
+        print(f"❌ Failed to send message after {max_attempts} attempts")
+        return False
+
+    def latency_report(self):
+        """Count, median, p95 and max send latency in milliseconds"""
+        if not self.latencies:
+            return "no messages sent"
+        ms = np.array(self.latencies) * 1000
+        return (f"{len(ms)} messages, median {np.median(ms):.0f} ms, "
+                f"p95 {np.percentile(ms, 95):.0f} ms, max {ms.max():.0f} ms")
+
+WHATSAPP_SENDERS = {}  # (Chrome driver, target) -> WhatsAppSender
+DRIVER_LOCKS = {}  # Chrome driver -> lock; a session drives one chat at a time
+SENDERS_LOCK = threading.Lock()
+
+def get_sender(driver, wait, target=WHATSAPP_TARGET):
+    with SENDERS_LOCK:
+        if (driver, target) not in WHATSAPP_SENDERS:
+            WHATSAPP_SENDERS[(driver, target)] = WhatsAppSender(driver, wait, target)
+            DRIVER_LOCKS.setdefault(driver, threading.Lock())
+        return WHATSAPP_SENDERS[(driver, target)]
+
+def send_whatsapp_message(driver, wait, message, target=WHATSAPP_TARGET):
+    sender = get_sender(driver, wait, target)
+    with DRIVER_LOCKS[driver]:
+        return sender.send(message)
+
+class WhatsAppPool:
+    """Logged-in Chrome sessions that publish one message to many groups concurrently.
+
+    Each target group is pinned to one session, so a session keeps re-using the same
+    open chat(s); a message fans out to all sessions in parallel and total delivery
+    time stays close to a single send while there are at least as many sessions as groups.
+    """
+    def __init__(self, sessions):
+        self.sessions = sessions  # [(driver, wait)]
+        self.executors = [ThreadPoolExecutor(max_workers=1) for _ in sessions]
+        self.assignment = {}  # Target -> session index
+        self.stats = {}  # Target -> {'sent': n, 'failed': n}
+        self.lock = threading.Lock()
+
+    def _session_index(self, target):
+        with self.lock:
+            if target not in self.assignment:
+                self.assignment[target] = len(self.assignment) % len(self.sessions)
+                self.stats[target] = {'sent': 0, 'failed': 0}
+            return self.assignment[target]
+
+    def _send(self, index, target, message):
+        driver, wait = self.sessions[index]
+        try:
+            return send_whatsapp_message(driver, wait, message, target)
+        except Exception as e:
+            print(f"❌ Send to {target} failed: {e}")
+            return False
+
+    def broadcast(self, message, targets):
+        """Send to every target at once; returns {target: delivered}"""
+        futures = {}
+        for target in targets:
+            index = self._session_index(target)
+            futures[target] = self.executors[index].submit(self._send, index, target, message)
+        results = {target: future.result() for target, future in futures.items()}
+        with self.lock:
+            for target, ok in results.items():
+                self.stats[target]['sent' if ok else 'failed'] += 1
+        return results
+
+    def report(self):
+        lines = []
+        for target, index in self.assignment.items():
+            driver, wait = self.sessions[index]
+            stats = self.stats[target]
+            lines.append(f"{target}: {stats['sent']} sent, {stats['failed']} failed, "
+                         f"{get_sender(driver, wait, target).latency_report()}")
+        return "\n".join(lines) or "no messages sent"
+
+    def quit(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False)
+        for driver, _ in self.sessions:
+            driver.quit()
+
+class ConsoleMessenger:
+    """Stand-in for WhatsAppPool in scan-only mode: messages are printed instead of sent"""
+    def broadcast(self, message, targets):
+        print(f"\n--- Message for {', '.join(targets)} ---\n{message}\n")
+        return {target: True for target in targets}
+
+    def report(self):
+        return "scan-only mode - messages printed to console"
+
+    def quit(self):
+        pass
+
+def start_whatsapp_pool(dispatcher, profiles=WHATSAPP_PROFILES):
+    """Log the Chrome sessions in on a background thread and hand them to the dispatcher.
+
+    Until then the dispatcher keeps everything queued; if WhatsApp cannot be brought up
+    the messages are printed to the console instead, so scanning never stops.
+    """
+    def init():
+        start = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=len(profiles)) as executor:
+                pool = WhatsAppPool(list(executor.map(setup_whatsapp, profiles)))
+            print(f"WhatsApp setup complete ({len(profiles)} session(s)) in {time.time() - start:.1f}s - "
+                  f"releasing {dispatcher.depth()} buffered message(s)")
+            dispatcher.attach(pool)
         except Exception as e:
-            print(f"❌ Message send attempt {attempt+1} failed: {str(e)}")
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            screenshot_name = f'message_error_{timestamp}.png'
-            driver.save_screenshot(screenshot_name)
-            print(f"Saved screenshot as '{screenshot_name}'")
-            driver.refresh()
-            time.sleep(5)
+            print(f"❌ WhatsApp unavailable ({e}) - continuing with messages printed to console")
+            dispatcher.attach(ConsoleMessenger())
     
-    print(f"❌ Failed to send message after {max_attempts} attempts")
-    return False
+    thread = threading.Thread(target=init, name="whatsapp-init", daemon=True)
+    thread.start()
+    return thread
+
+# === MESSAGE DISPATCHER ===
+PRIORITY_TRADE_UPDATE = 0  # SL/TP hits and closure advisories
+PRIORITY_SIGNAL = 1
+PRIORITY_NEWS = 2
+PRIORITY_SPONTANEOUS = 3  # Greetings, reminders, wisdom, market pulse, premium campaign
+TIER_BY_PRIORITY = {
+    PRIORITY_TRADE_UPDATE: "updates",
+    PRIORITY_SIGNAL: "signals",
+    PRIORITY_NEWS: "news",
+    PRIORITY_SPONTANEOUS: "marketing"
+}
+SEND_RATE_PER_MINUTE = 20  # Sustained WhatsApp send budget per group
+SEND_BURST = 5  # Messages that may go out back-to-back
+
+class MessageDispatcher:
+    """Background WhatsApp sender fed from a priority queue.
+
+    Callers only enqueue. The worker sends the most urgent message first within a
+    token-bucket budget, and trade updates that pile up for one Trade ID before
+    they are sent go out as a single message. Each message is broadcast to the
+    groups of its tier; retries only go to the groups that failed. Without a pool
+    messages are held in memory until attach() provides one; a rate of None
+    disables the send budget.
+    """
+    def __init__(self, pool=None, rate_per_minute=SEND_RATE_PER_MINUTE, burst=SEND_BURST):
+        self.pool = pool
+        self.ready = threading.Event()  # Set once there is a pool to send through
+        if pool is not None:
+            self.ready.set()
+        self.rate = rate_per_minute / 60 if rate_per_minute else None
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled = time.time()
+        self.heap = []  # (priority, seq, entry)
+        self.seq = itertools.count()
+        self.pending_updates = {}  # Trade ID -> unsent update entry
+        self.busy = False
+        self.cond = threading.Condition()
+        threading.Thread(target=self._run, name="whatsapp-dispatcher", daemon=True).start()
+
+    def enqueue(self, message, priority, attempts=1, on_sent=None, on_failed=None, tier=None):
+        """Queue a message for its tier's groups.
+
+        on_sent runs (on the dispatcher thread) once any group has received it,
+        on_failed if no group has after all attempts.
+        """
+        entry = {
+            'message': message,
+            'targets': list(WHATSAPP_TARGETS[tier or TIER_BY_PRIORITY[priority]]),
+            'attempts': attempts,
+            'delivered': False,
+            'on_sent': on_sent,
+            'on_failed': on_failed
+        }
+        with self.cond:
+            self._push(priority, entry)
+        return True
+
+    def enqueue_trade_update(self, symbol, tid, line):
+        """Queue a trade update line, merging it into an unsent update for the same Trade ID"""
+        with self.cond:
+            entry = self.pending_updates.get(tid)
+            if entry is not None:
+                entry['lines'].append(line)
+                return True
+            entry = {
+                'symbol': symbol,
+                'tid': tid,
+                'time': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M'),
+                'lines': [line],
+                'targets': list(WHATSAPP_TARGETS[TIER_BY_PRIORITY[PRIORITY_TRADE_UPDATE]]),
+                'attempts': 1,
+                'delivered': False,
+                'on_sent': None,
+                'on_failed': None
+            }
+            self.pending_updates[tid] = entry
+            self._push(PRIORITY_TRADE_UPDATE, entry)
+        return True
+
+    def attach(self, pool):
+        """Start sending (buffered messages first, by priority) through pool"""
+        with self.cond:
+            self.pool = pool
+            self.refilled = time.time()
+            self.cond.notify_all()
+        self.ready.set()
+
+    def depth(self):
+        with self.cond:
+            return len(self.heap)
+
+    def flush(self, timeout=30):
+        """Wait (up to timeout seconds) for queued messages to go out"""
+        deadline = time.time() + timeout
+        with self.cond:
+            if self.pool is None:
+                return not self.heap
+            while (self.heap or self.busy) and time.time() < deadline:
+                self.cond.wait(timeout=max(0, deadline - time.time()))
+            return not self.heap and not self.busy
+
+    def _push(self, priority, entry):
+        heapq.heappush(self.heap, (priority, next(self.seq), entry))
+        self.cond.notify_all()
+
+    def _take_token(self):
+        """Block until the send budget allows another message"""
+        if self.rate is None:
+            return
+        while True:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+            self.refilled = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.heap or self.pool is None:
+                    self.cond.wait()
+            self._take_token()
+            with self.cond:
+                # Pick after waiting for budget, so anything more urgent that arrived goes first
+                priority, _, entry = heapq.heappop(self.heap)
+                if 'lines' in entry:
+                    self.pending_updates.pop(entry['tid'], None)
+                    entry['message'] = format_trade_update(entry['symbol'], entry['time'], entry['lines'], entry['tid'])
+                self.busy = True
+
+            results = {}
+            try:
+                results = self.pool.broadcast(entry['message'], entry['targets'])
+            except Exception as e:
+                print(f"❌ Dispatcher send failed: {e}")
+
+            try:
+                failed = [target for target in entry['targets'] if not results.get(target)]
+                if len(failed) < len(entry['targets']) and not entry['delivered']:
+                    entry['delivered'] = True
+                    if entry['on_sent']:
+                        entry['on_sent']()
+                entry['attempts'] -= 1
+                if failed and entry['attempts'] > 0:
+                    print(f"Requeueing message for {len(failed)} group(s) ({entry['attempts']} attempts left)...")
+                    entry['targets'] = failed
+                    with self.cond:
+                        self._push(priority, entry)
+                elif failed:
+                    print(f"❌ Message not delivered to: {', '.join(failed)}")
+                    if not entry['delivered'] and entry['on_failed']:
+                        entry['on_failed']()
+            except Exception as e:
+                print(f"⚠️ Dispatcher callback error: {e}")
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
 
 # === CRITICAL FIXES ===
 def get_mt5_time(symbol):
@@ -875,37 +1973,620 @@ def is_data_fresh(symbol, current_time, max_age=120):
     except:
         return False
 
+# === SCAN PIPELINE ===
+PIPELINE_QUEUE_SIZE = 128  # Max items waiting in front of each stage
+SIGNAL_COOLDOWN = 300  # Seconds between signals on the same symbol
+
+class ScanPipeline:
+    """Symbol scan split into fetch -> indicators -> validate -> dispatch -> persist stages.
+
+    Each stage runs in its own worker thread and passes work on through a bounded
+    queue, so a slow WhatsApp send only holds up the dispatch stage while the other
+    symbols keep being evaluated. Items are dicts keyed by 'sym'; a stage drops an
+    item by leaving it out of its results, or marks it 'deferred' when it will be
+    handed on later (dispatch waits for the message dispatcher's callback).
+    """
+    STAGES = ['fetch', 'indicators', 'validate', 'dispatch', 'persist']
+
+    def __init__(self, dispatcher, book, store, bar_cache, queue_size=PIPELINE_QUEUE_SIZE):
+        self.dispatcher = dispatcher
+        self.book = book
+        self.store = store
+        self.bar_cache = bar_cache
+        self.indicator_engines = {}
+        self.last_signal_times = {}
+        self.in_flight = set()  # Symbols somewhere in the pipeline
+        self.lock = threading.Lock()  # Guards in_flight and last_signal_times
+        self.queues = {stage: queue.Queue(maxsize=queue_size) for stage in self.STAGES}
+
+        for i, stage in enumerate(self.STAGES):
+            out_queue = self.queues[self.STAGES[i + 1]] if i + 1 < len(self.STAGES) else None
+            handler = getattr(self, f"_{stage}")
+            threading.Thread(target=self._run, args=(stage, handler, out_queue),
+                             name=f"scan-{stage}", daemon=True).start()
+
+    def submit(self, symbols, scan_time, debug_symbol=None):
+        """Queue symbols for evaluation without blocking the caller"""
+        for sym in symbols:
+            with self.lock:
+                if sym in self.in_flight:
+                    continue
+                self.in_flight.add(sym)
+            try:
+                self.queues['fetch'].put_nowait({'sym': sym, 'time': scan_time, 'debug': sym == debug_symbol})
+            except queue.Full:
+                self._release([sym])
+                print(f"⚠️ Scan pipeline full - {sym} skipped this bar")
+
+    def depths(self):
+        """Items waiting in front of each stage, plus the outbound message queue"""
+        depths = {stage: q.qsize() for stage, q in self.queues.items()}
+        depths['outbox'] = self.dispatcher.depth()
+        return depths
+
+    def save(self, force=False):
+        """Sync the trade journal and compact it when due"""
+        with self.lock:
+            self.store.checkpoint(self.book, force)
+
+    def _release(self, symbols):
+        with self.lock:
+            self.in_flight.difference_update(symbols)
+
+    def _run(self, stage, handler, out_queue):
+        in_queue = self.queues[stage]
+        while True:
+            items = [in_queue.get()]
+            if stage == 'indicators' and USE_BATCH_INDICATORS:
+                # Take everything already waiting so it shares one vectorized pass
+                while True:
+                    try:
+                        items.append(in_queue.get_nowait())
+                    except queue.Empty:
+                        break
+            try:
+                results = handler(items)
+            except Exception as e:
+                print(f"⚠️ Scan pipeline {stage} stage error: {e}")
+                results = []
+            finally:
+                for _ in items:
+                    in_queue.task_done()
+
+            if out_queue is None:
+                self._release([item['sym'] for item in items])
+                continue
+            kept = {item['sym'] for item in results}
+            kept.update(item['sym'] for item in items if item.get('deferred'))
+            self._release([item['sym'] for item in items if item['sym'] not in kept])
+            for item in results:
+                out_queue.put(item)
+
+    def _fetch(self, items):
+        results = []
+        for item in items:
+            sym = item['sym']
+            try:
+                with self.lock:
+                    # Skip if we've recently sent a signal for this symbol
+                    last_signal = self.last_signal_times.get(sym)
+                    if last_signal and (item['time'] - last_signal).total_seconds() < SIGNAL_COOLDOWN:
+                        continue
+                    
+                    # Skip if the symbol already has its full quota of open trades
+                    live = [tr for tr in self.book.open_trades(sym) if not tr.simulated]
+                    if len(live) >= MAX_TRADES_PER_SYMBOL:
+                        continue
+                
+                window = DONCHIAN_PERIOD+51 if USE_BATCH_INDICATORS else BAR_CACHE_SIZE
+                rates = self.bar_cache.get(sym, window)
+                if rates is None or len(rates) < DONCHIAN_PERIOD+10:
+                    continue
+                item['rates'] = rates
+                results.append(item)
+            except Exception as sym_error:
+                print(f"⚠️ Error fetching data for {sym}: {sym_error}")
+        return results
+
+    def _indicators(self, items):
+        # Values at the just-closed bar, either in one vectorized pass over the batch
+        # or incrementally per symbol (only new bars are processed)
+        if USE_BATCH_INDICATORS:
+            values = batch_scan_values({item['sym']: item['rates'][:-1] for item in items})
+            for item in items:
+                item['values'] = values[item['sym']]
+            return items
+
+        results = []
+        for item in items:
+            try:
+                item['values'] = sync_indicators(self.indicator_engines, item['sym'], item['rates']).last
+                results.append(item)
+            except Exception as sym_error:
+                print(f"⚠️ Error calculating indicators for {item['sym']}: {sym_error}")
+        return results
+
+    def _validate(self, items):
+        results = []
+        for item in items:
+            sym, values = item['sym'], item['values']
+            try:
+                # Get current values
+                current_close = values['close']
+                current_upper = values['donchian_upper']
+                current_lower = values['donchian_lower']
+                current_hist = values['macd_hist']
+                current_signal = values['macd_signal']
+                current_rsi = values['rsi']
+                current_sma_9 = values['sma_9']
+                current_sma_21 = values['sma_21']
+                
+                # Determine SMA alignment
+                sma_alignment = "Bullish" if current_sma_9 > current_sma_21 else "Bearish"
+                
+                # Determine RSI status
+                rsi_status = "Neutral"
+                if current_rsi >= 70:
+                    rsi_status = "Overbought"
+                elif current_rsi <= 30:
+                    rsi_status = "Oversold"
+                
+                if TEST_MODE and item['debug']:
+                    print(f"\n[DEBUG] {sym}:")
+                    print(f"  Close: {current_close:.5f}, Upper: {current_upper:.5f}, Lower: {current_lower:.5f}")
+                    print(f"  MACD Histogram: {current_hist:.5f}, Signal: {current_signal:.5f}")
+                    print(f"  RSI: {current_rsi:.2f} ({rsi_status})")
+                    print(f"  SMA 9: {current_sma_9:.5f}, SMA 21: {current_sma_21:.5f} ({sma_alignment})")
+                
+                # Signal detection - YOUR EXACT STRATEGY
+                direction = None
+                
+                # SELL signal: Price touches upper band AND MACD histogram is below signal line
+                if current_close >= current_upper and current_hist < current_signal:
+                    direction = "SELL"
+                    tick = mt5.symbol_info_tick(sym)
+                    price = tick.bid
+                
+                # BUY signal: Price touches lower band AND MACD histogram is above signal line
+                elif current_close <= current_lower and current_hist > current_signal:
+                    direction = "BUY"
+                    tick = mt5.symbol_info_tick(sym)
+                    price = tick.ask
+                
+                if not direction:
+                    continue
+                
+                # Skip if price validation fails
+                if not is_valid_price(price, sym):
+                    print(f"⚠️ Invalid price for {sym} - skipping")
+                    continue
+                
+                # Calculate TP/SL
+                tps, sl = calc_tps_sl(price, direction, current_upper, current_lower)
+                
+                # Validate prices before sending signal
+                if not validate_prices(price, tps, sl, direction, sym, current_close):
+                    print(f"⚠️ Price validation failed for {sym} - skipping signal")
+                    continue
+                    
+                # Validate signal is still relevant
+                if not validate_signal(sym, direction, price):
+                    print(f"⚠️ Signal no longer valid for {sym} - skipping")
+                    continue
+                    
+                tid = gen_id(sym)
+                htf_trend = get_trend(self.bar_cache.higher(sym))
+                
+                # Prepare indicator data for message and logging
+                indicators = {
+                    'donchian_upper': current_upper,
+                    'donchian_lower': current_lower,
+                    'macd_main': values['macd_main'],
+                    'macd_signal': current_signal,
+                    'macd_hist': current_hist,
+                    'rsi': current_rsi,
+                    'rsi_status': rsi_status,
+                    'sma_9': current_sma_9,
+                    'sma_21': current_sma_21,
+                    'sma_alignment': sma_alignment,
+                    'htf_trend': htf_trend
+                }
+                
+                item['msg'] = generate_signal_message(sym, direction, price, tps, sl, tid, indicators)
+                item['trade'] = Trade(tid, sym, direction, price, tps, sl, indicators, checked=tick.time_msc)
+                print(f"Signal detected for {sym} {direction}")
+                results.append(item)
+            except Exception as sym_error:
+                print(f"⚠️ Error processing symbol {sym}: {sym_error}")
+        return results
+
+    def _dispatch(self, items):
+        for item in items:
+            item['deferred'] = True
+            self.dispatcher.enqueue(item['msg'], PRIORITY_SIGNAL, attempts=3,
+                                    on_sent=lambda item=item: self._sent(item),
+                                    on_failed=lambda item=item: self._failed(item))
+        return []
+
+    def _sent(self, item):
+        print(f"✅ Signal sent for {item['sym']} {item['trade'].dir}")
+        self.queues['persist'].put(item)
+
+    def _failed(self, item):
+        print(f"❌ Failed to send signal for {item['sym']} after 3 attempts")
+        self._release([item['sym']])
+
+    def _persist(self, items):
+        with self.lock:
+            for item in items:
+                self.book.add(item['trade'])
+                self.last_signal_times[item['sym']] = item['time']
+                self.store.opened(item['trade'])
+        return items
+
+# === TRADE MONITOR ===
+MONITOR_TICK_SPAN = 900  # Seconds of tick history read per check; older gaps (restarts) use M1 bars
+SAME_BAR_SL_FIRST = True  # When one M1 bar touches both a TP and the SL, assume the SL came first
+
+def price_path(sym, since, tick):
+    """Every bid/ask a symbol traded at after each of the since times (server ms) up to tick.
+
+    Returns (path, starts, ends): path holds 'time', 'bid_high', 'bid_low', 'ask_high'
+    and 'ask_low' arrays, and path[starts[k]:ends[k]] are the prices after since[k],
+    oldest first, with the given tick as the last row. A span up to MONITOR_TICK_SPAN
+    is read as ticks. A longer one is read as ticks up to the end of the M1 bar that
+    contains since[k] and whole M1 bars after it (time is then each bar's end), so order
+    inside those bars is lost; that first bar itself is never used, as it may hold
+    prices from before since[k]. Ticks and bars are fetched once per range and shared by
+    every since time.
+    """
+    now_ms = tick.time_msc
+    bar_ms = BAR_SECONDS * 1000
+    since = np.asarray(since, dtype=np.int64)
+    names = ('time', 'bid_high', 'bid_low', 'ask_high', 'ask_low')
+    last = (np.array([now_ms]), np.array([tick.bid]), np.array([tick.bid]), np.array([tick.ask]), np.array([tick.ask]))
+
+    def tick_rows(after, until):
+        """Ticks in (after, until] as path columns"""
+        ticks = mt5.copy_ticks_range(sym, datetime.fromtimestamp(after // 1000, timezone.utc),
+                                     datetime.fromtimestamp(until // 1000 + 1, timezone.utc), mt5.COPY_TICKS_INFO)
+        if ticks is None or not len(ticks):
+            return tuple(np.zeros(0) for _ in names)
+        ticks = ticks[(ticks['time_msc'] > after) & (ticks['time_msc'] <= until)]
+        return ticks['time_msc'].astype(np.int64), ticks['bid'], ticks['bid'], ticks['ask'], ticks['ask']
+
+    segments = []  # Path parts, each ending with the current tick
+    starts = np.zeros(len(since), dtype=np.int64)
+    ends = np.zeros(len(since), dtype=np.int64)
+    offset = 0
+    recent = now_ms - since <= MONITOR_TICK_SPAN * 1000
+    if recent.any():
+        # One tick range for every recent since time, each starting at its first unseen tick
+        ticks = tick_rows(int(since[recent].min()), now_ms)
+        starts[recent] = offset + np.searchsorted(ticks[0], since[recent], side='right')
+        ends[recent] = offset + len(ticks[0]) + 1
+        segments.append(ticks)
+        segments.append(last)
+        offset += len(ticks[0]) + 1
+    if not recent.all():
+        # One bar range from the oldest; each since time gets its own partial first bar in ticks
+        first_bar = (int(since[~recent].min()) // bar_ms + 1) * bar_ms
+        rates = mt5.copy_rates_range(sym, TIMEFRAME, datetime.fromtimestamp(first_bar // 1000, timezone.utc),
+                                     datetime.fromtimestamp(now_ms // 1000 + 1, timezone.utc))
+        if rates is None:
+            rates = np.zeros(0, dtype=[('time', 'i8'), ('high', 'f8'), ('low', 'f8'), ('spread', 'i4')])
+        info = mt5.symbol_info(sym)
+        opened = rates['time'].astype(np.int64) * 1000
+        spread = rates['spread'] * (info.point if info else 0.)
+        bars = (np.minimum(opened + bar_ms, now_ms), rates['high'], rates['low'], rates['high'] + spread, rates['low'] + spread)
+        for start in np.unique(since[~recent]):
+            boundary = (int(start) // bar_ms + 1) * bar_ms
+            ticks = tick_rows(int(start), boundary - 1)
+            whole = opened >= boundary
+            parts = [ticks, tuple(column[whole] for column in bars), last]
+            size = sum(len(part[0]) for part in parts)
+            mine = since == start
+            starts[mine] = offset
+            ends[mine] = offset + size
+            segments.extend(parts)
+            offset += size
+    path = {name: np.concatenate([np.asarray(part[k], dtype=np.int64 if k == 0 else float) for part in segments])
+            for k, name in enumerate(names)}
+    return path, starts, ends
+
+class TradeLadders:
+    """Open trades' TP ladders and stops as parallel arrays, checked in one vectorized pass.
+
+    Row i holds a trade's direction sign (+1 BUY, -1 SELL), entry, TP ladder (one
+    column per FIB_LEVELS rung, NaN-padded), SL and a bitmask of the rungs already hit.
+    Removing a trade moves the last row into its place, so rows stay packed.
+    """
+    def __init__(self, levels=len(FIB_LEVELS), capacity=64):
+        self.levels = levels
+        self.trades = []  # Row -> Trade
+        self.rows = {}  # Trade ID -> row
+        self._allocate(capacity)
+
+    def __len__(self):
+        return len(self.trades)
+
+    def _allocate(self, capacity):
+        n = len(self.trades)
+        old = (self.sign[:n], self.entry[:n], self.tps[:n], self.sl[:n], self.hit[:n]) if n else None
+        self.sign = np.zeros(capacity, dtype=np.int8)
+        self.entry = np.zeros(capacity)
+        self.tps = np.full((capacity, self.levels), np.nan)
+        self.sl = np.zeros(capacity)
+        self.hit = np.zeros(capacity, dtype=np.uint8)
+        if old:
+            self.sign[:n], self.entry[:n], self.tps[:n], self.sl[:n], self.hit[:n] = old
+
+    def add(self, tr):
+        if tr.id in self.rows:
+            return self.rows[tr.id]
+        row = len(self.trades)
+        if row == len(self.sign):
+            self._allocate(row * 2)
+        self.trades.append(tr)
+        self.rows[tr.id] = row
+        self.sign[row] = 1 if tr.dir == "BUY" else -1
+        self.entry[row] = tr.entry
+        self.tps[row] = np.nan
+        self.tps[row, :len(tr.tps)] = tr.tps[:self.levels]
+        self.sl[row] = tr.sl
+        self.hit[row] = sum(1 << level for level, tp in enumerate(tr.tps[:self.levels]) if tp in tr.hit)
+        return row
+
+    def remove(self, tid):
+        row = self.rows.pop(tid, None)
+        if row is None:
+            return
+        last = len(self.trades) - 1
+        if row != last:
+            moved = self.trades[last]
+            self.trades[row] = moved
+            self.rows[moved.id] = row
+            for array in (self.sign, self.entry, self.tps, self.sl, self.hit):
+                array[row] = array[last]
+        self.trades.pop()
+
+    def sync(self, trades):
+        """Mirror exactly the given open trades"""
+        keep = {tr.id for tr in trades}
+        for tid in [tid for tid in self.rows if tid not in keep]:
+            self.remove(tid)
+        for tr in trades:
+            self.add(tr)
+
+    def evaluate(self, rows, starts, ends, path):
+        """New TP hits and stop-outs of ladder rows over their slices of a price path.
+
+        path holds 'time', 'bid_high', 'bid_low', 'ask_high' and 'ask_low' arrays
+        (several symbols' paths concatenated); row k is checked on path[starts[k]:ends[k]],
+        BUY against the ask and SELL against the bid. Returns (tp_rows, tp_levels,
+        tp_times, sl_rows, sl_times) with the first-touch time of each event. Rungs
+        beyond a stop-out do not count; when the SL and a TP are first touched on the
+        same row (an M1 bar) and SAME_BAR_SL_FIRST is set, the SL wins. Newly hit
+        rungs are marked in the bitmask.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        width = int((ends - starts).max()) if len(rows) else 0
+        if width <= 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty, empty, empty
+
+        # One padded window of path rows per trade
+        index = starts[:, None] + np.arange(width)
+        valid = index < ends[:, None]
+        index = np.minimum(index, len(path['time']) - 1)
+        sign = self.sign[rows].astype(float)[:, None]
+        buy = sign > 0
+        # Signed so that "touched" is always value >= threshold
+        favourable = np.where(buy, path['ask_high'][index], -path['bid_low'][index])
+        adverse = np.where(buy, -path['ask_low'][index], path['bid_high'][index])
+        favourable[~valid] = -np.inf
+        adverse[~valid] = -np.inf
+
+        sl_touch = adverse >= -sign * self.sl[rows][:, None]
+        sl_at = np.where(sl_touch.any(axis=1), sl_touch.argmax(axis=1), width)
+        tp_at = np.full((len(rows), self.levels), width)
+        thresholds = sign * self.tps[rows]
+        for level in range(self.levels):
+            touch = favourable >= thresholds[:, level:level + 1]  # NaN rungs never touch
+            tp_at[:, level] = np.where(touch.any(axis=1), touch.argmax(axis=1), width)
+
+        bits = (1 << np.arange(self.levels)).astype(np.uint8)
+        already = (self.hit[rows][:, None] & bits) != 0
+        before_stop = tp_at < sl_at[:, None] if SAME_BAR_SL_FIRST else tp_at <= sl_at[:, None]
+        new = (tp_at < width) & before_stop & ~already
+        self.hit[rows] |= (new * bits).sum(axis=1).astype(np.uint8)
+
+        hit_k, hit_level = np.nonzero(new)
+        stopped = np.flatnonzero(sl_at < width)
+        tp_times = path['time'][index[hit_k, tp_at[hit_k, hit_level]]]
+        sl_times = path['time'][index[stopped, sl_at[stopped]]]
+        return rows[hit_k], hit_level, tp_times, rows[stopped], sl_times
+
+def performance_row(tr, when, exit_price, outcome, pips):
+    """TradePerformance.log_trade row for one TP/SL event of a trade"""
+    return {
+        'Timestamp': when.strftime('%Y-%m-%d %H:%M:%S'),
+        'TradeID': tr.id,
+        'Symbol': tr.symbol,
+        'Direction': tr.dir,
+        'Entry': tr.entry,
+        'Exit': exit_price,
+        'Outcome': outcome,
+        'Pips': pips,
+        'DonchianUpper': tr.indicators['donchian_upper'],
+        'DonchianLower': tr.indicators['donchian_lower'],
+        'MACD_Main': tr.indicators['macd_main'],
+        'MACD_Signal': tr.indicators['macd_signal'],
+        'MACD_Hist': tr.indicators['macd_hist'],
+        'RSI': tr.indicators['rsi'],
+        'RSI_Status': tr.indicators['rsi_status'],
+        'SMA_9': tr.indicators['sma_9'],
+        'SMA_21': tr.indicators['sma_21'],
+        'SMA_Alignment': tr.indicators['sma_alignment']
+    }
+
+def record_tp_hit(tr, level, when, book, store, dispatcher, analytics):
+    tp = tr.tps[level]
+    tr.hit.append(tp)
+    store.tp_hit(tr, tp)
+    event = f"TP{level+1} hit @ {tp}"
+    print(f"✅ {tr.symbol} {event}")
+    send_trade_update(dispatcher, tr.symbol, "TP_HIT", event, tr.id)
+    analytics.log_trade(performance_row(tr, when, tp, f"TP{level+1}", abs(tp - tr.entry)))
+
+    # Close trade if all TPs hit
+    if len(tr.hit) == len(tr.tps):
+        book.set_status(tr, "closed")
+        print(f"🏁 {tr.symbol} All TPs reached")
+        send_trade_update(dispatcher, tr.symbol, "ALL_TP", "", tr.id)
+        store.closed(tr)
+
+def record_sl_hit(tr, when, book, store, dispatcher, analytics):
+    book.set_status(tr, "closed")
+
+    # Determine SL outcome based on TP hits
+    if len(tr.hit) > 0:
+        outcome = "SL after TP (Win)"
+        event = f"SL hit after TP @ {tr.sl} (Win)"
+    else:
+        outcome = "SL without TP (Loss)"
+        event = f"SL hit without any TP @ {tr.sl} (Loss)"
+
+    print(f"🛑 {tr.symbol} {event}")
+    send_trade_update(dispatcher, tr.symbol, "SL_HIT", event, tr.id)
+    store.closed(tr)
+    analytics.log_trade(performance_row(tr, when, tr.sl, outcome, -abs(tr.sl - tr.entry)))
+
+# === BAR-CLOSE SCHEDULER ===
+BAR_SECONDS = 60  # Length of a TIMEFRAME bar
+MONITOR_INTERVAL = 5  # Seconds between open-trade TP/SL checks
+BAR_CLOSE_GRACE = 0.3  # Seconds after a bar boundary before polling for the new bar
+
+class BarCloseScheduler:
+    """Wakes the main loop at bar boundaries (server clock) and on a faster monitor timer.
+
+    Every boundary marks the scanned symbols pending; a symbol is released for evaluation
+    once its cached history shows a newly closed bar, so quiet symbols are re-polled on the
+    monitor timer until the first tick of their new bar arrives.
+    """
+    def __init__(self, bar_seconds=BAR_SECONDS, monitor_interval=MONITOR_INTERVAL, grace=BAR_CLOSE_GRACE):
+        self.bar_seconds = bar_seconds
+        self.monitor_interval = monitor_interval
+        self.grace = grace
+        self.server_offset = None  # Server clock minus local clock
+        self.last_bar_index = None
+        self.next_monitor = 0.
+        self.last_closed = {}  # Symbol -> open time of its last evaluated closed bar
+        self.pending = set()
+
+    def observe(self, server_time):
+        """Tighten the server clock estimate from a bar or tick time, which is never in the future"""
+        offset = server_time - time.time()
+        if self.server_offset is None or offset > self.server_offset:
+            self.server_offset = offset
+
+    def sync_clock(self, symbol):
+        """Refine the server clock estimate from a symbol's latest tick"""
+        tick = mt5.symbol_info_tick(symbol)
+        if tick:
+            self.observe(tick.time_msc / 1000)
+
+    def wait(self):
+        """Sleep until the next bar boundary or monitor tick; returns (bar_closed, monitor_due)"""
+        offset = self.server_offset or 0.
+        now = time.time()
+        next_bar = (math.floor((now + offset) / self.bar_seconds) + 1) * self.bar_seconds - offset + self.grace
+        wake = min(next_bar, self.next_monitor)
+        if wake > now:
+            time.sleep(wake - now)
+
+        now = time.time()
+        bar_index = math.floor((now + offset - self.grace) / self.bar_seconds)
+        bar_closed = bar_index != self.last_bar_index
+        self.last_bar_index = bar_index
+        monitor_due = now >= self.next_monitor
+        if monitor_due:
+            self.next_monitor = now + self.monitor_interval
+        return bar_closed, monitor_due
+
+    def mark_pending(self, symbols):
+        self.pending = set(symbols)
+
+    def ready_symbols(self, bar_cache):
+        """Pending symbols whose latest bar has closed since they were last evaluated"""
+        ready = []
+        for sym in list(self.pending):
+            try:
+                if not bar_cache.refresh(sym):
+                    continue
+                rates = bar_cache.get(sym, 2)
+                if len(rates) < 2:
+                    continue
+                self.observe(int(rates['time'][-1]))
+                closed_time = int(rates['time'][-2])
+                if closed_time > self.last_closed.get(sym, -1):
+                    self.last_closed[sym] = closed_time
+                    self.pending.discard(sym)
+                    ready.append(sym)
+            except Exception as e:
+                print(f"⚠️ Error polling bars for {sym}: {e}")
+        return ready
+
 # === MAIN EXECUTION ===
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IntelliTrade signal scanner")
+    parser.add_argument("--no-messenger", action="store_true",
+                        help="scan-only mode: skip WhatsApp/Chrome and print messages to the console")
+    args = parser.parse_args()
+    
     print("Initializing MT5...")
+    if mt5 is None:
+        raise SystemExit("MetaTrader5 is not installed - the live scanner needs the terminal")
     if not mt5.initialize(path=MT5_PATH):
         print("MT5 initialization failed, retrying in 30 seconds...")
         time.sleep(30)
         if not mt5.initialize(path=MT5_PATH):
             raise RuntimeError("Failed to initialize MT5")
-    print("MT5 initialized successfully")
+    mt5_ready_time = time.time()
+    print(f"MT5 initialized successfully ({mt5_ready_time - BOOT_TIME:.2f}s after start)")
     
-    print("Initializing WhatsApp...")
-    driver, wait = setup_whatsapp()
-    print("WhatsApp setup complete")
+    # Scanning starts right away; messages queue in the dispatcher until WhatsApp is logged in
+    if args.no_messenger:
+        print("Scan-only mode - WhatsApp disabled, messages go to the console")
+        dispatcher = MessageDispatcher(ConsoleMessenger(), rate_per_minute=None)
+    else:
+        print("Initializing WhatsApp in the background...")
+        dispatcher = MessageDispatcher()
+        start_whatsapp_pool(dispatcher)
     
     # Initialize trade performance tracker
     analytics = TradePerformance()
     
-    if TEST_MODE:
-        for i in range(3):
-            if send_test_message(driver, wait):
-                break
-            print(f"Retrying test message ({i+1}/3)...")
-            time.sleep(5)
-    
-    tracked = load_trades()
-    print(f"Loaded {len(tracked)} tracked trades")
+    store = TradeStore()
+    book = store.load()
+    print(f"Loaded {len(book.open_trades())} open trades ({store.records} journal records replayed)")
     
-    if TEST_MODE and not tracked:
-        if simulate_signal(driver, wait, tracked, analytics):
-            print("Sleeping 10 seconds to verify message...")
-            time.sleep(10)
+    if TEST_MODE and not args.no_messenger:
+        print("TEST_MODE - waiting for WhatsApp before the test sends...")
+        dispatcher.ready.wait()
+        if isinstance(dispatcher.pool, WhatsAppPool):
+            driver, wait = dispatcher.pool.sessions[0]
+            for i in range(3):
+                if send_test_message(driver, wait):
+                    break
+                print(f"Retrying test message ({i+1}/3)...")
+                time.sleep(5)
+            
+            if not len(book) and simulate_signal(driver, wait, book, store):
+                print("Sleeping 10 seconds to verify message...")
+                time.sleep(10)
     
     # Cache for news events and alerts
     last_news_fetch = None
@@ -913,356 +2594,232 @@ if __name__ == "__main__":
     alerted_events = set()  # Track events we've already alerted about
     last_session_update = None
     
-    # Track last signal times per symbol
-    last_signal_times = {}
+    # Shared bar history, the staged scanner, and indicator state for monitored trades
+    bar_cache = BarCache(store=BarStore())
+    pipeline = ScanPipeline(dispatcher, book, store, bar_cache)
+    indicator_engines = {}
+    ladders = TradeLadders()
+    scheduler = BarCloseScheduler()
+    first_scan_time = None
     
     try:
         while True:
             try:
+                bar_closed, monitor_due = scheduler.wait()
                 current_utc_time = datetime.now(timezone.utc)
                 
-                # Send spontaneous messages (15% chance each cycle)
-                if random.random() > 0.85:
-                    send_spontaneous_message(driver, wait)
+                if bar_closed:
+                    # Send spontaneous messages (15% chance each bar)
+                    if random.random() > 0.85:
+                        send_spontaneous_message(dispatcher)
                 
-                # Refresh news every 15 minutes
-                if ENABLE_NEWS_ALERTS and (last_news_fetch is None or 
-                                         (current_utc_time - last_news_fetch).seconds > 900):
-                    print("Fetching news events from Finnhub...")
-                    news_events = get_upcoming_news()
-                    last_news_fetch = current_utc_time
-                    print(f"Found {len(news_events)} upcoming high-impact news events")
+                    # Refresh news every 15 minutes
+                    if ENABLE_NEWS_ALERTS and (last_news_fetch is None or 
+                                             (current_utc_time - last_news_fetch).seconds > 900):
+                        print("Fetching news events from Finnhub...")
+                        news_events = get_upcoming_news()
+                        last_news_fetch = current_utc_time
+                        print(f"Found {len(news_events)} upcoming high-impact news events")
                 
-                # Send news alerts if enabled
-                if ENABLE_NEWS_ALERTS:
-                    now = datetime.now(timezone.utc)
-                    for event in news_events:
-                        event_id = f"{event['event']}_{event['time'].timestamp()}"
+                    # Send news alerts if enabled
+                    if ENABLE_NEWS_ALERTS:
+                        now = datetime.now(timezone.utc)
+                        for event in news_events:
+                            event_id = f"{event['event']}_{event['time'].timestamp()}"
                         
-                        # Skip if already alerted
-                        if event_id in alerted_events:
-                            continue
+                            # Skip if already alerted
+                            if event_id in alerted_events:
+                                continue
                             
-                        # Check if event is within alert window
-                        alert_time = event['time'] - timedelta(minutes=NEWS_ALERT_BUFFER)
-                        if now >= alert_time:
-                            print(f"⚠️ High-impact news event upcoming: {event['event']}")
-                            if send_news_alert(driver, wait, event):
-                                print(f"✅ News alert sent for: {event['event']}")
-                                alerted_events.add(event_id)
-                
-                # Get all available symbols
-                all_symbols = [s.name for s in mt5.symbols_get()]
+                            # Check if event is within alert window
+                            alert_time = event['time'] - timedelta(minutes=NEWS_ALERT_BUFFER)
+                            if now >= alert_time:
+                                print(f"⚠️ High-impact news event upcoming: {event['event']}")
+                                if send_news_alert(dispatcher, event):
+                                    print(f"✅ News alert queued for: {event['event']}")
+                                    alerted_events.add(event_id)
                 
-                # Apply symbol filter
-                if USE_SYMBOL_FILTER:
-                    symbols = [s for s in SYMBOL_LIST if s in all_symbols]
-                else:
-                    symbols = [s for s in all_symbols if "USD" in s or "XAU" in s]
+                    # Get all available symbols
+                    all_symbols = [s.name for s in mt5.symbols_get()]
                     
-                # Filter out symbols with stale data
-                symbols = [s for s in symbols if is_data_fresh(s, current_utc_time)]
-                print(f"Scanning {len(symbols)} symbols with fresh data...")
-                
-                debug_symbol = random.choice(symbols) if TEST_MODE and symbols else None
-                
-                for sym in symbols:
-                    try:
-                        # Skip if we've recently sent a signal for this symbol
-                        if sym in last_signal_times:
-                            time_since_last = (current_utc_time - last_signal_times[sym]).total_seconds()
-                            if time_since_last < 300:  # 5 minutes cooldown
-                                continue
-                        
-                        # Skip if already has an open trade
-                        if sym in tracked and tracked[sym].get('status') == "open" and not tracked[sym].get('simulated', False):
-                            continue
-                        
-                        rates = mt5.copy_rates_from_pos(sym, TIMEFRAME, 0, DONCHIAN_PERIOD+50)
-                        if rates is None or len(rates) < DONCHIAN_PERIOD+10:
-                            continue
-                        
-                        df = pd.DataFrame(rates)
-                        df['time'] = pd.to_datetime(df['time'], unit='s')
-                        
-                        # Calculate indicators
-                        donchian_upper, donchian_lower = get_donchian(df)
-                        macd_line, signal_line, histogram = get_macd(df)
-                        rsi = get_rsi(df)
-                        sma_9 = get_sma(df, SMA_PERIOD_SHORT)
-                        sma_21 = get_sma(df, SMA_PERIOD_LONG)
-                        
-                        # Get current values
-                        current_close = df['close'].iloc[-1]
-                        current_upper = donchian_upper.iloc[-1]
-                        current_lower = donchian_lower.iloc[-1]
-                        current_hist = histogram.iloc[-1]
-                        current_signal = signal_line.iloc[-1]
-                        current_rsi = rsi.iloc[-1]
-                        current_sma_9 = sma_9.iloc[-1]
-                        current_sma_21 = sma_21.iloc[-1]
-                        
-                        # Determine SMA alignment
-                        sma_alignment = "Bullish" if current_sma_9 > current_sma_21 else "Bearish"
-                        
-                        # Determine RSI status
-                        rsi_status = "Neutral"
-                        if current_rsi >= 70:
-                            rsi_status = "Overbought"
-                        elif current_rsi <= 30:
-                            rsi_status = "Oversold"
+                    # Apply symbol filter
+                    if USE_SYMBOL_FILTER:
+                        symbols = [s for s in SYMBOL_LIST if s in all_symbols]
+                    else:
+                        symbols = [s for s in all_symbols if "USD" in s or "XAU" in s]
                         
-                        if TEST_MODE and sym == debug_symbol:
-                            print(f"\n[DEBUG] {sym}:")
-                            print(f"  Close: {current_close:.5f}, Upper: {current_upper:.5f}, Lower: {current_lower:.5f}")
-                            print(f"  MACD Histogram: {current_hist:.5f}, Signal: {current_signal:.5f}")
-                            print(f"  RSI: {current_rsi:.2f} ({rsi_status})")
-                            print(f"  SMA 9: {current_sma_9:.5f}, SMA 21: {current_sma_21:.5f} ({sma_alignment})")
-                        
-                        # Signal detection - YOUR EXACT STRATEGY
-                        direction = None
-                        
-                        # SELL signal: Price touches upper band AND MACD histogram is below signal line
-                        if current_close >= current_upper and current_hist < current_signal:
-                            direction = "SELL"
-                            price = mt5.symbol_info_tick(sym).bid
-                        
-                        # BUY signal: Price touches lower band AND MACD histogram is above signal line
-                        elif current_close <= current_lower and current_hist > current_signal:
-                            direction = "BUY"
-                            price = mt5.symbol_info_tick(sym).ask
-                        
-                        if direction:
-                            # Skip if price validation fails
-                            if not is_valid_price(price, sym):
-                                print(f"⚠️ Invalid price for {sym} - skipping")
-                                continue
-                            
-                            # Calculate TP/SL
-                            tps, sl = calc_tps_sl(price, direction, current_upper, current_lower)
-                            
-                            # Validate prices before sending signal
-                            if not validate_prices(price, tps, sl, direction, sym, current_close):
-                                print(f"⚠️ Price validation failed for {sym} - skipping signal")
-                                continue
-                                
-                            # Validate signal is still relevant
-                            if not validate_signal(sym, direction, price):
-                                print(f"⚠️ Signal no longer valid for {sym} - skipping")
-                                continue
-                                
-                            tid = gen_id(sym)
-                            
-                            # Prepare indicator data for message and logging
-                            indicators = {
-                                'donchian_upper': current_upper,
-                                'donchian_lower': current_lower,
-                                'macd_main': macd_line.iloc[-1],
-                                'macd_signal': current_signal,
-                                'macd_hist': current_hist,
-                                'rsi': current_rsi,
-                                'rsi_status': rsi_status,
-                                'sma_9': current_sma_9,
-                                'sma_21': current_sma_21,
-                                'sma_alignment': sma_alignment
-                            }
-                            
-                            msg = generate_signal_message(sym, direction, price, tps, sl, tid, indicators)
-                            print(f"Signal detected for {sym} {direction}")
-                            
-                            for attempt in range(3):
-                                if send_whatsapp_message(driver, wait, msg):
-                                    tracked[sym] = {
-                                        "id": tid, 
-                                        "symbol": sym, 
-                                        "dir": direction,
-                                        "entry": price, 
-                                        "tps": tps, 
-                                        "sl": sl,
-                                        "status": "open", 
-                                        "hit": [],
-                                        "indicators": indicators,
-                                        "closure_advised": False,
-                                        "simulated": False
-                                    }
-                                    save_trades(tracked)
-                                    last_signal_times[sym] = current_utc_time
-                                    print(f"✅ Signal sent for {sym} {direction}")
-                                    break
-                                print(f"Retrying message send ({attempt+1}/3)...")
-                                time.sleep(3)
-                            else:
-                                print(f"❌ Failed to send signal for {sym} after 3 attempts")
-                    except Exception as sym_error:
-                        print(f"⚠️ Error processing symbol {sym}: {sym_error}")
+                    # Filter out symbols with stale data
+                    symbols = [s for s in symbols if is_data_fresh(s, current_utc_time)]
+                    scheduler.mark_pending(symbols)
+                    if symbols:
+                        scheduler.sync_clock(symbols[0])
+                    print(f"Bar closed - waiting on {len(symbols)} symbols with fresh data...")
                 
-                # Trade monitoring
-                print("Monitoring open trades...")
-                for sym, tr in list(tracked.items()):
-                    try:
-                        if tr.get('status') != "open":
-                            continue
-                        if not TEST_MODE and tr.get('simulated', False):
-                            continue
-                        
-                        tick = mt5.symbol_info_tick(sym)
-                        if not tick:
-                            continue
-                            
-                        price = tick.bid if tr['dir'] == "SELL" else tick.ask
-                        
-                        # Check for early closure conditions
-                        closure_reason = None
-                        
-                        # 1. Opposite Donchian band touch
+                # Only evaluate symbols whose bar has closed since their last evaluation
+                ready = scheduler.ready_symbols(bar_cache)
+                if ready:
+                    print(f"Scanning {len(ready)} symbols with a newly closed bar...")
+                    debug_symbol = random.choice(ready) if TEST_MODE else None
+                    pipeline.submit(ready, current_utc_time, debug_symbol)
+                    if first_scan_time is None:
+                        first_scan_time = time.time()
+                        print(f"⏱️ Time to first scan: {first_scan_time - BOOT_TIME:.2f}s "
+                              f"(MT5 {mt5_ready_time - BOOT_TIME:.2f}s, bar history {first_scan_time - mt5_ready_time:.2f}s)")
+                    print(f"Pipeline queue depth: {pipeline.depths()}")
+                
+                # Trade monitoring on its own, faster timer
+                if monitor_due:
+                    # Open trades per symbol, so each symbol's prices are fetched once
+                    watched = {}
+                    for tr in book.open_trades():
+                        if TEST_MODE or not tr.simulated:
+                            watched.setdefault(tr.symbol, []).append(tr)
+                    ladders.sync([tr for trades in watched.values() for tr in trades])
+                    paths, rows, starts, ends = [], [], [], []
+                    checks = []  # (trade, server ms its prices are checked up to once this pass succeeds)
+                    offset = 0
+
+                    for sym, trades in watched.items():
                         try:
-                            rates = mt5.copy_rates_from_pos(sym, TIMEFRAME, 0, DONCHIAN_PERIOD+10)
-                            if rates and len(rates) >= DONCHIAN_PERIOD:
-                                df = pd.DataFrame(rates)
-                                donchian_upper, donchian_lower = get_donchian(df)
-                                current_upper = donchian_upper.iloc[-1]
-                                current_lower = donchian_lower.iloc[-1]
-                                
-                                if tr['dir'] == "BUY" and price <= current_lower:
-                                    closure_reason = "Price touched opposite (lower) Donchian band"
-                                elif tr['dir'] == "SELL" and price >= current_upper:
-                                    closure_reason = "Price touched opposite (upper) Donchian band"
-                        except Exception as e:
-                            print(f"⚠️ Error checking Donchian for {sym}: {e}")
+                            tick = mt5.symbol_info_tick(sym)
+                            if not tick:
+                                continue
+                            scheduler.observe(tick.time_msc / 1000)
                         
-                        # 2. MACD crossover
-                        if not closure_reason:
+                            # Indicator values at the forming bar and the last closed bar,
+                            # from the same cached history the scanner uses
+                            current = previous = None
                             try:
-                                rates = mt5.copy_rates_from_pos(sym, TIMEFRAME, 0, 3)
-                                if rates and len(rates) >= 2:
-                                    df = pd.DataFrame(rates)
-                                    _, signal_line, histogram = get_macd(df)
-                                    current_hist = histogram.iloc[-1]
-                                    current_signal = signal_line.iloc[-1]
-                                    prev_hist = histogram.iloc[-2]
-                                    prev_signal = signal_line.iloc[-2]
-                                    
-                                    # Check for crossover
-                                    if tr['dir'] == "BUY":
-                                        if prev_hist > prev_signal and current_hist < current_signal:
-                                            closure_reason = "MACD histogram crossed below signal line"
-                                    else:  # SELL
-                                        if prev_hist < prev_signal and current_hist > current_signal:
-                                            closure_reason = "MACD histogram crossed above signal line"
+                                rates = bar_cache.get(sym, BAR_CACHE_SIZE)
+                                if rates is not None and len(rates) > DONCHIAN_PERIOD:
+                                    engine = sync_indicators(indicator_engines, sym, rates)
+                                    forming = rates[-1]
+                                    current = engine.peek(float(forming['high']), float(forming['low']), float(forming['close']))
+                                    previous = engine.last
                             except Exception as e:
-                                print(f"⚠️ Error checking MACD for {sym}: {e}")
-                        
-                        # Send advisory if closure condition met
-                        if closure_reason and not tr.get('closure_advised', False):
-                            if send_closure_advisory(driver, wait, sym, tr['entry'], price, tr['id'], tr['dir'], closure_reason):
-                                print(f"⚠️ Closure advisory sent for {sym}: {closure_reason}")
-                                tr['closure_advised'] = True
-                                tracked[sym] = tr
-                                save_trades(tracked)
-                        
-                        # Check TP hits
-                        for i, tp in enumerate(tr['tps']):
-                            if tp not in tr['hit']:
-                                if (tr['dir'] == "BUY" and price >= tp) or (tr['dir'] == "SELL" and price <= tp):
-                                    tr['hit'].append(tp)
-                                    event = f"TP{i+1} hit @ {tp}"
-                                    print(f"✅ {sym} {event}")
-                                    send_trade_update(driver, wait, sym, "TP_HIT", event, tr['id'])
-                                    
-                                    # Log performance
-                                    trade_data = {
-                                        'Timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
-                                        'TradeID': tr['id'],
-                                        'Symbol': sym,
-                                        'Direction': tr['dir'],
-                                        'Entry': tr['entry'],
-                                        'Exit': tp,
-                                        'Outcome': f"TP{i+1}",
-                                        'Pips': abs(tp - tr['entry']),
-                                        'DonchianUpper': tr['indicators']['donchian_upper'],
-                                        'DonchianLower': tr['indicators']['donchian_lower'],
-                                        'MACD_Main': tr['indicators']['macd_main'],
-                                        'MACD_Signal': tr['indicators']['macd_signal'],
-                                        'MACD_Hist': tr['indicators']['macd_hist'],
-                                        'RSI': tr['indicators']['rsi'],
-                                        'RSI_Status': tr['indicators']['rsi_status'],
-                                        'SMA_9': tr['indicators']['sma_9'],
-                                        'SMA_21': tr['indicators']['sma_21'],
-                                        'SMA_Alignment': tr['indicators']['sma_alignment']
-                                    }
-                                    analytics.log_trade(trade_data)
-                                    
-                                    # Close trade if all TPs hit
-                                    if len(tr['hit']) == len(tr['tps']):
-                                        tr['status'] = "closed"
-                                        print(f"🏁 {sym} All TPs reached")
-                                        send_trade_update(driver, wait, sym, "ALL_TP", "", tr['id'])
-                                        tracked[sym] = tr
-                                        save_trades(tracked)
-                
-                        # Check SL hit
-                        if (tr['dir'] == "BUY" and price <= tr['sl']) or (tr['dir'] == "SELL" and price >= tr['sl']):
-                            tr['status'] = "closed"
+                                print(f"⚠️ Error loading bars for {sym}: {e}")
+
+                            for tr in trades:
+                                price = tick.bid if tr.dir == "SELL" else tick.ask
+                            
+                                # Check for early closure conditions
+                                closure_reason = None
                             
-                            # Determine SL outcome based on TP hits
-                            if len(tr['hit']) > 0:
-                                outcome = "SL after TP (Win)"
-                                event = f"SL hit after TP @ {tr['sl']} (Win)"
-                            else:
-                                outcome = "SL without TP (Loss)"
-                                event = f"SL hit without any TP @ {tr['sl']} (Loss)"
+                                # 1. Opposite Donchian band touch
+                                try:
+                                    if current:
+                                        current_upper = current['donchian_upper']
+                                        current_lower = current['donchian_lower']
+                                    
+                                        if tr.dir == "BUY" and price <= current_lower:
+                                            closure_reason = "Price touched opposite (lower) Donchian band"
+                                        elif tr.dir == "SELL" and price >= current_upper:
+                                            closure_reason = "Price touched opposite (upper) Donchian band"
+                                except Exception as e:
+                                    print(f"⚠️ Error checking Donchian for {sym}: {e}")
                             
-                            print(f"🛑 {sym} {event}")
-                            send_trade_update(driver, wait, sym, "SL_HIT", event, tr['id'])
-                            tracked[sym] = tr
-                            save_trades(tracked)
+                                # 2. MACD crossover
+                                if not closure_reason:
+                                    try:
+                                        if current and previous:
+                                            current_hist = current['macd_hist']
+                                            current_signal = current['macd_signal']
+                                            prev_hist = previous['macd_hist']
+                                            prev_signal = previous['macd_signal']
+                                        
+                                            # Check for crossover
+                                            if tr.dir == "BUY":
+                                                if prev_hist > prev_signal and current_hist < current_signal:
+                                                    closure_reason = "MACD histogram crossed below signal line"
+                                            else:  # SELL
+                                                if prev_hist < prev_signal and current_hist > current_signal:
+                                                    closure_reason = "MACD histogram crossed above signal line"
+                                    except Exception as e:
+                                        print(f"⚠️ Error checking MACD for {sym}: {e}")
                             
-                            # Log performance
-                            trade_data = {
-                                'Timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
-                                'TradeID': tr['id'],
-                                'Symbol': sym,
-                                'Direction': tr['dir'],
-                                'Entry': tr['entry'],
-                                'Exit': tr['sl'],
-                                'Outcome': outcome,
-                                'Pips': -abs(tr['sl'] - tr['entry']),
-                                'DonchianUpper': tr['indicators']['donchian_upper'],
-                                'DonchianLower': tr['indicators']['donchian_lower'],
-                                'MACD_Main': tr['indicators']['macd_main'],
-                                'MACD_Signal': tr['indicators']['macd_signal'],
-                                'MACD_Hist': tr['indicators']['macd_hist'],
-                                'RSI': tr['indicators']['rsi'],
-                                'RSI_Status': tr['indicators']['rsi_status'],
-                                'SMA_9': tr['indicators']['sma_9'],
-                                'SMA_21': tr['indicators']['sma_21'],
-                                'SMA_Alignment': tr['indicators']['sma_alignment']
-                            }
-                            analytics.log_trade(trade_data)
+                                # Send advisory if closure condition met
+                                if closure_reason and not tr.closure_advised:
+                                    if send_closure_advisory(dispatcher, sym, tr.entry, price, tr.id, tr.dir, closure_reason):
+                                        print(f"⚠️ Closure advisory queued for {sym}: {closure_reason}")
+                                        tr.closure_advised = True
+                                        store.advised(tr)
+
+                            # Prices since each trade was last checked, fetched once for the
+                            # symbol; an unchecked trade only sees the current tick
+                            since = [tr.checked if tr.checked is not None else tick.time_msc - 1 for tr in trades]
+                            path, path_starts, path_ends = price_path(sym, since, tick)
+                            for tr, start, end in zip(trades, path_starts, path_ends):
+                                rows.append(ladders.rows[tr.id])
+                                starts.append(offset + int(start))
+                                ends.append(offset + int(end))
+                                checks.append((tr, int(tick.time_msc)))
+                            paths.append(path)
+                            offset += len(path['time'])
                     
-                    except Exception as trade_error:
-                        print(f"⚠️ Error processing trade {sym}: {trade_error}")
+                        except Exception as trade_error:
+                            print(f"⚠️ Error processing trades for {sym}: {trade_error}")
+
+                    # Every ladder's TP/SL touches in one pass, applied in the order they happened
+                    if paths:
+                        try:
+                            path = {name: np.concatenate([p[name] for p in paths]) for name in paths[0]}
+                            tp_rows, tp_levels, tp_times, sl_rows, sl_times = ladders.evaluate(rows, starts, ends, path)
+                            events = sorted([(int(t), 0, int(r), int(level)) for r, level, t in zip(tp_rows, tp_levels, tp_times)]
+                                            + [(int(t), 1, int(r), None) for r, t in zip(sl_rows, sl_times)])
+                            hit_trades = [ladders.trades[r] for _, _, r, _ in events]
+                            for (when, _, _, level), tr in zip(events, hit_trades):
+                                if tr.status != "open":
+                                    continue  # Closed by an earlier event (all TPs reached)
+                                # Path times are server ms; the scheduler knows the server clock offset
+                                happened = datetime.fromtimestamp(when / 1000 - (scheduler.server_offset or 0.), timezone.utc)
+                                if level is None:
+                                    record_sl_hit(tr, happened, book, store, dispatcher, analytics)
+                                else:
+                                    record_tp_hit(tr, level, happened, book, store, dispatcher, analytics)
+                            for tr in hit_trades:
+                                if tr.status != "open":
+                                    ladders.remove(tr.id)
+                            # Only now are these prices dealt with; a failed pass re-reads them
+                            for tr, checked in checks:
+                                tr.checked = checked
+                            store.checked([tr for tr, _ in checks])
+                        except Exception as e:
+                            print(f"⚠️ Error checking TP/SL levels: {e}")
                 
-                save_trades(tracked)
-                print(f"Cycle complete at {current_utc_time.strftime('%H:%M:%S')}, sleeping for 30 seconds...")
-                time.sleep(30)
+                    pipeline.save()
+                    analytics.flush()
             
             except Exception as loop_error:
                 print(f"⚠️ Error in main loop: {loop_error}")
                 import traceback
                 traceback.print_exc()
-                time.sleep(30)  # Wait before continuing
+                time.sleep(MONITOR_INTERVAL)  # Wait before continuing
             
     except KeyboardInterrupt:
         print("\nShutting down by user request...")
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
     finally:
+        messenger = dispatcher.pool if 'dispatcher' in locals() else None
+        if messenger is not None:
+            print("Flushing queued messages...")
+            dispatcher.flush()
+            print(f"Message delivery:\n{messenger.report()}")
+        elif 'dispatcher' in locals():
+            print(f"⚠️ WhatsApp never came up - {dispatcher.depth()} buffered message(s) dropped")
+        
+        if 'analytics' in locals():
+            analytics.close()
+        
+        if 'pipeline' in locals():
+            print("Compacting trade journal...")
+            pipeline.save(force=True)
+        
         print("Shutting down MT5...")
         mt5.shutdown()
         
-        if 'driver' in locals():
-            print("Closing Chrome driver...")
-            driver.quit()
+        if messenger is not None:
+            print("Closing messenger...")
+            messenger.quit()
         
         print("Resources released. Goodbye!")
\ No newline at end of file
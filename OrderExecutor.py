@@ -0,0 +1,198 @@
+"""
+Order execution pipeline
+Sends market orders on a worker thread so the decision loop never waits on the
+terminal. Requotes and price changes are retried at a fresh price until a deadline,
+rejected filling modes fall back to the next one the symbol allows, and every fill's
+submit-to-fill latency and slippage go into per-symbol histograms.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# === CONFIG ===
+ORDER_DEADLINE = 3.0  # Seconds from submit after which an order is not retried again
+ORDER_RETRY_DELAY = 0.05  # Pause before resending at a refreshed price
+FILL_CONFIRM_TIMEOUT = 60.0  # Seconds a filled entry counts as open while no snapshot shows it (e.g. stopped out at once)
+LATENCY_BINS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]  # Upper edges; the last bin is open
+SLIPPAGE_BINS_POINTS = [-10, -5, -2, -1, 0, 1, 2, 5, 10]  # Adverse slippage is positive
+
+# Terminal retcode names, resolved on the terminal module at start-up
+FILLED_RETCODES = ('TRADE_RETCODE_DONE', 'TRADE_RETCODE_DONE_PARTIAL')
+RETRY_RETCODES = ('TRADE_RETCODE_REQUOTE', 'TRADE_RETCODE_PRICE_CHANGED', 'TRADE_RETCODE_PRICE_OFF')
+FILLING_RETCODE = 'TRADE_RETCODE_INVALID_FILL'
+
+def histogram_line(edges, counts, unit):
+    """'<=5ms:3 <=10ms:8 ... >2500ms:0' with empty bins left out"""
+    labels = [f"<={edge}{unit}" for edge in edges] + [f">{edges[-1]}{unit}"]
+    return " ".join(f"{label}:{count}" for label, count in zip(labels, counts) if count) or "-"
+
+class ExecutionStats:
+    """Per-symbol fills, rejections, retries and latency/slippage histograms"""
+    def __init__(self):
+        self.symbols = {}
+        self.lock = threading.Lock()
+
+    def _symbol(self, symbol):
+        stats = self.symbols.get(symbol)
+        if stats is None:
+            stats = self.symbols[symbol] = {
+                'fills': 0,
+                'failed': 0,
+                'retries': 0,
+                'latency': np.zeros(len(LATENCY_BINS_MS) + 1, dtype=np.int64),
+                'slippage': np.zeros(len(SLIPPAGE_BINS_POINTS) + 1, dtype=np.int64),
+                'slippage_total': 0.
+            }
+        return stats
+
+    def filled(self, symbol, latency, slippage, retries):
+        """Record a fill: latency in seconds, slippage in points against the submitted price"""
+        with self.lock:
+            stats = self._symbol(symbol)
+            stats['fills'] += 1
+            stats['retries'] += retries
+            stats['latency'][np.searchsorted(LATENCY_BINS_MS, latency * 1000, side='left')] += 1
+            stats['slippage'][np.searchsorted(SLIPPAGE_BINS_POINTS, slippage, side='left')] += 1
+            stats['slippage_total'] += slippage
+
+    def failed(self, symbol, retries):
+        with self.lock:
+            stats = self._symbol(symbol)
+            stats['failed'] += 1
+            stats['retries'] += retries
+
+    def report(self):
+        with self.lock:
+            lines = []
+            for symbol, stats in sorted(self.symbols.items()):
+                mean_slippage = stats['slippage_total'] / stats['fills'] if stats['fills'] else 0.
+                lines.append(f"📈 {symbol}: {stats['fills']} filled, {stats['failed']} failed, "
+                             f"{stats['retries']} retries, mean slippage {mean_slippage:+.1f} pts")
+                lines.append(f"   latency  {histogram_line(LATENCY_BINS_MS, stats['latency'], 'ms')}")
+                lines.append(f"   slippage {histogram_line(SLIPPAGE_BINS_POINTS, stats['slippage'], 'pt')}")
+            return "\n".join(lines) or "📈 No orders executed yet"
+
+class OrderExecutor:
+    """Executes TRADE_ACTION_DEAL requests off the caller's thread.
+
+    submit() returns a Future of the final order_send result (None if the terminal
+    returned nothing). Orders run one at a time in submission order, so an entry and
+    a close for the same position cannot overtake each other.
+    """
+    def __init__(self, terminal, deadline=ORDER_DEADLINE, retry_delay=ORDER_RETRY_DELAY):
+        self.terminal = terminal
+        self.deadline = deadline
+        self.retry_delay = retry_delay
+        self.stats = ExecutionStats()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="orders")
+        self.in_flight = {}  # id(request) -> request, until its order is done
+        self.unconfirmed = {}  # position ticket -> (symbol, fill time) of entries no snapshot has shown yet
+        self.lock = threading.Lock()
+        self.fillings = {}  # symbol -> filling modes to try, in order
+        self.points = {}
+        self.filled_codes = {getattr(terminal, name) for name in FILLED_RETCODES}
+        self.retry_codes = {getattr(terminal, name) for name in RETRY_RETCODES}
+        self.filling_code = getattr(terminal, FILLING_RETCODE)
+
+    def submit(self, request, on_done=None):
+        """Queue a request; on_done(request, result) runs on the worker when it finishes"""
+        submitted = time.perf_counter()
+        with self.lock:
+            self.in_flight[id(request)] = request
+        future = self.pool.submit(self._run, request, submitted, on_done)
+        return future
+
+    def pending(self, symbol=None):
+        """Requests queued or being sent, optionally for one symbol"""
+        with self.lock:
+            return [req for req in self.in_flight.values() if symbol is None or req['symbol'] == symbol]
+
+    def open_entries(self, symbol, positions):
+        """Entries of symbol not yet among positions: queued, being sent, or filled since positions were read.
+
+        Filled entries stop counting once positions include their ticket. Checked under
+        one lock, so an entry moving from in flight to filled is never missed in between.
+        """
+        seen = {p.ticket for p in positions}
+        now = time.time()
+        with self.lock:
+            for ticket, (sym, filled) in list(self.unconfirmed.items()):
+                if sym == symbol and (ticket in seen or now - filled > FILL_CONFIRM_TIMEOUT):
+                    del self.unconfirmed[ticket]
+            entering = sum(1 for req in self.in_flight.values() if req['symbol'] == symbol and 'position' not in req)
+            return entering + sum(1 for sym, _ in self.unconfirmed.values() if sym == symbol)
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
+
+    def _run(self, request, submitted, on_done):
+        try:
+            result = self.execute(request, submitted)
+        except Exception as e:
+            print(f"❌ Order for {request['symbol']} failed: {e}")
+            self.stats.failed(request['symbol'], 0)
+            result = None
+        with self.lock:
+            self.in_flight.pop(id(request), None)
+            if result is not None and result.retcode in self.filled_codes and 'position' not in request:
+                # A market entry's position ticket is its order ticket
+                self.unconfirmed[result.order] = (request['symbol'], time.time())
+        if on_done:
+            on_done(request, result)
+        return result
+
+    def filling_modes(self, symbol):
+        """Filling modes the symbol allows, FOK first; RETURN only outside market execution"""
+        modes = self.fillings.get(symbol)
+        if modes is None:
+            t = self.terminal
+            info = t.symbol_info(symbol)
+            if info is None:
+                return [t.ORDER_FILLING_FOK]  # Unknown symbol: keep the terminal default
+            flags = info.filling_mode
+            modes = [mode for flag, mode in ((1, t.ORDER_FILLING_FOK), (2, t.ORDER_FILLING_IOC)) if flags & flag]
+            if info.trade_exemode != t.SYMBOL_TRADE_EXECUTION_MARKET:
+                modes.append(t.ORDER_FILLING_RETURN)
+            self.fillings[symbol] = modes = modes or [t.ORDER_FILLING_FOK]
+            self.points[symbol] = info.point or 0.
+        return modes
+
+    def execute(self, request, submitted=None):
+        """Send a request until it fills, is rejected for good, or the deadline passes"""
+        t = self.terminal
+        submitted = time.perf_counter() if submitted is None else submitted
+        symbol = request['symbol']
+        is_buy = request['type'] == t.ORDER_TYPE_BUY
+        requested = request['price']
+        modes = self.filling_modes(symbol)
+        preferred = request.get('type_filling')
+        if preferred in modes:
+            modes = [preferred] + [mode for mode in modes if mode != preferred]
+        req = dict(request, type_filling=modes[0])
+        mode_index, retries = 0, 0
+        while True:
+            result = t.order_send(req)
+            if result is not None and result.retcode in self.filled_codes:
+                fill = result.price or req['price']
+                point = self.points.get(symbol) or 1.
+                slippage = round(((fill - requested) if is_buy else (requested - fill)) / point, 1)
+                self.stats.filled(symbol, time.perf_counter() - submitted, slippage, retries)
+                return result
+            if result is None or time.perf_counter() - submitted >= self.deadline:
+                break
+            if result.retcode == self.filling_code and mode_index + 1 < len(modes):
+                mode_index += 1
+                req['type_filling'] = modes[mode_index]
+            elif result.retcode in self.retry_codes:
+                time.sleep(self.retry_delay)
+                tick = t.symbol_info_tick(symbol)
+                if tick is None:
+                    break
+                req['price'] = tick.ask if is_buy else tick.bid
+            else:
+                break
+            retries += 1
+        self.stats.failed(symbol, retries)
+        return result
@@ -0,0 +1,204 @@
+"""
+IntelliTrade parameter sweep
+Scores a grid of DONCHIAN_PERIOD / MACD / FIB_LEVELS / RR settings with the
+backtester on many symbols in parallel. Bars are loaded once into shared memory;
+finished points are checkpointed so an interrupted sweep resumes where it stopped.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from Backtest import DEFAULT_PARAMS, backtest
+from BarStore import BAR_STORE_DIR, BarStore, sync_symbols
+from IntelliTrade import mt5, TIMEFRAME_LABEL, SYMBOL_LIST
+from TradeAnalytics import grouped_stats, tp_levels
+
+# === CONFIG ===
+SWEEP_CHECKPOINT = "sweep_results.jsonl"  # One finished grid point per line
+SWEEP_RANKED = "sweep_ranked.csv"
+MIN_SWEEP_TRADES = 30  # Points with fewer trades are ranked last
+# Backtest parameters a grid varies; RSI_PERIOD only labels rows (RSI_Status) and never changes
+# a signal or an outcome, so sweeping it would only repeat identical backtests
+SWEPT_PARAMS = ['donchian_period', 'macd_fast', 'macd_slow', 'macd_signal', 'fib_levels', 'rr']
+
+# === SHARED BARS ===
+_worker = {}  # Per-process: shared memory handle and {symbol: (rates view, point)}
+
+def share_bars(bars):
+    """Copy {symbol: rates} into one shared-memory block; returns (shm, {symbol: (offset, count)})"""
+    dtype = next(iter(bars.values())).dtype
+    total = sum(len(rates) for rates in bars.values())
+    shm = shared_memory.SharedMemory(create=True, size=max(1, total * dtype.itemsize))
+    block = np.ndarray(total, dtype=dtype, buffer=shm.buf)
+    layout, pos = {}, 0
+    for sym, rates in bars.items():
+        block[pos:pos + len(rates)] = rates
+        layout[sym] = (pos, len(rates))
+        pos += len(rates)
+    return shm, layout
+
+def _attach(name, dtype, total, layout, points):
+    """Pool initializer: map the shared bars into this worker without copying them"""
+    shm = shared_memory.SharedMemory(name=name)
+    block = np.ndarray(total, dtype=dtype, buffer=shm.buf)
+    _worker['shm'] = shm  # Keep the mapping alive for the life of the worker
+    _worker['bars'] = {sym: (block[pos:pos + count], points[sym]) for sym, (pos, count) in layout.items()}
+
+def score_rows(rows):
+    """Sweep metrics for the backtest rows of one grid point over all symbols"""
+    if not rows:
+        return {'trades': 0, 'rows': 0, 'win_rate': 0., 'profit_factor': 0., 'expectancy': 0.,
+                'total': 0., 'max_drawdown': 0., 'tp1_rate': 0.}
+    rows = sorted(rows, key=lambda row: row['Timestamp'])
+    returns = np.array([row['Pips'] / row['Entry'] * 100 for row in rows])  # % of entry, as in TradeAnalytics
+    levels = tp_levels(np.array([row['Outcome'] for row in rows]))
+    trades = np.unique([row['TradeID'] for row in rows], return_inverse=True)[1]
+    stats = grouped_stats(np.zeros(len(rows), dtype=np.int64), returns, levels, trades, 1)
+    return {
+        'trades': int(stats['trades'][0]),
+        'rows': int(stats['rows'][0]),
+        'win_rate': float(stats['win_rate'][0]),
+        'profit_factor': float(stats['profit_factor'][0]),
+        'expectancy': float(stats['expectancy'][0]),
+        'total': float(stats['total'][0]),
+        'max_drawdown': float(stats['max_drawdown'][0]),
+        'tp1_rate': float(stats['tp_hit'][0, 0])
+    }
+
+def run_point(params):
+    """Backtest one grid point on every shared symbol (runs in a worker)"""
+    rows = []
+    for sym, (rates, point) in _worker['bars'].items():
+        rows.extend(backtest(sym, rates, params, point))
+    return params, score_rows(rows)
+
+# === GRID ===
+def parameter_grid(donchian, macd_fast, macd_slow, macd_signal, fib_levels, rr):
+    """Every valid combination as a params dict for backtest()"""
+    for values in itertools.product(donchian, macd_fast, macd_slow, macd_signal, fib_levels, rr):
+        params = dict(zip(SWEPT_PARAMS, values))
+        if params['macd_fast'] < params['macd_slow']:
+            yield params
+
+def point_key(params):
+    return json.dumps(params, sort_keys=True)
+
+def load_checkpoint(path=SWEEP_CHECKPOINT):
+    """{point key: result record} of the points already finished"""
+    done = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from an interrupted run
+                done[point_key(record['params'])] = record
+    except FileNotFoundError:
+        pass
+    return done
+
+def write_ranking(records, rank_by, path=SWEEP_RANKED):
+    """Results table, best first; points with too few trades go to the bottom"""
+    ranked = sorted(records, key=lambda r: (r['score']['trades'] >= MIN_SWEEP_TRADES,
+                                            np.nan_to_num(r['score'][rank_by], posinf=1e9)), reverse=True)
+    fields = SWEPT_PARAMS + list(ranked[0]['score']) if ranked else []
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rank'] + fields)
+        for rank, record in enumerate(ranked, 1):
+            values = dict(record['params'], **record['score'])
+            writer.writerow([rank] + [" ".join(map(str, values[k])) if isinstance(values[k], list) else values[k]
+                                      for k in fields])
+    return ranked
+
+# === BARS ===
+def load_bars(symbols, bars, store_dir=BAR_STORE_DIR, offline=False):
+    """{symbol: rates} and {symbol: point} from the bar store, synced from MT5 first unless offline"""
+    store = BarStore(store_dir)
+    timeframe = TIMEFRAME_LABEL
+    if not offline:
+        if mt5 is None:
+            print("⚠️ MetaTrader5 not installed - sweeping the bar store as is")
+        elif mt5.initialize():
+            try:
+                sync_symbols(store, mt5, symbols or SYMBOL_LIST, [timeframe], history_bars=bars)
+            finally:
+                mt5.shutdown()
+        else:
+            print("⚠️ MT5 unavailable - sweeping the bar store as is")
+    history, points = {}, {}
+    for sym in symbols or store.symbols():
+        rates = store.read(sym, timeframe, count=bars)
+        if len(rates):
+            history[sym] = rates
+            points[sym] = store.info(sym).get('point', 0.)
+    return history, points
+
+# === MAIN EXECUTION ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep for the IntelliTrade signal")
+    parser.add_argument("--symbols", nargs="+", help="default: every symbol in the bar store")
+    parser.add_argument("--bars", type=int, default=43200, help="M1 bars of history per symbol")
+    parser.add_argument("--store", default=BAR_STORE_DIR, help="bar store the history is read from")
+    parser.add_argument("--offline", action="store_true", help="use the bar store as is, without syncing from MT5")
+    parser.add_argument("--donchian", type=int, nargs="+", default=[DEFAULT_PARAMS['donchian_period']])
+    parser.add_argument("--macd-fast", type=int, nargs="+", default=[DEFAULT_PARAMS['macd_fast']])
+    parser.add_argument("--macd-slow", type=int, nargs="+", default=[DEFAULT_PARAMS['macd_slow']])
+    parser.add_argument("--macd-signal", type=int, nargs="+", default=[DEFAULT_PARAMS['macd_signal']])
+    parser.add_argument("--fib", nargs="+", default=[",".join(map(str, DEFAULT_PARAMS['fib_levels']))],
+                        help="comma-separated ladders, e.g. 100,161.8,261.8,423.6")
+    parser.add_argument("--rr", type=float, nargs="+", default=[float(DEFAULT_PARAMS["rr"])])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--checkpoint", default=SWEEP_CHECKPOINT)
+    parser.add_argument("--out", default=SWEEP_RANKED)
+    parser.add_argument("--rank-by", default="profit_factor",
+                        choices=['profit_factor', 'expectancy', 'total', 'win_rate', 'tp1_rate'])
+    args = parser.parse_args()
+
+    fib_levels = [[float(level) for level in ladder.split(",")] for ladder in args.fib]
+    grid = list(parameter_grid(args.donchian, args.macd_fast, args.macd_slow, args.macd_signal,
+                               fib_levels, args.rr))
+    done = load_checkpoint(args.checkpoint)
+    todo = [params for params in grid if point_key(params) not in done]
+    print(f"{len(grid)} grid points, {len(grid) - len(todo)} already in {args.checkpoint}, {len(todo)} to run")
+
+    if todo:
+        bars, points = load_bars(args.symbols, args.bars, args.store, args.offline)
+        if not bars:
+            raise SystemExit("No history to sweep")
+        shm, layout = share_bars(bars)
+        total = sum(count for _, count in layout.values())
+        dtype = next(iter(bars.values())).dtype
+        del bars  # Workers and this process read from shared memory from here on
+        print(f"Sharing {total} bars of {len(layout)} symbols ({shm.size / 1e6:.1f} MB) with {args.workers} workers")
+
+        start = time.perf_counter()
+        try:
+            with open(args.checkpoint, 'a') as checkpoint, \
+                 ProcessPoolExecutor(max_workers=args.workers, initializer=_attach,
+                                     initargs=(shm.name, dtype, total, layout, points)) as pool:
+                futures = [pool.submit(run_point, params) for params in todo]
+                for finished, future in enumerate(as_completed(futures), 1):
+                    params, score = future.result()
+                    record = {'params': params, 'score': score}
+                    done[point_key(params)] = record
+                    checkpoint.write(json.dumps(record) + "\n")
+                    checkpoint.flush()
+                    elapsed = time.perf_counter() - start
+                    print(f"[{finished}/{len(todo)}] PF {score['profit_factor']:.2f}, {score['trades']} trades - "
+                          f"{elapsed / finished * (len(todo) - finished) / 60:.1f} min left")
+        finally:
+            shm.close()
+            shm.unlink()
+
+    ranked = write_ranking([done[point_key(params)] for params in grid], args.rank_by, args.out)
+    print(f"✅ Ranked {len(ranked)} points by {args.rank_by} in {args.out}")
+    for rank, record in enumerate(ranked[:10], 1):
+        print(f"{rank:>3}. {record['params']} -> {record['score']}")
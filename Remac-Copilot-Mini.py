@@ -1,13 +1,22 @@
-import MetaTrader5 as mt5
+try:
+    import MetaTrader5
+except ImportError:
+    MetaTrader5 = None  # Rules only, e.g. RemacSimulator on a machine without the terminal
 import pandas as pd
 import time
 from datetime import datetime
 import talib
+from BarResampler import Resampler
+from BrokerGateway import BrokerGateway
+from OrderExecutor import OrderExecutor
+
+mt5 = BrokerGateway(MetaTrader5) if MetaTrader5 else None  # Every terminal call is counted and timed
+executor = OrderExecutor(mt5) if mt5 else None  # Orders go out on a worker thread, off the decision loop
 
 # === CONFIGURATION ===
 SYMBOL = "Volatility 25 Index"
-TIMEFRAME_1M = mt5.TIMEFRAME_M1
-TIMEFRAME_5M = mt5.TIMEFRAME_M5
+TIMEFRAME_1M = mt5.TIMEFRAME_M1 if mt5 else None
+TIMEFRAME_5M = mt5.TIMEFRAME_M5 if mt5 else None
 LOT_SIZE = 0.5       # per trade
 MAX_POSITIONS = 5
 MAGIC = 100025
@@ -16,25 +25,38 @@ DONCHIAN_PERIOD = 20
 EMA_PERIOD = 25
 ATR_PERIOD = 14
 ATR_MULTIPLIER = 1.0  # buffer multiplier
+REPORT_EVERY = 120  # Loop passes between terminal call reports
 
 # === INIT MT5 ===
-symbol_info = mt5.initialize() and mt5.symbol_select(SYMBOL, True)
-if not symbol_info:
-    raise RuntimeError("MT5 initialization or symbol selection failed")
-symbol_info = mt5.symbol_info(SYMBOL)
-POINT = symbol_info.point if symbol_info and symbol_info.point else 0.0001
+POINT = 0.0001
+
+def init_mt5():
+    global POINT
+    if mt5 is None:
+        raise RuntimeError("MetaTrader5 is not installed")
+    symbol_info = mt5.initialize() and mt5.symbol_select(SYMBOL, True)
+    if not symbol_info:
+        raise RuntimeError("MT5 initialization or symbol selection failed")
+    symbol_info = mt5.symbol_info(SYMBOL)
+    POINT = symbol_info.point if symbol_info and symbol_info.point else 0.0001
 
 # === LOGGING ===
 def log(msg):
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
 
 # === DATA FETCH ===
-def get_data(tf, count=200):
-    rates = mt5.copy_rates_from_pos(SYMBOL, tf, 0, count)
+def to_frame(rates):
     df = pd.DataFrame(rates)
     df['time'] = pd.to_datetime(df['time'], unit='s')
     return df
 
+def m5_resampler(rates1, count=200):
+    """M5 bars kept up to date from the M1 closes: seeded once from the terminal's closed M5 bars"""
+    htf = Resampler(['M5'], size=count)
+    htf.seed('M5', mt5.copy_rates_from_pos(SYMBOL, TIMEFRAME_5M, 1, count))
+    htf.feed(rates1[:-1])
+    return htf
+
 # === INDICATORS ===
 def calc_macd_hist(df):
     macd = df['close'].ewm(span=12).mean() - df['close'].ewm(span=26).mean()
@@ -108,19 +130,39 @@ def get_stop_loss(is_buy, entry_price, df):
         entry_high = df['high'].iloc[-1]
         return entry_high + atr
 
+# === ENTRY / EXIT RULES ===
+def entry_signal(hist, vel, price, upper, lower):
+    """True for a buy setup, False for a sell setup, None for no entry"""
+    if is_valid_positive_peak(hist) and price >= upper:
+        return False
+    if (is_valid_positive_trough(hist) or is_negative_peak_velocity(vel, hist)) and price <= lower:
+        return True
+    return None
+
+def band_exit(is_buy, price, upper, lower, ema, sar, htf_bear):
+    """None while the position's exit band is untouched; otherwise True to close, False to hold for the trend"""
+    if is_buy and price >= upper:
+        return not (htf_bear and price > ema and sar < price)
+    if not is_buy and price <= lower:
+        return not (htf_bear and price < ema and sar > price)
+    return None
+
 # === POSITION MANAGEMENT ===
-def count_positions():
-    pos = mt5.positions_get(symbol=SYMBOL, magic=MAGIC)
-    return len(pos) if pos else 0
+def count_positions(snap):
+    """Positions in the snapshot plus entries it does not show yet (queued, sending, or filled after it was taken)"""
+    return snap.count(MAGIC) + executor.open_entries(SYMBOL, snap.positions)
 
-def close_trade(ticket, is_buy):
+def close_trade(position, snap):
+    ticket = position.ticket
+    is_buy = (position.type == mt5.ORDER_TYPE_BUY)
+    if any(req.get("position") == ticket for req in executor.pending(SYMBOL)):
+        return  # Close already on its way
     ct = mt5.ORDER_TYPE_SELL if is_buy else mt5.ORDER_TYPE_BUY
-    price = mt5.symbol_info_tick(SYMBOL).bid if is_buy else mt5.symbol_info_tick(SYMBOL).ask
-    vol = mt5.positions_get(ticket=ticket)[0].volume
+    price = snap.price(not is_buy)
     req = {
         "action": mt5.TRADE_ACTION_DEAL,
         "symbol": SYMBOL,
-        "volume": vol,
+        "volume": position.volume,
         "type": ct,
         "position": ticket,
         "price": price,
@@ -131,21 +173,25 @@ def close_trade(ticket, is_buy):
         "type_filling": mt5.ORDER_FILLING_FOK
     }
     log(f"🚪 Closing position #{ticket} at {price}")
-    r = mt5.order_send(req)
+    executor.submit(req, on_done=closed)
+
+def closed(req, r):
+    ticket = req["position"]
     if r is None:
         log(f"❌ Close order returned None: {mt5.last_error()}")
-    elif r.retcode == mt5.TRADE_RETCODE_DONE:
-        log(f"✅ Closed position #{ticket}")
+    elif r.retcode in executor.filled_codes:
+        log(f"✅ Closed position #{ticket} @ {r.price or req['price']}")
     else:
         log(f"❌ Failed to close position #{ticket}, retcode={r.retcode}")
 
 # === OPEN TRADES ===
-def open_trade(is_buy, sl=None):
-    log(f"🛒 Attempting to open {'BUY' if is_buy else 'SELL'} trade. Positions={count_positions()}")
-    if count_positions() >= MAX_POSITIONS:
+def open_trade(is_buy, snap, sl=None):
+    positions = count_positions(snap)
+    log(f"🛒 Attempting to open {'BUY' if is_buy else 'SELL'} trade. Positions={positions}")
+    if positions >= MAX_POSITIONS:
         log(f"⚠️ Max positions reached ({MAX_POSITIONS}), skipping entry.")
         return
-    entry_price = mt5.symbol_info_tick(SYMBOL).ask if is_buy else mt5.symbol_info_tick(SYMBOL).bid
+    entry_price = snap.price(is_buy)
     if sl is None:
         sl = get_stop_loss(is_buy, entry_price, df1)
     req = {
@@ -162,11 +208,14 @@ def open_trade(is_buy, sl=None):
         "type_filling": mt5.ORDER_FILLING_FOK
     }
     log(f"📝 Order Request: {req}")
-    r = mt5.order_send(req)
+    executor.submit(req, on_done=opened)
+
+def opened(req, r):
+    is_buy = req["type"] == mt5.ORDER_TYPE_BUY
     if r is None:
         log(f"❌ Entry order returned None: {mt5.last_error()}")
-    elif r.retcode == mt5.TRADE_RETCODE_DONE:
-        log(f"🟢 Opened {'BUY' if is_buy else 'SELL'} @ {entry_price:.5f} SL={sl:.5f}")
+    elif r.retcode in executor.filled_codes:
+        log(f"🟢 Opened {'BUY' if is_buy else 'SELL'} @ {r.price or req['price']:.5f} SL={req['sl']:.5f}")
     else:
         log(f"❌ Failed to open trade, retcode={r.retcode}, comment={r.comment}")
 
@@ -174,46 +223,65 @@ def open_trade(is_buy, sl=None):
 def run_bot():
     global df1
     log("🚀 Bot started with Donchian, MACD, SAR, EMA filters.")
+    htf = None
     while True:
-        df1 = get_data(TIMEFRAME_1M)
-        hist1 = calc_macd_hist(df1)
-        vel1 = get_velocity(hist1)
-        sar1 = calc_sar(df1).iloc[-1]
-        price1 = df1['close'].iloc[-1]
-        ema1 = calc_ema(df1, EMA_PERIOD).iloc[-1]
-        up1, mid1, low1 = calc_donchian(df1, DONCHIAN_PERIOD)
-        upper1, middle1, lower1 = up1.iloc[-1], mid1.iloc[-1], low1.iloc[-1]
-
-        df5 = get_data(TIMEFRAME_5M)
-        hist5 = calc_macd_hist(df5)
-        htf_bull = hist5.iloc[-1] > 0
-        htf_bear = hist5.iloc[-1] < 0
-
-        if is_valid_positive_peak(hist1) and price1 >= upper1:
-            log("🔻 Signal: MACD peak + upper Donchian (sell setup)")
-            open_trade(False)
-        elif (is_valid_positive_trough(hist1) or is_negative_peak_velocity(vel1, hist1)) and price1 <= lower1:
-            log("🔺 Signal: MACD trough/vel peak + lower Donchian (buy setup)")
-            open_trade(True)
-        else:
-            log("⏳ No new entry signals.")
-
-        for p in mt5.positions_get(symbol=SYMBOL) or []:
-            is_buy = (p.type == mt5.ORDER_TYPE_BUY)
-            if is_buy and price1 >= upper1:
-                log(f"🔔 Buy #{p.ticket} hit upper band.")
-                if not (htf_bear and price1 > ema1 and sar1 < price1):
-                    close_trade(p.ticket, True)
+        with mt5.iteration():
+            # One tick/positions snapshot per pass; every decision below reads from it
+            snap = mt5.snapshot(SYMBOL)
+            rates1 = mt5.copy_rates_from_pos(SYMBOL, TIMEFRAME_1M, 0, 200)
+            if snap is None or rates1 is None or len(rates1) == 0:
+                log(f"⚠️ No tick or bars from the terminal: {mt5.last_error()}")
+                time.sleep(5)
+                continue
+            df1 = to_frame(rates1)
+            hist1 = calc_macd_hist(df1)
+            vel1 = get_velocity(hist1)
+            sar1 = calc_sar(df1).iloc[-1]
+            price1 = df1['close'].iloc[-1]
+            ema1 = calc_ema(df1, EMA_PERIOD).iloc[-1]
+            up1, mid1, low1 = calc_donchian(df1, DONCHIAN_PERIOD)
+            upper1, middle1, lower1 = up1.iloc[-1], mid1.iloc[-1], low1.iloc[-1]
+
+            # M5 from the M1 bars already fetched; re-seeded only if M1 closes were missed
+            if htf is None or not htf.feed(rates1[:-1]):
+                htf = m5_resampler(rates1)
+            df5 = to_frame(htf.bars('M5', 200, forming=rates1[-1]))
+            hist5 = calc_macd_hist(df5)
+            htf_bull = hist5.iloc[-1] > 0
+            htf_bear = hist5.iloc[-1] < 0
+
+            signal = entry_signal(hist1, vel1, price1, upper1, lower1)
+            if signal is False:
+                log("🔻 Signal: MACD peak + upper Donchian (sell setup)")
+                open_trade(False, snap)
+            elif signal is True:
+                log("🔺 Signal: MACD trough/vel peak + lower Donchian (buy setup)")
+                open_trade(True, snap)
+            else:
+                log("⏳ No new entry signals.")
+
+            for p in snap.positions:
+                is_buy = (p.type == mt5.ORDER_TYPE_BUY)
+                exit_now = band_exit(is_buy, price1, upper1, lower1, ema1, sar1, htf_bear)
+                if exit_now is None:
+                    continue
+                if is_buy:
+                    log(f"🔔 Buy #{p.ticket} hit upper band.")
                 else:
-                    log(f"🏄 Holding buy #{p.ticket} to ride uptrend.")
-            elif not is_buy and price1 <= lower1:
-                log(f"🔔 Sell #{p.ticket} hit lower band.")
-                if not (htf_bear and price1 < ema1 and sar1 > price1):
-                    close_trade(p.ticket, False)
+                    log(f"🔔 Sell #{p.ticket} hit lower band.")
+                if exit_now:
+                    close_trade(p, snap)
                 else:
-                    log(f"🏄 Holding sell #{p.ticket} to ride downtrend.")
+                    log(f"🏄 Holding {'buy' if is_buy else 'sell'} #{p.ticket} to ride {'uptrend' if is_buy else 'downtrend'}.")
 
+        if mt5.iterations % REPORT_EVERY == 0:
+            log("Terminal calls report:\n" + mt5.report() + "\n" + executor.stats.report())
         time.sleep(5)
 
 if __name__ == "__main__":
-    run_bot()
+    init_mt5()
+    try:
+        run_bot()
+    except KeyboardInterrupt:
+        executor.shutdown()  # Let orders already sent finish
+        log("🛑 Bot stopped.\n" + mt5.report() + "\n" + executor.stats.report())
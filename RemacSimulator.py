@@ -0,0 +1,262 @@
+"""
+Remac-Copilot-Mini simulator
+Event-driven replay of run_bot over historical M1 bars (with M5 for the higher
+timeframe filter). Entries, stops and band exits go through the bot's own decision
+functions; fills, stop-outs, MAX_POSITIONS and close_trade are modelled per bar.
+"""
+
+import argparse
+import csv
+import importlib.util
+import os
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from BarResampler import resample
+from BarStore import BAR_STORE_DIR, BarStore, sync_symbols
+
+# === CONFIG ===
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Remac-Copilot-Mini.py")
+BOT_WINDOW = 200  # M1 bars run_bot fetches on every pass
+M5_SECONDS = 300
+SIM_TRADES_FILE = "remac_sim_trades.csv"
+SIM_EQUITY_FILE = "remac_sim_equity.csv"
+
+def load_bot(path=BOT_SCRIPT):
+    """Import the bot script (its file name is not a valid module name)"""
+    spec = importlib.util.spec_from_file_location("remac_copilot_mini", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+bot = None  # The bot script, loaded on first use by get_bot()
+
+def get_bot():
+    global bot
+    if bot is None:
+        bot = load_bot()
+    return bot
+
+# === INDICATORS ===
+# Every indicator is computed once over the whole history with the bot's own
+# definitions. The live bot recomputes them on its last BOT_WINDOW bars; the EMAs and
+# SAR have converged long before 200 bars, so the two agree to float noise.
+
+def ewm_extend(series, span, value, count):
+    """ewm(span).mean() of series[:count] followed by value, for many (value, count) pairs at once.
+
+    Uses the adjust=True form mean = sum(w_j x_j) / sum(w_j), whose numerator and
+    denominator both advance by one multiply-add per new observation.
+    """
+    decay = 1 - 2 / (span + 1)
+    mean = series.ewm(span=span).mean().to_numpy()
+    weight = (1 - decay ** np.arange(1, len(series) + 1)) / (1 - decay)  # sum(w_j) after k+1 values
+    prev = np.maximum(count - 1, 0)
+    num = np.where(count > 0, mean[prev] * weight[prev], 0.)
+    den = np.where(count > 0, weight[prev], 0.)
+    return (value + decay * num) / (1 + decay * den)
+
+def htf_hist(times, closes, m5_times, m5_closes):
+    """M5 MACD histogram as the bot sees it at each M1 close.
+
+    The bot's last M5 bar is the forming one, whose close is the current M1 close, so
+    each M1 step extends the completed M5 bars with that close.
+    """
+    completed = np.searchsorted(m5_times, times - times % M5_SECONDS, side='left')
+    m5 = pd.Series(m5_closes, dtype=float)
+    macd_m5 = m5.ewm(span=12).mean() - m5.ewm(span=26).mean()
+    macd = ewm_extend(m5, 12, closes, completed) - ewm_extend(m5, 26, closes, completed)
+    return macd - ewm_extend(macd_m5, 9, macd, completed)
+
+def indicator_arrays(rates, m5_rates=None):
+    """Per-bar values of everything run_bot reads, as if each M1 bar were the forming one"""
+    bot = get_bot()
+    df = pd.DataFrame({'high': rates['high'], 'low': rates['low'], 'close': rates['close']}, dtype=float)
+    times = rates['time'].astype(np.int64)
+    hist = bot.calc_macd_hist(df)
+    upper, _, lower = bot.calc_donchian(df, bot.DONCHIAN_PERIOD)
+    if m5_rates is None:
+        m5_rates = resample(rates, 'M5')  # As the live bot builds them
+    m5_times, m5_closes = m5_rates['time'].astype(np.int64), m5_rates['close'].astype(float)
+    return {
+        'hist': hist,
+        'vel': bot.get_velocity(hist),
+        'sar': bot.calc_sar(df).to_numpy(),
+        'ema': bot.calc_ema(df, bot.EMA_PERIOD).to_numpy(),
+        'upper': upper.to_numpy(),
+        'lower': lower.to_numpy(),
+        'htf_hist': htf_hist(times, df['close'].to_numpy(), m5_times, m5_closes)
+    }
+
+# === SIMULATION ===
+def simulate(rates, m5_rates=None, point=0., contract_size=1., volume=None, entries_per_signal=1):
+    """Replay run_bot over M1 rates (an MT5 rates array); returns trades, equity curve and counters.
+
+    One step per M1 bar, taken at its close, in the bot's order:
+      1. stop losses of open positions touched inside the bar fill at the SL (or at
+         the open when the bar gaps through it); BUY stops trigger on the bid low,
+         SELL stops on the ask high
+      2. entry_signal on the bot's view; with fewer than MAX_POSITIONS open, a BUY
+         fills at the ask (close + spread), a SELL at the bid, with the SL from
+         get_stop_loss on the last BOT_WINDOW bars
+      3. band_exit for every open position; a close fills like close_trade, at the
+         bid for buys and the ask for sells
+
+    The live loop polls every 5 seconds and re-enters while a signal lasts;
+    entries_per_signal > 1 opens that many positions per signal bar (still capped
+    by MAX_POSITIONS). Profit is price change x volume x contract_size. Positions
+    still open at the end are closed at the last bar's close.
+    """
+    bot = get_bot()
+    volume = bot.LOT_SIZE if volume is None else volume
+    n = len(rates)
+    ind = indicator_arrays(rates, m5_rates)
+    times = rates['time'].astype(np.int64).tolist()
+    opens = rates['open'].astype(float).tolist()
+    highs = rates['high'].astype(float).tolist()
+    lows = rates['low'].astype(float).tolist()
+    closes = rates['close'].astype(float).tolist()
+    spread = ((rates['spread'] * point) if point and 'spread' in rates.dtype.names else np.zeros(n)).tolist()
+    upper, lower = ind['upper'].tolist(), ind['lower'].tolist()
+    ema, sar, htf_bear = ind['ema'].tolist(), ind['sar'].tolist(), (ind['htf_hist'] < 0).tolist()
+    hist, vel = ind['hist'], ind['vel']
+    bars = pd.DataFrame({'high': highs, 'low': lows, 'close': closes})  # get_stop_loss reads windows of this
+
+    trades = []
+    positions = []
+    balance = 0.
+    equity = np.zeros(n)
+    counters = {'signals': 0, 'max_positions_skips': 0, 'holds': 0, 'band_closes': 0, 'stop_outs': 0}
+
+    def close(pos, i, price, reason):
+        nonlocal balance
+        profit = (price - pos['entry']) * (1 if pos['is_buy'] else -1) * volume * contract_size
+        balance += profit
+        trades.append(dict(pos, exit_time=times[i], exit=price, reason=reason, profit=profit, balance=balance))
+
+    for i in range(BOT_WINDOW - 1, n):
+        price = closes[i]
+        if positions:
+            kept = []
+            for pos in positions:
+                if pos['is_buy'] and lows[i] <= pos['sl']:
+                    close(pos, i, min(opens[i], pos['sl']), 'sl')
+                elif not pos['is_buy'] and highs[i] + spread[i] >= pos['sl']:
+                    close(pos, i, max(opens[i] + spread[i], pos['sl']), 'sl')
+                else:
+                    kept.append(pos)
+                    continue
+                counters['stop_outs'] += 1
+            positions = kept
+
+        # Both setups need a band touch, so the pattern checks only run on those bars
+        if price >= upper[i] or price <= lower[i]:
+            signal = bot.entry_signal(hist.iloc[i - 5:i + 1], vel.iloc[i - 5:i + 1], price, upper[i], lower[i])
+            if signal is not None:
+                counters['signals'] += 1
+                for _ in range(entries_per_signal):
+                    if len(positions) >= bot.MAX_POSITIONS:
+                        counters['max_positions_skips'] += 1
+                        break
+                    entry = price + spread[i] if signal else price
+                    sl = float(bot.get_stop_loss(signal, entry, bars.iloc[i - BOT_WINDOW + 1:i + 1]))
+                    positions.append({'ticket': len(trades) + len(positions) + 1, 'is_buy': signal,
+                                      'entry_time': times[i], 'entry': entry, 'sl': sl})
+
+            kept = []
+            for pos in positions:
+                exit_now = bot.band_exit(pos['is_buy'], price, upper[i], lower[i], ema[i], sar[i], htf_bear[i])
+                if exit_now:
+                    close(pos, i, price if pos['is_buy'] else price + spread[i], 'band')
+                    counters['band_closes'] += 1
+                    continue
+                if exit_now is False:
+                    counters['holds'] += 1
+                kept.append(pos)
+            positions = kept
+
+        floating = 0.
+        for pos in positions:
+            mark = price if pos['is_buy'] else price + spread[i]
+            floating += (mark - pos['entry']) * (1 if pos['is_buy'] else -1) * volume * contract_size
+        equity[i] = balance + floating
+
+    for pos in positions:
+        close(pos, n - 1, closes[-1] if pos['is_buy'] else closes[-1] + spread[-1], 'end')
+    start = min(BOT_WINDOW - 1, n)
+    return {'trades': trades, 'times': np.asarray(times[start:], dtype=np.int64),
+            'equity': equity[start:], 'counters': counters}
+
+def summary(result):
+    profits = np.array([trade['profit'] for trade in result['trades']])
+    equity = result['equity']
+    wins, losses = profits[profits > 0].sum(), -profits[profits < 0].sum()
+    return {
+        'trades': len(profits),
+        'win_rate': (profits > 0).mean() * 100 if len(profits) else 0.,
+        'profit_factor': wins / losses if losses else float('inf') if wins else 0.,
+        'net': profits.sum(),
+        'max_drawdown': (np.maximum.accumulate(np.maximum(equity, 0)) - equity).max() if len(equity) else 0.
+    }
+
+def bar_time(timestamp):
+    return datetime.fromtimestamp(int(timestamp), timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def write_results(result, trades_path=SIM_TRADES_FILE, equity_path=SIM_EQUITY_FILE):
+    with open(trades_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Ticket', 'Direction', 'EntryTime', 'Entry', 'SL', 'ExitTime', 'Exit', 'Reason', 'Profit', 'Balance'])
+        for t in result['trades']:
+            writer.writerow([t['ticket'], "BUY" if t['is_buy'] else "SELL", bar_time(t['entry_time']), t['entry'],
+                             t['sl'], bar_time(t['exit_time']), t['exit'], t['reason'], t['profit'], t['balance']])
+    with open(equity_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Time', 'Equity'])
+        writer.writerows(zip(map(bar_time, result['times']), result['equity'].tolist()))
+
+# === MAIN EXECUTION ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay Remac-Copilot-Mini's run_bot on stored M1/M5 history")
+    parser.add_argument("--symbol", default=get_bot().SYMBOL)
+    parser.add_argument("--bars", type=int, default=525600, help="M1 bars of history (default: one year)")
+    parser.add_argument("--entries-per-signal", type=int, default=1,
+                        help="positions opened per signal bar, to mimic the 5 s re-entry of the live loop")
+    parser.add_argument("--store", default=BAR_STORE_DIR, help="bar store the history is read from")
+    parser.add_argument("--offline", action="store_true", help="use the bar store as is, without syncing from MT5")
+    parser.add_argument("--trades-out", default=SIM_TRADES_FILE)
+    parser.add_argument("--equity-out", default=SIM_EQUITY_FILE)
+    args = parser.parse_args()
+
+    store = BarStore(args.store)
+    if not args.offline:
+        mt5 = bot.mt5
+        if mt5 is None:
+            print("⚠️ MetaTrader5 not installed - replaying the bar store as is")
+        elif mt5.initialize():
+            try:
+                sync_symbols(store, mt5, [args.symbol], ['M1'], history_bars=args.bars)
+                sync_symbols(store, mt5, [args.symbol], ['M5'], history_bars=args.bars // 5 + BOT_WINDOW)
+            finally:
+                mt5.shutdown()
+        else:
+            print("⚠️ MT5 unavailable - replaying the bar store as is")
+    m1 = store.read(args.symbol, 'M1', count=args.bars)
+    if not len(m1):
+        raise SystemExit(f"No history for {args.symbol}")
+    m5 = store.read(args.symbol, 'M5', end=int(m1['time'][-1]))
+    info = store.info(args.symbol)
+
+    bot.SYMBOL = args.symbol
+    start = time.perf_counter()
+    result = simulate(m1, m5 if len(m5) else None, info.get('point', 0.), info.get('contract_size', 1.),
+                      entries_per_signal=args.entries_per_signal)
+    elapsed = time.perf_counter() - start
+    write_results(result, args.trades_out, args.equity_out)
+
+    stats = summary(result)
+    print(f"{args.symbol}: {len(m1)} M1 bars replayed in {elapsed:.1f}s")
+    print(f"Trades {stats['trades']}, win rate {stats['win_rate']:.1f}%, PF {stats['profit_factor']:.2f}, "
+          f"net {stats['net']:.2f}, max drawdown {stats['max_drawdown']:.2f}")
+    print(f"Counters: {result['counters']}")
+    print(f"✅ Wrote {args.trades_out} and {args.equity_out}")
@@ -0,0 +1,222 @@
+"""
+IntelliTrade performance analytics
+Vectorized statistics over the full trade archive, broken down by symbol,
+hour of day, RSI status, SMA alignment and direction.
+"""
+
+import argparse
+import csv
+import time
+import numpy as np
+from TradeArchive import ARCHIVE_DIR, TradeArchive
+
+# === CONFIG ===
+TP_LEVELS = 4  # Take-profit rungs on a signal's ladder
+BREAKDOWNS = {
+    'symbol': 'Symbol',
+    'hour': 'Hour',
+    'rsi': 'RSI_Status',
+    'sma': 'SMA_Alignment',
+    'direction': 'Direction'
+}
+
+# === STATISTICS ===
+def tp_levels(outcomes):
+    """Ladder rung (1..TP_LEVELS) of each outcome label, 0 for stop-outs"""
+    levels = np.zeros(len(outcomes), dtype=np.int8)
+    for level in range(1, TP_LEVELS + 1):
+        levels[outcomes == f"TP{level}"] = level
+    return levels
+
+def load_history(archive, **filters):
+    """Archive rows in time order plus derived columns: Return (% of entry), Hour, Level, Trade"""
+    rows = archive.query(columns=['Timestamp', 'TradeID', 'Symbol', 'Direction', 'Entry', 'Outcome',
+                                  'Pips', 'RSI_Status', 'SMA_Alignment'], decode=False, **filters)
+    order = np.argsort(rows['Timestamp'], kind='stable')
+    rows = {col: values[order] for col, values in rows.items()}
+    # Pips are in price units, so returns are compared as a percentage of entry
+    # to keep results comparable across symbols
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows['Return'] = np.where(rows['Entry'] > 0, rows['Pips'] / rows['Entry'] * 100, 0.)
+    rows['Hour'] = (rows['Timestamp'].astype('datetime64[h]').astype(np.int64) % 24).astype(np.int16)
+    outcome_levels = tp_levels(np.array(archive.categories['Outcome']))
+    rows['Level'] = outcome_levels[rows['Outcome']]
+    rows['Trade'] = np.unique(rows['TradeID'], return_inverse=True)[1]  # Integer trade index
+    return rows
+
+def trade_results(returns, levels, trades):
+    """Net result of each trade under one sizing model, from its log rows in time order.
+
+    A trade is one position split evenly over the TP_LEVELS rungs: each TP row closes
+    1/TP_LEVELS of it at that rung's return and a stop-out closes whatever is left.
+    Rungs of a still open trade that are not reached yet count as nothing. Returns
+    (net, first_row, last_row) per trade, in order of trade index.
+    """
+    first_row, trade_index = np.unique(trades, return_index=True, return_inverse=True)[1:]
+    n_trades = len(first_row)
+    last_row = np.zeros(n_trades, dtype=np.int64)
+    np.maximum.at(last_row, trade_index, np.arange(len(trades)))
+    tp = levels > 0
+    tp_total = np.bincount(trade_index, weights=np.where(tp, returns, 0.), minlength=n_trades)
+    tp_count = np.bincount(trade_index, weights=tp, minlength=n_trades)
+    stop_total = np.bincount(trade_index, weights=np.where(tp, 0., returns), minlength=n_trades)
+    net = (tp_total + stop_total * np.maximum(TP_LEVELS - tp_count, 0)) / TP_LEVELS
+    return net, first_row, last_row
+
+def grouped_stats(group, returns, levels, trades, n_groups):
+    """Per-group performance over trades; every argument array is in time order, one entry per log row.
+
+    Rows are first netted per trade (trade_results) and a trade counts in the group of
+    its first row, at the time of its last. Returns a dict of arrays with one entry per
+    group: rows, trades, win_rate, profit_factor (gross win / gross loss), expectancy,
+    total, max_drawdown, longest win/loss streak, and tp_hit (n_groups x TP_LEVELS share
+    of trades reaching each rung). 'curve' holds every group's equity and drawdown after
+    each of its trades: 'group', 'row' (the trade's last row), 'net', 'equity' and
+    'drawdown' arrays, grouped and in time order inside each group.
+    """
+    rows = np.bincount(group, minlength=n_groups)
+    net, first_row, last_row = trade_results(returns, levels, trades)
+    trade_group = group[first_row]
+    trade_count = np.bincount(trade_group, minlength=n_groups)
+
+    wins = net > 0
+    losses = net < 0
+    gross_win = np.bincount(trade_group, weights=np.where(wins, net, 0.), minlength=n_groups)
+    gross_loss = -np.bincount(trade_group, weights=np.where(losses, net, 0.), minlength=n_groups)
+    total = np.bincount(trade_group, weights=net, minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = np.bincount(trade_group, weights=wins, minlength=n_groups) / trade_count * 100
+        profit_factor = np.where(gross_loss > 0, gross_win / gross_loss, np.where(gross_win > 0, np.inf, np.nan))
+        expectancy = total / trade_count
+
+    # Equity curve per group: trades by group, then by the time they last changed
+    order = np.lexsort((last_row, trade_group))
+    g, r, w, l = trade_group[order], net[order], wins[order], losses[order]
+    starts = np.searchsorted(g, np.arange(n_groups))
+    equity = np.cumsum(r)
+    equity -= np.concatenate([[0.], equity])[starts][g]  # Restart the running sum at each group
+    # Shift each group above the previous one so one running max never crosses groups
+    shift = g * (np.abs(equity).max() * 2 + 1 if len(equity) else 0)
+    peak = np.maximum.accumulate(np.maximum(equity, 0) + shift) - shift
+    drawdown = peak - equity
+    max_drawdown = np.zeros(n_groups)
+    np.maximum.at(max_drawdown, g, drawdown)
+
+    # Streaks: runs of consecutive winning (or losing) trades inside a group
+    longest_win = np.zeros(n_groups, dtype=np.int64)
+    longest_loss = np.zeros(n_groups, dtype=np.int64)
+    streaks = {'win': np.zeros(0, dtype=np.int64), 'loss': np.zeros(0, dtype=np.int64)}
+    state = np.where(w, 1, np.where(l, -1, 0))
+    if len(state):
+        boundary = np.flatnonzero(np.concatenate([[True], (state[1:] != state[:-1]) | (g[1:] != g[:-1])]))
+        lengths = np.diff(np.concatenate([boundary, [len(state)]]))
+        run_state, run_group = state[boundary], g[boundary]
+        np.maximum.at(longest_win, run_group[run_state == 1], lengths[run_state == 1])
+        np.maximum.at(longest_loss, run_group[run_state == -1], lengths[run_state == -1])
+        streaks = {'win': lengths[run_state == 1], 'loss': lengths[run_state == -1]}
+
+    # TP ladder: highest rung each trade reached
+    best = np.zeros(len(first_row), dtype=np.int8)
+    np.maximum.at(best, np.unique(trades, return_inverse=True)[1], levels)
+    tp_hit = np.zeros((n_groups, TP_LEVELS))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for level in range(1, TP_LEVELS + 1):
+            tp_hit[:, level - 1] = np.bincount(trade_group, weights=best >= level, minlength=n_groups) / trade_count
+
+    return {
+        'rows': rows,
+        'win_rate': win_rate,
+        'profit_factor': profit_factor,
+        'expectancy': expectancy,
+        'total': total,
+        'max_drawdown': max_drawdown,
+        'longest_win': longest_win,
+        'longest_loss': longest_loss,
+        'trades': trade_count,
+        'tp_hit': tp_hit,
+        'streaks': streaks,
+        'curve': {'group': g, 'row': last_row[order], 'net': r, 'equity': equity, 'drawdown': drawdown}
+    }
+
+def breakdown(history, categories, column):
+    """Group labels and stats of history split by one column ('Hour' or a categorical column)"""
+    codes, group = np.unique(history[column], return_inverse=True)
+    if column == 'Hour':
+        labels = [f"{code:02d}:00" for code in codes]
+    else:
+        labels = [categories[column][code] or "(none)" for code in codes]
+    stats = grouped_stats(group, history['Return'], history['Level'], history['Trade'], len(codes))
+    return labels, stats
+
+# === REPORT ===
+def format_table(title, labels, stats):
+    header = (f"{title:<26} {'Rows':>7} {'Trades':>7} {'Win%':>6} {'PF':>6} {'Exp%':>8} {'Total%':>9} "
+              f"{'MaxDD%':>8} {'W/L run':>8} " + " ".join(f"{'TP' + str(level):>5}" for level in range(1, TP_LEVELS + 1)))
+    lines = [header, "-" * len(header)]
+    for i, label in enumerate(labels):
+        lines.append(
+            f"{label[:26]:<26} {stats['rows'][i]:>7} {stats['trades'][i]:>7} {stats['win_rate'][i]:>6.1f} "
+            f"{stats['profit_factor'][i]:>6.2f} {stats['expectancy'][i]:>8.4f} {stats['total'][i]:>9.3f} "
+            f"{stats['max_drawdown'][i]:>8.3f} {stats['longest_win'][i]:>4}/{stats['longest_loss'][i]:<3} "
+            + " ".join(f"{stats['tp_hit'][i, level]:>5.0%}" for level in range(TP_LEVELS)))
+    return "\n".join(lines)
+
+def format_streaks(streaks):
+    lines = ["Streak length distribution (runs of consecutive winning or losing trades)"]
+    for kind in ('win', 'loss'):
+        counts = np.bincount(streaks[kind])
+        runs = ", ".join(f"{length}: {count}" for length, count in enumerate(counts) if length and count)
+        lines.append(f"  {kind:<5} {runs or 'none'}")
+    return "\n".join(lines)
+
+def write_curves(path, reports, history):
+    """Equity and drawdown after every trade of every reported group, as CSV"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Breakdown', 'Group', 'Timestamp', 'TradeID', 'Net%', 'Equity%', 'Drawdown%'])
+        for name, labels, stats in reports:
+            curve = stats['curve']
+            for g, row, net, equity, drawdown in zip(curve['group'], curve['row'], curve['net'],
+                                                     curve['equity'], curve['drawdown']):
+                writer.writerow([name, labels[g], history['Timestamp'][row], history['TradeID'][row],
+                                 f"{net:.6f}", f"{equity:.6f}", f"{drawdown:.6f}"])
+
+# === MAIN EXECUTION ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IntelliTrade performance report from the trade archive")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="archive directory (filled by TradeIngest.py)")
+    parser.add_argument("--by", nargs="+", choices=list(BREAKDOWNS), default=list(BREAKDOWNS),
+                        help="breakdowns to report")
+    parser.add_argument("--symbol", nargs="+")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--curves", help="also write each group's per-trade equity and drawdown to this CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    archive = TradeArchive(args.archive)
+    history = load_history(archive, symbol=args.symbol, start=args.start, end=args.end)
+    n_rows = len(history['Return'])
+    if not n_rows:
+        print("No archived trades match - run TradeIngest.py first")
+        raise SystemExit(1)
+
+    overall = grouped_stats(np.zeros(n_rows, dtype=np.int64), history['Return'], history['Level'], history['Trade'], 1)
+    sections = [format_table("All trades", ["All"], overall), format_streaks(overall['streaks'])]
+    reports = [('all', ["All"], overall)]
+    for name in args.by:
+        labels, stats = breakdown(history, archive.categories, BREAKDOWNS[name])
+        sections.append(format_table(f"By {name}", labels, stats))
+        reports.append((name, labels, stats))
+    if args.curves:
+        write_curves(args.curves, reports, history)
+    elapsed = time.perf_counter() - start
+
+    first, last = history['Timestamp'][0], history['Timestamp'][-1]
+    print(f"=== IntelliTrade performance: {n_rows} rows, {first} to {last} ===")
+    print("Returns are % of entry price per trade, its position split evenly over the TP rungs; "
+          "PF = gross win / gross loss\n")
+    print("\n\n".join(sections))
+    if args.curves:
+        print(f"📈 Equity and drawdown curves written to {args.curves}")
+    print(f"\nReport built in {elapsed:.2f}s")
@@ -0,0 +1,253 @@
+"""
+IntelliTrade trade archive
+Typed, columnar trade history partitioned by UTC date, with a symbol/outcome index
+for fast filtered loads into NumPy arrays.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import numpy as np
+
+# === CONFIG ===
+ARCHIVE_DIR = "trade_archive"
+ARCHIVE_FILES = re.compile(r"(\d{4}-\d{2}-\d{2}\.cols|index\.json|categories\.json)(\.tmp)?")  # Files the archive owns
+
+# Column name -> storage kind; categorical columns are stored as int16 codes
+ARCHIVE_COLUMNS = {
+    'Timestamp': 'time',
+    'TradeID': 'text',
+    'Symbol': 'category',
+    'Direction': 'category',
+    'Entry': 'float',
+    'Exit': 'float',
+    'Outcome': 'category',
+    'Pips': 'float',
+    'DonchianUpper': 'float',
+    'DonchianLower': 'float',
+    'MACD_Main': 'float',
+    'MACD_Signal': 'float',
+    'MACD_Hist': 'float',
+    'RSI': 'float',
+    'RSI_Status': 'category',
+    'SMA_9': 'float',
+    'SMA_21': 'float',
+    'SMA_Alignment': 'category',
+    'HighTouch': 'float',  # Per-symbol legacy logs only
+    'LowTouch': 'float'
+}
+INDEXED_COLUMNS = ['Symbol', 'Outcome']  # Codes present in each partition, for pruning
+
+# === ARCHIVE ===
+def time_bound(value, end=False):
+    """A query bound as datetime64[s]; a bare date used as an end bound means its last second"""
+    bound = np.datetime64(value)
+    if end and bound.dtype == np.dtype('datetime64[D]'):
+        return (bound + np.timedelta64(1, 'D')).astype('datetime64[s]') - np.timedelta64(1, 's')
+    return bound.astype('datetime64[s]')
+
+class TradeArchive:
+    """Trade rows stored as one columnar file per UTC day.
+
+    categories.json maps categorical columns to their code tables (codes only ever
+    get appended). index.json lists each partition with its row count and the
+    Symbol/Outcome codes it contains, so a query only opens partitions that can
+    match. Partition and index files are written to a temp file and swapped in.
+    """
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.categories = self._read_json('categories.json', {col: [''] for col, kind in ARCHIVE_COLUMNS.items() if kind == 'category'})
+        self.index = self._read_json('index.json', {})  # Day -> {'rows': n, 'Symbol': [codes], 'Outcome': [codes]}
+        self.lookup = {col: {value: code for code, value in enumerate(values)} for col, values in self.categories.items()}
+
+    def __len__(self):
+        return sum(info['rows'] for info in self.index.values())
+
+    def days(self):
+        return sorted(self.index)
+
+    def clear(self):
+        """Delete every partition, index and category file; anything else in root is left alone"""
+        for name in os.listdir(self.root):
+            if ARCHIVE_FILES.fullmatch(name):
+                os.remove(os.path.join(self.root, name))
+        self.categories = {col: [''] for col, kind in ARCHIVE_COLUMNS.items() if kind == 'category'}
+        self.index = {}
+        self.lookup = {col: {value: code for code, value in enumerate(values)} for col, values in self.categories.items()}
+
+    def append(self, rows):
+        """Add rows (dicts keyed by ARCHIVE_COLUMNS; missing fields become NaN/'') to their day partitions"""
+        by_day = {}
+        for row in rows:
+            timestamp = str(row['Timestamp']).strip()
+            by_day.setdefault(timestamp[:10], []).append(row)
+        if not by_day:
+            return 0
+
+        encoded = {day: self._encode(day_rows) for day, day_rows in by_day.items()}
+        # New category codes must be on disk before any partition that uses them
+        self._write_json('categories.json', self.categories)
+        for day, columns in encoded.items():
+            existing = self.load_partition(day)
+            if existing is not None:
+                columns = {col: np.concatenate([existing[col], columns[col]]) for col in ARCHIVE_COLUMNS}
+            self._write_partition(day, columns)
+            self.index[day] = {'rows': len(columns['Timestamp'])}
+            for col in INDEXED_COLUMNS:
+                self.index[day][col] = np.unique(columns[col]).tolist()
+        self._write_json('index.json', self.index)
+        return sum(len(day_rows) for day_rows in by_day.values())
+
+    def load_partition(self, day, columns=None):
+        """Raw (encoded) column arrays of one day, or None if it has no partition"""
+        path = self._partition_path(day)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            layout = json.loads(f.read(int.from_bytes(f.read(8), 'little')))
+            data = f.read()
+        arrays = {}
+        for col in columns or ARCHIVE_COLUMNS:
+            dtype, offset, count = layout[col]
+            arrays[col] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        return arrays
+
+    def query(self, symbol=None, start=None, end=None, outcome=None, rsi_status=None,
+              sma_alignment=None, direction=None, columns=None, decode=True):
+        """Rows matching every given filter as {column: np.ndarray}.
+
+        symbol, outcome, rsi_status, sma_alignment and direction take one value or a
+        list of values; start/end are inclusive timestamps (str, datetime or datetime64) -
+        a bare date as end includes that whole day.
+        Categorical columns come back as string arrays unless decode=False.
+        """
+        columns = list(columns or ARCHIVE_COLUMNS)
+        filters = {'Symbol': symbol, 'Outcome': outcome, 'RSI_Status': rsi_status,
+                   'SMA_Alignment': sma_alignment, 'Direction': direction}
+        wanted = {col: self._codes(col, values) for col, values in filters.items() if values is not None}
+        start = time_bound(start) if start is not None else None
+        end = time_bound(end, end=True) if end is not None else None
+        needed = list(dict.fromkeys(columns + list(wanted) + ['Timestamp']))
+
+        parts = []
+        if all(len(codes) for codes in wanted.values()):
+            for day in self.days():
+                if start is not None and np.datetime64(day, 'D') < start.astype('datetime64[D]'):
+                    continue
+                if end is not None and np.datetime64(day, 'D') > end.astype('datetime64[D]'):
+                    continue
+                info = self.index[day]
+                if any(col in wanted and not wanted[col].intersection(info[col]) for col in INDEXED_COLUMNS):
+                    continue
+
+                data = self.load_partition(day, needed)
+                mask = np.ones(info['rows'], dtype=bool)
+                for col, codes in wanted.items():
+                    mask &= np.isin(data[col], list(codes))
+                if start is not None:
+                    mask &= data['Timestamp'] >= start
+                if end is not None:
+                    mask &= data['Timestamp'] <= end
+                parts.append({col: data[col][mask] for col in columns})
+
+        result = {}
+        for col in columns:
+            if parts:
+                result[col] = np.concatenate([part[col] for part in parts])
+            else:
+                result[col] = self._empty(col)
+            if decode and ARCHIVE_COLUMNS[col] == 'category':
+                result[col] = np.array(self.categories[col])[result[col]]
+        return result
+
+    def _codes(self, col, values):
+        if isinstance(values, str):
+            values = [values]
+        return {self.lookup[col][value] for value in values if value in self.lookup[col]}
+
+    def _encode(self, rows):
+        columns = {}
+        for col, kind in ARCHIVE_COLUMNS.items():
+            values = [row.get(col) for row in rows]
+            if kind == 'time':
+                columns[col] = np.array([str(v).strip().replace(' ', 'T') for v in values], dtype='datetime64[s]')
+            elif kind == 'text':
+                columns[col] = np.array(['' if v is None else str(v) for v in values], dtype=str)
+            elif kind == 'float':
+                columns[col] = np.array([float(v) if v not in (None, '') else np.nan for v in values], dtype=np.float64)
+            else:
+                lookup = self.lookup[col]
+                codes = []
+                for v in values:
+                    v = '' if v is None else str(v).strip()
+                    if v not in lookup:
+                        lookup[v] = len(self.categories[col])
+                        self.categories[col].append(v)
+                    codes.append(lookup[v])
+                columns[col] = np.array(codes, dtype=np.int16)
+        return columns
+
+    def _empty(self, col):
+        kind = ARCHIVE_COLUMNS[col]
+        return np.array([], dtype={'time': 'datetime64[s]', 'text': str, 'float': np.float64, 'category': np.int16}[kind])
+
+    def _partition_path(self, day):
+        return os.path.join(self.root, f"{day}.cols")
+
+    def _write_partition(self, day, columns):
+        # Self-describing file: 8-byte header length, JSON {column: [dtype, offset, count]},
+        # then each column's raw buffer back to back
+        layout, offset = {}, 0
+        for col, values in columns.items():
+            layout[col] = [values.dtype.str, offset, len(values)]
+            offset += values.nbytes
+        header = json.dumps(layout).encode()
+        temp_path = self._partition_path(day) + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            for values in columns.values():
+                f.write(np.ascontiguousarray(values).tobytes())
+        os.replace(temp_path, self._partition_path(day))
+
+    def _read_json(self, name, default):
+        try:
+            with open(os.path.join(self.root, name), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def _write_json(self, name, data):
+        path = os.path.join(self.root, name)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+# === MAIN EXECUTION ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the IntelliTrade trade archive")
+    parser.add_argument("--root", default=ARCHIVE_DIR, help="archive directory")
+    parser.add_argument("--symbol", nargs="+")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--outcome", nargs="+")
+    parser.add_argument("--rsi-status", nargs="+")
+    parser.add_argument("--sma-alignment", nargs="+")
+    parser.add_argument("--direction", nargs="+")
+    parser.add_argument("--limit", type=int, default=20, help="rows to print")
+    args = parser.parse_args()
+
+    # The archive is filled by TradeIngest.py
+    archive = TradeArchive(args.root)
+    start = time.perf_counter()
+    rows = archive.query(symbol=args.symbol, start=args.start, end=args.end, outcome=args.outcome,
+                         rsi_status=args.rsi_status, sma_alignment=args.sma_alignment, direction=args.direction)
+    elapsed = time.perf_counter() - start
+    count = len(rows['Timestamp'])
+    print(f"{count} of {len(archive)} trades matched ({elapsed*1000:.1f} ms)")
+    for i in range(min(count, args.limit)):
+        print(f"{rows['Timestamp'][i]}  {rows['Symbol'][i]:<26} {rows['Direction'][i]:<4} "
+              f"{rows['Outcome'][i]:<22} {rows['Pips'][i]:>12.5f}  {rows['RSI_Status'][i]:<10} {rows['SMA_Alignment'][i]}")
@@ -0,0 +1,241 @@
+"""
+IntelliTrade history ingester
+Streams every trade history format into the trade archive, skipping rows it has
+already archived and files (or file tails) it has already read.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from TradeArchive import ARCHIVE_DIR, ARCHIVE_COLUMNS, TradeArchive
+
+# === CONFIG ===
+TRADE_PERFORMANCE_DIR = "trade_performance_data"
+MANIFEST_FILE = "ingest_manifest.json"  # Inside the archive directory
+INGEST_BATCH_ROWS = 5000  # Rows buffered before they are written to the archive
+LEGACY_SYMBOL_PATTERN = "trade_performance_*.csv"  # Root-level per-symbol logs
+LEGACY_ALL_TP = "ALL_TP"  # Per-symbol logs repeat the last TP row under this outcome
+LEGACY_SL = "SL"  # Per-symbol logs do not say whether a stop-out followed a TP
+TRADE_LOOKBACK_DAYS = 31  # Days before a legacy SL row searched for its trade's TP rows
+
+# Key/value labels of the .txt "=== Trade Performance ===" blocks
+TXT_FIELDS = {
+    'Timestamp': 'Timestamp',
+    'Trade ID': 'TradeID',
+    'Symbol': 'Symbol',
+    'Direction': 'Direction',
+    'Entry': 'Entry',
+    'Exit': 'Exit',
+    'Outcome': 'Outcome',
+    'Pips': 'Pips',
+    'Donchian Upper': 'DonchianUpper',
+    'Donchian Lower': 'DonchianLower',
+    'MACD Main': 'MACD_Main',
+    'MACD Signal': 'MACD_Signal',
+    'MACD Hist': 'MACD_Hist',
+    'RSI': 'RSI',
+    'RSI Status': 'RSI_Status',
+    'SMA 9': 'SMA_9',
+    'SMA 21': 'SMA_21',
+    'SMA Alignment': 'SMA_Alignment'
+}
+TXT_BLOCK_END = "====================="
+
+# === READERS ===
+# Each reader takes a binary file positioned where reading should resume and yields
+# (row, offset) pairs, offset being the byte position just after the row. Only
+# complete lines (and complete .txt blocks) are consumed, so a file still being
+# written is picked up where it left off on the next run.
+
+def read_lines(f):
+    offset = f.tell()
+    for raw in f:
+        if not raw.endswith(b"\n"):
+            return  # Partially written line
+        offset += len(raw)
+        yield raw.decode('utf-8').rstrip("\r\n"), offset
+
+def read_csv_rows(f, header, symbol=None):
+    """Rows of a daily (18-column) or per-symbol (9-column) CSV log"""
+    for line, offset in read_lines(f):
+        if not line:
+            continue
+        row = dict(zip(header, next(csv.reader([line]))))
+        if symbol is not None:
+            row['Symbol'] = symbol  # Per-symbol logs name the symbol only in the file name
+        yield row, offset
+
+def read_txt_blocks(f):
+    """Rows of the legacy '=== Trade Performance ===' key/value block logs"""
+    row = {}
+    for line, offset in read_lines(f):
+        line = line.strip()
+        if line == TXT_BLOCK_END:
+            if row:
+                yield row, offset
+            row = {}
+            continue
+        key, sep, value = line.partition(": ")
+        if sep and key in TXT_FIELDS:
+            row[TXT_FIELDS[key]] = value.strip()
+
+def history_files(root="."):
+    """Every history log under root, oldest first within each format"""
+    files = sorted(glob.glob(os.path.join(root, LEGACY_SYMBOL_PATTERN)))
+    files += sorted(glob.glob(os.path.join(root, TRADE_PERFORMANCE_DIR, "trade_performance_*.csv")))
+    files += sorted(glob.glob(os.path.join(root, TRADE_PERFORMANCE_DIR, "trade_performance_*.txt")))
+    return files
+
+def stream_file(path, offset):
+    """(row, offset) pairs of one log from a byte offset, in the archive schema"""
+    with open(path, 'rb') as f:
+        if path.endswith(".txt"):
+            f.seek(offset)
+            yield from read_txt_blocks(f)
+            return
+
+        first = f.readline()
+        if not first.endswith(b"\n"):
+            return
+        header = next(csv.reader([first.decode('utf-8-sig').strip()]))
+        symbol = None
+        if 'Symbol' not in header:
+            # trade_performance_<SYMBOL>.csv
+            symbol = os.path.basename(path)[len("trade_performance_"):-len(".csv")]
+        f.seek(max(offset, len(first)))
+        yield from read_csv_rows(f, header, symbol)
+
+# === INGEST ===
+class Ingester:
+    """Incremental loader from the history logs into a TradeArchive.
+
+    The manifest remembers, per file, its size, mtime and how far it has been read;
+    unchanged files are skipped, grown files are read from where the last run
+    stopped, and files that shrank (rewritten) are read again from the start.
+    Rows already in the archive under the same TradeID and Outcome are dropped; the
+    keys are read only from the day partitions new rows fall on, the first time each
+    day comes up. Legacy per-symbol outcomes are normalized: ALL_TP rows are dropped
+    (they repeat the TP4 row) and SL becomes "SL after TP (Win)" or "SL without TP
+    (Loss)" depending on whether the trade already has TP rows, looked up from the
+    day in its TradeID up to the SL row's day.
+    """
+    def __init__(self, archive, batch_rows=INGEST_BATCH_ROWS):
+        self.archive = archive
+        self.batch_rows = batch_rows
+        self.manifest_path = os.path.join(archive.root, MANIFEST_FILE)
+        try:
+            with open(self.manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        self.seen = {}  # Day -> {(TradeID, Outcome)} archived or batched, loaded on first use
+        self.tp_trades = {}  # Day -> {TradeID} with a TP row that day
+        self.batch = []
+        self.stats = {'files': 0, 'skipped_files': 0, 'rows': 0, 'duplicates': 0, 'redundant': 0, 'archived': 0}
+
+    def run(self, files):
+        for path in files:
+            stat = os.stat(path)
+            entry = self.manifest.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                self.stats['skipped_files'] += 1
+                continue
+            offset = entry['offset'] if entry and stat.st_size >= entry['size'] else 0
+
+            self.stats['files'] += 1
+            for row, offset in stream_file(path, offset):
+                self._add(row)
+            self._flush()
+            self.manifest[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'offset': offset}
+            self._save_manifest()
+        return self.stats
+
+    def _day(self, day):
+        """(TradeID, Outcome) keys of one day, read from its partition the first time"""
+        keys = self.seen.get(day)
+        if keys is None:
+            keys = set()
+            data = self.archive.load_partition(day, ['TradeID', 'Outcome'])
+            if data is not None:
+                outcomes = np.array(self.archive.categories['Outcome'])[data['Outcome']]
+                keys = set(zip(data['TradeID'].tolist(), outcomes.tolist()))
+            self.seen[day] = keys
+            self.tp_trades[day] = {tid for tid, outcome in keys if outcome.startswith("TP")}
+        return keys
+
+    def _had_tp(self, tid, day):
+        """Whether the trade has a TP row on any day from its opening (per TradeID) to day"""
+        last = date.fromisoformat(day)
+        try:
+            first = datetime.strptime(tid.rpartition('_')[2][:8], '%Y%m%d').date()
+        except ValueError:
+            first = last  # No date in the ID: only the SL row's own day
+        first = min(max(first, last - timedelta(days=TRADE_LOOKBACK_DAYS)), last)
+        for n in range((last - first).days + 1):
+            other = (first + timedelta(days=n)).isoformat()
+            self._day(other)
+            if tid in self.tp_trades[other]:
+                return True
+        return False
+
+    def _add(self, row):
+        self.stats['rows'] += 1
+        tid, outcome = row.get('TradeID', ''), row.get('Outcome', '')
+        if outcome == LEGACY_ALL_TP:
+            self.stats['redundant'] += 1
+            return
+        day = str(row.get('Timestamp') or '').strip()[:10]  # The archive partitions by this day
+        if not day:
+            self.stats['duplicates'] += 1
+            return
+        if outcome == LEGACY_SL:
+            outcome = row['Outcome'] = "SL after TP (Win)" if self._had_tp(tid, day) else "SL without TP (Loss)"
+        key = (tid, outcome)
+        seen = self._day(day)
+        if key in seen:
+            self.stats['duplicates'] += 1
+            return
+        seen.add(key)
+        if outcome.startswith("TP"):
+            self.tp_trades[day].add(tid)
+        self.batch.append({col: row.get(col) for col in ARCHIVE_COLUMNS})
+        if len(self.batch) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            self.stats['archived'] += self.archive.append(self.batch)
+            self.batch = []
+
+    def _save_manifest(self):
+        with open(self.manifest_path + ".tmp", 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+# === MAIN EXECUTION ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest IntelliTrade trade history into the archive")
+    parser.add_argument("--root", default=".", help="directory holding the history logs")
+    parser.add_argument("--archive", default=ARCHIVE_DIR, help="archive directory")
+    parser.add_argument("--rebuild", action="store_true", help="drop the archive and manifest and ingest everything again")
+    args = parser.parse_args()
+
+    archive = TradeArchive(args.archive)
+    if args.rebuild:
+        archive.clear()
+        try:
+            os.remove(os.path.join(args.archive, MANIFEST_FILE))
+        except FileNotFoundError:
+            pass
+
+    start = time.perf_counter()
+    ingester = Ingester(archive)
+    stats = ingester.run(history_files(args.root))
+    print(f"✅ Read {stats['rows']} rows from {stats['files']} files ({stats['skipped_files']} unchanged) - "
+          f"archived {stats['archived']}, skipped {stats['duplicates']} duplicates "
+          f"and {stats['redundant']} redundant ALL_TP rows in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,70 @@
+"""IncrementalIndicators against the get_* pandas functions on synthetic bars"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("requests")
+IntelliTrade = pytest.importorskip("IntelliTrade")
+
+def synthetic_rates(n=1500, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0004, n))
+    close[200:230] = close[200]  # A flat stretch: equal values are a special case in pandas' rolling mean
+    opens = np.r_[close[0], close[:-1]]
+    rates = np.zeros(n, dtype=[('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8')])
+    rates['time'] = 1_750_000_000 + 60 * np.arange(n)
+    rates['open'] = opens
+    rates['close'] = close
+    rates['high'] = np.maximum(opens, close) + rng.uniform(0, 0.0003, n)
+    rates['low'] = np.minimum(opens, close) - rng.uniform(0, 0.0003, n)
+    return rates
+
+def pandas_indicators(rates):
+    df = pd.DataFrame({name: rates[name] for name in ('high', 'low', 'close')})
+    upper, lower = IntelliTrade.get_donchian(df)
+    macd_line, signal_line, histogram = IntelliTrade.get_macd(df)
+    return {
+        'donchian_upper': upper.to_numpy(),
+        'donchian_lower': lower.to_numpy(),
+        'macd_main': macd_line.to_numpy(),
+        'macd_signal': signal_line.to_numpy(),
+        'macd_hist': histogram.to_numpy(),
+        'rsi': IntelliTrade.get_rsi(df).to_numpy(),
+        'sma_9': IntelliTrade.get_sma(df, IntelliTrade.SMA_PERIOD_SHORT).to_numpy(),
+        'sma_21': IntelliTrade.get_sma(df, IntelliTrade.SMA_PERIOD_LONG).to_numpy()
+    }
+
+def test_update_matches_pandas_at_every_bar():
+    rates = synthetic_rates()
+    expected = pandas_indicators(rates)
+    engine = IntelliTrade.IncrementalIndicators()
+    for i, bar in enumerate(rates):
+        values = engine.update(int(bar['time']), float(bar['high']), float(bar['low']), float(bar['close']))
+        for name, series in expected.items():
+            np.testing.assert_allclose(values[name], series[i], rtol=1e-12, atol=1e-15, err_msg=f"{name} at bar {i}")
+
+def test_peek_adds_the_forming_bar_without_committing_it():
+    rates = synthetic_rates(400)
+    engine = IntelliTrade.IncrementalIndicators()
+    engine.feed(rates[:-1])
+    forming = rates[-1]
+    peeked = engine.peek(float(forming['high']), float(forming['low']), float(forming['close']))
+    expected = pandas_indicators(rates)
+    for name, series in expected.items():
+        np.testing.assert_allclose(peeked[name], series[-1], rtol=1e-12, err_msg=name)
+    assert engine.last_time == rates['time'][-2]
+    # Feeding the rest afterwards gives the same values as never having peeked
+    assert engine.feed(rates)['macd_hist'] == pytest.approx(expected['macd_hist'][-1], rel=1e-12)
+
+def test_sync_indicators_reseeds_after_a_gap():
+    rates = synthetic_rates(600)
+    engines = {}
+    IntelliTrade.sync_indicators(engines, "EURUSD", rates[:300])
+    first = engines["EURUSD"]
+    IntelliTrade.sync_indicators(engines, "EURUSD", rates[100:400])  # Overlaps: keeps going
+    assert engines["EURUSD"] is first and first.last_time == rates['time'][398]
+    IntelliTrade.sync_indicators(engines, "EURUSD", rates[450:])  # Starts after the last commit: new engine
+    assert engines["EURUSD"] is not first
+    expected = pandas_indicators(rates[450:-1])
+    np.testing.assert_allclose(engines["EURUSD"].last['sma_21'], expected['sma_21'][-1], rtol=1e-12)
@@ -0,0 +1,132 @@
+"""price_path against a naive per-trade read of synthetic ticks and M1 bars"""
+
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+
+pytest.importorskip("requests")
+IntelliTrade = pytest.importorskip("IntelliTrade")
+
+POINT = 0.0001
+SPREAD = 3  # Points, constant so bars and ticks agree on the ask
+TICK_DTYPE = [('time_msc', 'i8'), ('bid', 'f8'), ('ask', 'f8')]
+RATE_DTYPE = [('time', 'i8'), ('high', 'f8'), ('low', 'f8'), ('spread', 'i4')]
+
+class Tick:
+    def __init__(self, time_msc, bid, ask):
+        self.time_msc, self.bid, self.ask = time_msc, bid, ask
+
+class Info:
+    point = POINT
+
+class Terminal:
+    """copy_ticks_range / copy_rates_range over fixed arrays, counting calls"""
+    COPY_TICKS_INFO = 2
+
+    def __init__(self, ticks):
+        self.ticks = ticks
+        opened = ticks['time_msc'] // 60000
+        starts = np.flatnonzero(np.r_[True, opened[1:] != opened[:-1]])
+        self.rates = np.zeros(len(starts), dtype=RATE_DTYPE)
+        self.rates['time'] = opened[starts] * 60
+        self.rates['high'] = np.maximum.reduceat(ticks['bid'], starts)
+        self.rates['low'] = np.minimum.reduceat(ticks['bid'], starts)
+        self.rates['spread'] = SPREAD
+        self.calls = {'ticks': 0, 'rates': 0}
+
+    def copy_ticks_range(self, sym, start, end, flags):
+        self.calls['ticks'] += 1
+        t = self.ticks['time_msc']
+        return self.ticks[(t >= start.timestamp() * 1000) & (t < end.timestamp() * 1000)]
+
+    def copy_rates_range(self, sym, timeframe, start, end):
+        self.calls['rates'] += 1
+        t = self.rates['time']
+        return self.rates[(t >= start.timestamp()) & (t <= end.timestamp())]
+
+    def symbol_info(self, sym):
+        return Info()
+
+def make_ticks(start_ms, minutes, seed=1):
+    rng = np.random.default_rng(seed)
+    times = start_ms + np.cumsum(rng.integers(100, 900, size=minutes * 120))
+    times = times[times < start_ms + minutes * 60000]
+    ticks = np.zeros(len(times), dtype=TICK_DTYPE)
+    ticks['time_msc'] = times
+    ticks['bid'] = 1.1 + np.cumsum(rng.normal(0, 2 * POINT, len(times)))
+    ticks['ask'] = ticks['bid'] + SPREAD * POINT
+    return ticks
+
+def naive_path(terminal, since, now):
+    """Rows one trade checked up to `since` should see, built on their own"""
+    ticks, rates = terminal.ticks, terminal.rates
+    bar = IntelliTrade.BAR_SECONDS * 1000
+    if now.time_msc - since <= IntelliTrade.MONITOR_TICK_SPAN * 1000:
+        part = ticks[(ticks['time_msc'] > since) & (ticks['time_msc'] <= now.time_msc)]
+        rows = [(t, b, b, a, a) for t, b, a in part]
+    else:
+        boundary = (since // bar + 1) * bar
+        part = ticks[(ticks['time_msc'] > since) & (ticks['time_msc'] < boundary)]
+        rows = [(t, b, b, a, a) for t, b, a in part]
+        for r in rates[(rates['time'] * 1000 >= boundary) & (rates['time'] <= now.time_msc // 1000)]:
+            rows.append((min(r['time'] * 1000 + bar, now.time_msc), r['high'], r['low'],
+                         r['high'] + SPREAD * POINT, r['low'] + SPREAD * POINT))
+    rows.append((now.time_msc, now.bid, now.bid, now.ask, now.ask))
+    return np.array(rows, dtype=float)
+
+def sliced(path, start, end):
+    names = ('time', 'bid_high', 'bid_low', 'ask_high', 'ask_low')
+    return np.column_stack([path[name][start:end] for name in names]).astype(float)
+
+@pytest.fixture
+def market(monkeypatch):
+    start = int(datetime(2025, 6, 2, 8, tzinfo=timezone.utc).timestamp() * 1000)
+    terminal = Terminal(make_ticks(start, 180))
+    monkeypatch.setattr(IntelliTrade, 'mt5', terminal)
+    last = terminal.ticks[-1]
+    return terminal, Tick(int(last['time_msc']) + 1, float(last['bid']), float(last['ask']))
+
+def test_trades_of_one_symbol_each_get_their_own_prices(market):
+    terminal, now = market
+    t0 = int(terminal.ticks['time_msc'][0])
+    since = [t0 + 90 * 60000 + 30500,  # Bars, start mid-minute
+             t0 + 30 * 60000 + 12345,  # Bars, its partial minute inside the first trade's bar range
+             t0 + 150 * 60000,  # Bars, start on a minute boundary
+             now.time_msc - 300000,  # Ticks only
+             now.time_msc - 40000,
+             t0 + 30 * 60000 + 12345]  # Same as another trade
+    path, starts, ends = IntelliTrade.price_path("EURUSD", since, now)
+    for s, start, end in zip(since, starts, ends):
+        np.testing.assert_allclose(sliced(path, start, end), naive_path(terminal, s, now))
+    # One tick fetch for the recent trades, one per distinct partial minute, one bar fetch
+    assert terminal.calls == {'ticks': 4, 'rates': 1}
+
+def test_bar_holding_a_later_trades_start_is_left_out(market):
+    terminal, now = market
+    bar = IntelliTrade.BAR_SECONDS * 1000
+    t0 = int(terminal.ticks['time_msc'][0])
+    older, newer = t0 + 20 * 60000, t0 + 60 * 60000 + 40000
+    # A spike early in the newer trade's entry minute, before it was last checked
+    spike = np.flatnonzero((terminal.ticks['time_msc'] >= newer - 30000) & (terminal.ticks['time_msc'] < newer))[0]
+    terminal.ticks['bid'][spike] += 500 * POINT
+    terminal.ticks['ask'][spike] += 500 * POINT
+    terminal.__init__(terminal.ticks)
+    path, starts, ends = IntelliTrade.price_path("EURUSD", [older, newer], now)
+    peak = terminal.ticks['bid'][spike]
+    assert path['bid_high'][starts[0]:ends[0]].max() == pytest.approx(peak)  # The older trade saw it
+    seen = slice(starts[1], ends[1])
+    assert path['bid_high'][seen].max() < peak
+    # Rows after the newer trade's first minute are whole bars that opened after it
+    bar_rows = path['time'][seen] % bar == 0
+    assert (path['time'][seen][bar_rows] - bar >= (newer // bar + 1) * bar).all()
+
+def test_checked_is_journaled(tmp_path):
+    store = IntelliTrade.TradeStore(str(tmp_path / "t.json"), str(tmp_path / "t.journal"), str(tmp_path / "t.archive"))
+    store.load()
+    trade = IntelliTrade.Trade("T1", "EURUSD", "BUY", 1.1, [1.2], 1.0, {}, checked=1000)
+    store.opened(trade)
+    trade.checked = 5000
+    store.checked([trade])
+    store.journal.close()
+    book = IntelliTrade.TradeStore(str(tmp_path / "t.json"), str(tmp_path / "t.journal"), str(tmp_path / "t.archive")).load()
+    assert book.get("T1").checked == 5000
@@ -0,0 +1,70 @@
+"""TradeAnalytics.grouped_stats against a plain per-trade loop over synthetic log rows"""
+
+import numpy as np
+from TradeAnalytics import TP_LEVELS, grouped_stats
+
+def synthetic_log(n_trades=300, seed=7):
+    """Time-ordered rows of interleaved trades: TP rows up the ladder, then maybe a stop"""
+    rng = np.random.default_rng(seed)
+    events = []
+    for trade in range(n_trades):
+        start = rng.uniform(0, 1000)
+        risk = rng.uniform(0.1, 1.0)
+        reached = rng.integers(0, TP_LEVELS + 1)
+        for level in range(1, reached + 1):
+            events.append((start + level, trade, level, risk * level))
+        if reached < TP_LEVELS and rng.random() < 0.8:
+            events.append((start + reached + 1, trade, 0, -risk))
+    events.sort()
+    trades = np.array([e[1] for e in events])
+    return trades, np.array([e[2] for e in events], dtype=np.int8), np.array([e[3] for e in events])
+
+def naive(group, returns, levels, trades, n_groups):
+    nets, first, last, best = {}, {}, {}, {}
+    for i, (trade, ret, level) in enumerate(zip(trades, returns, levels)):
+        first.setdefault(trade, i)
+        last[trade] = i
+        best[trade] = max(best.get(trade, 0), level)
+        tps = sum(1 for j in range(i) if trades[j] == trade and levels[j] > 0)
+        nets[trade] = nets.get(trade, 0.) + (ret if level else ret * (TP_LEVELS - tps)) / TP_LEVELS
+    out = []
+    for g in range(n_groups):
+        mine = sorted((t for t in nets if group[first[t]] == g), key=lambda t: last[t])
+        curve = np.cumsum([nets[t] for t in mine])
+        peak = np.maximum.accumulate(np.maximum(curve, 0))
+        runs, run = [], (0, 0)
+        for t in mine:
+            state = int(nets[t] > 0) - int(nets[t] < 0)
+            run = (state, run[1] + 1) if state == run[0] else (state, 1)
+            runs.append(run)
+        out.append({
+            'trades': len(mine),
+            'win_rate': 100. * sum(nets[t] > 0 for t in mine) / len(mine),
+            'expectancy': curve[-1] / len(mine),
+            'total': curve[-1],
+            'max_drawdown': (peak - curve).max(),
+            'longest_win': max([n for s, n in runs if s == 1], default=0),
+            'longest_loss': max([n for s, n in runs if s == -1], default=0),
+            'tp1': sum(best[t] >= 1 for t in mine) / len(mine),
+            'equity': curve
+        })
+    return out
+
+def test_grouped_stats_match_a_per_trade_loop():
+    trades, levels, returns = synthetic_log()
+    group = trades % 3  # Every row of a trade in the same group
+    stats = grouped_stats(group, returns, levels, trades, 3)
+    for g, expected in enumerate(naive(group, returns, levels, trades, 3)):
+        for key in ('trades', 'win_rate', 'expectancy', 'total', 'max_drawdown', 'longest_win', 'longest_loss'):
+            assert np.isclose(stats[key][g], expected[key]), key
+        assert np.isclose(stats['tp_hit'][g, 0], expected['tp1'])
+        np.testing.assert_allclose(stats['curve']['equity'][stats['curve']['group'] == g], expected['equity'])
+
+def test_a_ladder_counts_as_one_trade():
+    # TP1..TP3 then a stop: one trade, a win when the rungs outweigh the stopped remainder
+    levels = np.array([1, 2, 3, 0], dtype=np.int8)
+    returns = np.array([1., 2., 3., -1.])
+    stats = grouped_stats(np.zeros(4, dtype=np.int64), returns, levels, np.zeros(4, dtype=np.int64), 1)
+    assert stats['rows'][0] == 4 and stats['trades'][0] == 1
+    assert stats['win_rate'][0] == 100.
+    assert np.isclose(stats['total'][0], (1 + 2 + 3 - 1) / TP_LEVELS)
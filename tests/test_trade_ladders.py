@@ -0,0 +1,78 @@
+"""TradeLadders.evaluate against a per-trade loop over the same price path"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("requests")
+IntelliTrade = pytest.importorskip("IntelliTrade")
+
+def synthetic_trades(n, rng):
+    trades = []
+    for k in range(n):
+        direction = "BUY" if rng.random() < 0.5 else "SELL"
+        entry = 1.1 + rng.normal(0, 0.002)
+        step = rng.uniform(0.0005, 0.002)
+        sign = 1 if direction == "BUY" else -1
+        levels = rng.integers(1, len(IntelliTrade.FIB_LEVELS) + 1)  # Some ladders are shorter than FIB_LEVELS
+        tps = [round(entry + sign * step * (level + 1), 5) for level in range(levels)]
+        hit = tps[:rng.integers(0, levels)]  # Rungs reached before this check
+        trades.append(IntelliTrade.Trade(f"T{k}", "EURUSD", direction, entry, tps, round(entry - sign * step, 5), {},
+                                         hit=list(hit)))
+    return trades
+
+def synthetic_path(n, rng):
+    bid = 1.1 + np.cumsum(rng.normal(0, 0.0004, n))
+    width = rng.uniform(0, 0.0006, n) * (rng.random(n) < 0.5)  # Ticks (no width) mixed with bar rows
+    spread = rng.uniform(0.00001, 0.0003, n)
+    return {'time': np.arange(n, dtype=np.int64) * 1000, 'bid_high': bid + width, 'bid_low': bid - width,
+            'ask_high': bid + width + spread, 'ask_low': bid - width + spread}
+
+def per_trade(trades, starts, ends, path):
+    """Each trade walked row by row: rungs touched before the stop, in the order they happened"""
+    tp_events, sl_events = [], []
+    for tr, start, end in zip(trades, starts, ends):
+        buy = tr.dir == "BUY"
+        first_tp, first_sl = {}, None
+        for i in range(start, end):
+            favourable = path['ask_high'][i] if buy else path['bid_low'][i]
+            adverse = path['ask_low'][i] if buy else path['bid_high'][i]
+            for level, tp in enumerate(tr.tps):
+                if level not in first_tp and (favourable >= tp if buy else favourable <= tp):
+                    first_tp[level] = i
+            if adverse <= tr.sl if buy else adverse >= tr.sl:
+                first_sl = i
+                break
+        for level, i in first_tp.items():
+            if tr.tps[level] in tr.hit:
+                continue
+            if first_sl is None or i < first_sl or (i == first_sl and not IntelliTrade.SAME_BAR_SL_FIRST):
+                tp_events.append((tr.id, level, int(path['time'][i])))
+        if first_sl is not None:
+            sl_events.append((tr.id, int(path['time'][first_sl])))
+    return sorted(tp_events), sorted(sl_events)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_evaluate_matches_a_per_trade_loop(seed):
+    rng = np.random.default_rng(seed)
+    trades = synthetic_trades(200, rng)
+    path = synthetic_path(3000, rng)
+    ladders = IntelliTrade.TradeLadders(capacity=8)  # Grows while adding
+    ladders.sync(trades)
+    ladders.remove("T3")  # Moves the last row into a hole
+    trades = [tr for tr in trades if tr.id != "T3"]
+    starts = rng.integers(0, 2500, len(trades))
+    ends = np.minimum(starts + rng.integers(1, 600, len(trades)), len(path['time']))
+    expected_tp, expected_sl = per_trade(trades, starts, ends, path)
+
+    rows = [ladders.rows[tr.id] for tr in trades]
+    tp_rows, tp_levels, tp_times, sl_rows, sl_times = ladders.evaluate(rows, starts, ends, path)
+    got_tp = sorted((ladders.trades[r].id, int(level), int(t)) for r, level, t in zip(tp_rows, tp_levels, tp_times))
+    got_sl = sorted((ladders.trades[r].id, int(t)) for r, t in zip(sl_rows, sl_times))
+    assert got_tp == expected_tp
+    assert got_sl == expected_sl
+    assert len(expected_tp) and len(expected_sl)
+
+    # New rungs are marked hit, so the same path reports nothing new a second time
+    again = ladders.evaluate(rows, starts, ends, path)
+    assert len(again[0]) == 0
+    np.testing.assert_array_equal(again[3], sl_rows)